@@ -0,0 +1,262 @@
+""" Benchmark of the configuration-generation pipeline.
+
+Generates synthetic rosters and measures every stage of creating the configurations: email validation, username
+proposal, template rendering, tfvars validation, saving the tfvars and saving the commands file. Every stage is
+reported with its throughput (ops/sec) and peak memory. The peak memory is traced in this process only: for the
+end-to-end roster stage, whose rows are processed by worker processes, it does not include the workers. Runs offline,
+everything is written into a temporary directory.
+
+>  python3 ./python_benchmarks/benchmark_configuration_pipeline.py --sizes 1000 10000 100000
+>  python3 ./python_benchmarks/benchmark_configuration_pipeline.py --save-baseline
+
+The results are compared with the saved baselines; the run fails if a stage got slower (or uses more memory)
+than the tolerance allows.
+"""
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, NamedTuple, Optional
+
+from python_code.constants import TemplateTag
+from python_code.create_configuration_for_user import (
+    validate_email, get_proposed_username, get_proposed_usernames, get_review_date, get_environment_name,
+    replace_values_in_template, save_tfvars, print_and_save_terraform_commands
+)
+from python_code.create_configurations_for_roster import create_configurations_for_roster
+from python_code.tfvars_template import get_compiled_template
+from python_code.tfvars_validator import get_variable_specs, validate_tfvars
+import python_code.config as conf
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+BASELINES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+TOLERANCE = 0.3         # Allowed relative slowdown / memory growth compared to the baseline.
+
+ADMIN_CONFIG = {
+    TemplateTag.AZ_SUBSCRIPTION_ID.value: 'benchmark-subscription',
+    TemplateTag.DBX_ACCOUNT_ID.value: 'benchmark-account',
+    TemplateTag.DBX_METASTORE_ID.value: 'benchmark-metastore'
+}
+
+
+class StageResult(NamedTuple):
+
+    stage: str
+    size: int
+    seconds: float
+    peak_memory_bytes: int
+    parent_process_only: bool = False       # The stage runs in worker processes, their memory is not included.
+
+    @property
+    def key(self) -> str:
+        return f"{self.stage}/{self.size}"
+
+    @property
+    def ops_per_sec(self) -> float:
+        return self.size / self.seconds if self.seconds else float('inf')
+
+
+def generate_emails(size: int) -> list[str]:
+    """Deterministic synthetic roster, with the separators 'get_proposed_username' handles."""
+
+    separators = ['.', '-', '_']
+    return [f"first{separators[i % 3]}last.{i:07d}@example.com" for i in range(size)]
+
+
+def generate_configs(emails: list[str]) -> list[dict[str, str]]:
+
+    defaults = {tag.value: value for tag, value in conf.DEFAULT_VARIABLE_VALUES.items()}
+    defaults[TemplateTag.REVIEW_DATE.value] = get_review_date()
+
+    return [{TemplateTag.EMAIL.value: email, TemplateTag.USERNAME.value: get_proposed_username(email)}
+            | defaults | ADMIN_CONFIG for email in emails]
+
+
+def measure(stage: str, size: int, function: Callable[[], None], parent_process_only: bool = False) -> StageResult:
+    """Time the stage, then run it again under tracemalloc for the peak memory (tracing distorts the timing).
+    tracemalloc only sees this process: a stage running in worker processes is measured 'parent_process_only'."""
+
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return StageResult(stage, size, seconds, peak, parent_process_only)
+
+
+def benchmark_size(size: int, work_dir: str, template_file: str = conf.TERRAFORM_TFVARS_TEMPLATE_FILE,
+                   variables_file: str = conf.TERRAFORM_VARIABLES_FILE,
+                   include_roster: bool = True) -> list[StageResult]:
+
+    emails = generate_emails(size)
+    configs = generate_configs(emails)
+    template = get_compiled_template(template_file)
+    rendered = [replace_values_in_template(template, config) for config in configs]
+    variable_specs = get_variable_specs(variables_file)
+    runs = itertools.count()
+
+    def states_dir() -> str:
+        # Every run writes into a new directory, so 'save_tfvars' never finds an existing environment.
+        return os.path.join(work_dir, f"{size}-{next(runs)}")
+
+    def run_validate_email():
+        for email in emails:
+            validate_email(email)
+
+    def run_get_proposed_username():
+        for email in emails:
+            get_proposed_username(email)
+
+    def run_get_proposed_usernames():
+        get_proposed_usernames(emails)
+
+    def run_render():
+        for config in configs:
+            replace_values_in_template(template, config)
+
+    def run_validate_tfvars():
+        for content in rendered:
+            validate_tfvars(content, variable_specs)
+
+    def run_save_tfvars():
+        directory = states_dir()
+        for config, content in zip(configs, rendered):
+            save_tfvars(content, os.path.join(directory, get_environment_name(config), 'terraform.tfvars'))
+
+    def run_save_commands():
+        directory = states_dir()
+        os.makedirs(directory)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for number, config in enumerate(configs):
+                print_and_save_terraform_commands(os.path.join(directory, f"{number}.txt"),
+                                                  ADMIN_CONFIG[TemplateTag.AZ_SUBSCRIPTION_ID.value],
+                                                  get_environment_name(config))
+
+    def run_roster():
+        directory = states_dir()
+        os.makedirs(directory)
+        roster_file = os.path.join(directory, 'roster.csv')
+        with open(roster_file, 'w') as file:
+            file.write(conf.ROSTER_EMAIL_COLUMN + '\n' + '\n'.join(emails) + '\n')
+        create_configurations_for_roster(
+            roster_file, template, ADMIN_CONFIG,
+            tfvars_file_pattern=os.path.join(directory, '{az_subscription}', '{environment}', 'terraform.tfvars'),
+            commands_file_pattern=os.path.join(directory, '{az_subscription}', '{environment}', 'commands.txt'),
+            variable_specs=variable_specs
+        )
+
+    stages = [
+        ('validate_email', run_validate_email),
+        ('get_proposed_username', run_get_proposed_username),
+        ('get_proposed_usernames', run_get_proposed_usernames),
+        ('render_template', run_render),
+        ('validate_tfvars', run_validate_tfvars),
+        ('save_tfvars', run_save_tfvars),
+        ('save_commands', run_save_commands)
+    ]
+    results = [measure(stage, size, function) for stage, function in stages]
+    if include_roster:
+        results.append(measure('roster_end_to_end', size, run_roster, parent_process_only=True))
+
+    return results
+
+
+def run_benchmarks(sizes: list[int], include_roster: bool = True) -> list[StageResult]:
+
+    work_dir = tempfile.mkdtemp(prefix='benchmark_configuration_pipeline_')
+    try:
+        return [result for size in sizes for result in benchmark_size(size, work_dir, include_roster=include_roster)]
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def load_baselines(baselines_file: str = BASELINES_FILE) -> dict:
+
+    if not os.path.isfile(baselines_file):
+        return {}
+
+    with open(baselines_file, 'r') as file:
+        return json.load(file)
+
+
+def save_baselines(results: list[StageResult], baselines_file: str = BASELINES_FILE) -> None:
+    """Merge the results into the saved baselines."""
+
+    baselines = load_baselines(baselines_file)
+    baselines |= {result.key: {'ops_per_sec': result.ops_per_sec, 'peak_memory_bytes': result.peak_memory_bytes}
+                  for result in results}
+
+    with open(baselines_file, 'w') as file:
+        json.dump(baselines, file, indent=2, sort_keys=True)
+
+
+def find_regressions(results: list[StageResult], baselines: dict, tolerance: float = TOLERANCE) -> list[str]:
+
+    regressions = []
+
+    for result in results:
+        baseline = baselines.get(result.key)
+        if baseline is None:
+            continue
+        if result.ops_per_sec < baseline['ops_per_sec'] * (1 - tolerance):
+            regressions.append(f"{result.key}: {result.ops_per_sec:,.0f} ops/sec, "
+                               f"baseline {baseline['ops_per_sec']:,.0f} ops/sec")
+        if result.peak_memory_bytes > baseline['peak_memory_bytes'] * (1 + tolerance):
+            regressions.append(f"{result.key}: {result.peak_memory_bytes:,} bytes peak memory, "
+                               f"baseline {baseline['peak_memory_bytes']:,} bytes")
+
+    return regressions
+
+
+def print_results(results: list[StageResult]) -> None:
+
+    print(f"{'stage':<24}{'size':>10}{'seconds':>12}{'ops/sec':>16}{'peak memory (KiB)':>20}")
+    for result in results:
+        print(f"{result.stage:<24}{result.size:>10}{result.seconds:>12.3f}{result.ops_per_sec:>16,.0f}"
+              f"{result.peak_memory_bytes / 1024:>20,.0f}{' *' if result.parent_process_only else ''}")
+
+    if any(result.parent_process_only for result in results):
+        print("* parent process only, without the worker processes")
+
+
+def parse_arguments(arguments: Optional[list[str]] = None) -> argparse.Namespace:
+
+    parser = argparse.ArgumentParser(description="Benchmark the configuration-generation pipeline.")
+    parser.add_argument("--sizes", type=int, nargs='+', default=DEFAULT_SIZES, help="Roster sizes to benchmark.")
+    parser.add_argument("--save-baseline", action="store_true", help="Save the results as the new baselines.")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--skip-roster", action="store_true", help="Skip the end-to-end bulk roster stage.")
+
+    return parser.parse_args(arguments)
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+
+    benchmark_results = run_benchmarks(args.sizes, include_roster=not args.skip_roster)
+    print_results(benchmark_results)
+
+    if args.save_baseline:
+        save_baselines(benchmark_results)
+        print(f"\nBaselines saved to '{BASELINES_FILE}'.")
+        sys.exit()
+
+    found_regressions = find_regressions(benchmark_results, load_baselines(), args.tolerance)
+    if found_regressions:
+        print("\nREGRESSION:\n\t" + "\n\t".join(found_regressions))
+        sys.exit(1)
@@ -0,0 +1,150 @@
+""" Concurrency-safe writes into the environment directories of './terraform_states/'.
+
+The configuration scripts (many processes, possibly on many hosts sharing the states directory) and 'run_terraform.py'
+write into the same environment directories. So that they neither interleave nor leave half-written files:
+    * a process works on an environment with its lock held: an advisory lock ('fcntl.flock') on
+      '{az_subscription}/.{environment}.lock', next to the environment directory, so it can be taken before the
+      directory is created,
+    * every file is written into a temporary file in the same directory, and renamed over the final file,
+    * files that have to change together (i.e. the tfvars and its hash) are renamed according to a journal. If the
+      process dies between the renames, the next process taking the lock finishes them.
+
+Locks on network filesystems depend on the filesystem (NFS v4 supports them).
+"""
+
+import contextlib
+import fcntl
+import json
+import os
+import tempfile
+import time
+from typing import Iterator, Optional
+
+from python_code.constants import Message
+import python_code.config as conf
+
+TEMPORARY_SUFFIX = '.tmp'
+
+
+def get_lock_file(environment_dir: str) -> str:
+
+    parent_dir, name = os.path.split(os.path.normpath(environment_dir))
+    return os.path.join(parent_dir, f".{name}.lock")
+
+
+def get_journal_file(environment_dir: str) -> str:
+
+    return os.path.join(environment_dir, conf.ENVIRONMENT_JOURNAL_FILENAME)
+
+
+@contextlib.contextmanager
+def environment_lock(environment_dir: str, timeout: Optional[float] = None) -> Iterator[None]:
+    """Hold the lock of the environment. Waits for it at most 'timeout' seconds (forever if None), then raises
+    TimeoutError. The unfinished writes of a process that died holding the lock are recovered first."""
+
+    lock_file = get_lock_file(environment_dir)
+    os.makedirs(os.path.dirname(lock_file), exist_ok=True)
+
+    with open(lock_file, 'a') as lock:
+        if timeout is None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        else:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(Message.ENVIRONMENT_LOCKED.value.format(folder=environment_dir))
+                    time.sleep(conf.ENVIRONMENT_LOCK_POLL_SECONDS)
+
+        try:
+            recover(environment_dir)
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _fsync_dir(directory: str) -> None:
+    """Make the renames in the directory durable."""
+
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+def _write_temporary(file_name: str, content: str) -> str:
+    """Write the content into a new temporary file next to the file, and return its name."""
+
+    directory, name = os.path.split(os.path.abspath(file_name))
+    descriptor, temporary_file = tempfile.mkstemp(prefix=f".{name}.", suffix=TEMPORARY_SUFFIX, dir=directory)
+
+    try:
+        with os.fdopen(descriptor, 'w') as file:
+            file.write(content)
+            file.flush()
+            os.fsync(file.fileno())
+    except BaseException:
+        os.remove(temporary_file)
+        raise
+
+    return temporary_file
+
+
+def atomic_write(file_name: str, content: str) -> None:
+    """Readers see either the old or the new content, never a part of it."""
+
+    os.replace(_write_temporary(file_name, content), file_name)
+    _fsync_dir(os.path.dirname(os.path.abspath(file_name)))
+
+
+def journaled_write(environment_dir: str, contents: dict[str, str]) -> None:
+    """Write many files of the environment (by name) so that either none or all of them change, even if the process
+    dies in the middle. To be called with the lock of the environment held."""
+
+    renames = []
+    try:
+        for file_name, content in contents.items():
+            renames.append((_write_temporary(file_name, content), os.path.abspath(file_name)))
+    except BaseException:
+        for temporary_file, _ in renames:
+            os.remove(temporary_file)
+        raise
+
+    # From here on the files are changed: by this process, or by the recovery if it dies.
+    atomic_write(get_journal_file(environment_dir), json.dumps(renames))
+    _finish(environment_dir, renames)
+
+
+def _finish(environment_dir: str, renames: list[tuple[str, str]]) -> None:
+
+    for temporary_file, file_name in renames:
+        if os.path.exists(temporary_file):
+            os.replace(temporary_file, file_name)
+
+    os.remove(get_journal_file(environment_dir))
+    _fsync_dir(environment_dir)
+
+
+def recover(environment_dir: str) -> None:
+    """Finish the journaled writes of a process that died, and remove the temporary files it left behind.
+    To be called with the lock of the environment held."""
+
+    if not os.path.isdir(environment_dir):
+        return
+
+    try:
+        with open(get_journal_file(environment_dir), 'r') as file:
+            renames = json.load(file)
+    except FileNotFoundError:
+        pass
+    else:
+        _finish(environment_dir, renames)
+
+    with os.scandir(environment_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith('.') and entry.name.endswith(TEMPORARY_SUFFIX):
+                os.remove(entry.path)
@@ -0,0 +1,153 @@
+""" Lookups resolved once for a whole batch of environments, instead of once in every plan.
+
+Every plan would shell out to 'az account show' (data "external" "me") and query the latest LTS Databricks runtime
+and the smallest node type, with the same results for every environment. The values are resolved here once per batch
+(the node type once per region), written into a var file, and passed to terraform as the 'prefetched_*' variables,
+which make 'data.tf' skip the data sources.
+
+The resolver is pluggable: 'CliLookupResolver' asks the Azure and Databricks CLIs, 'StaticLookupResolver' returns
+the values of a JSON file (i.e. for running offline). A value the resolver cannot resolve (None) is left to the data
+source.
+"""
+
+import hashlib
+import json
+import os
+import re
+import subprocess
+from typing import Optional
+
+from python_code.atomic_files import atomic_write
+from python_code.terraform_states import Environment, read_tfvars_values
+import python_code.config as conf
+
+REGION_VARIABLE = 'azure-region'
+SPARK_SCALA_VERSION = '2.12'        # The default 'scala' of data "databricks_spark_version".
+LOOKUP_VARIABLES = {
+    'current_user': 'prefetched_current_user',
+    'spark_version': 'prefetched_spark_version',
+    'node_type_id': 'prefetched_node_type_id'
+}
+
+
+class LookupResolver:
+    """Resolves nothing: every value is looked up by the data sources."""
+
+    def current_user(self) -> Optional[str]:
+        return None
+
+    def spark_version(self) -> Optional[str]:
+        return None
+
+    def node_type_id(self, az_region: str) -> Optional[str]:
+        return None
+
+
+class StaticLookupResolver(LookupResolver):
+    """Values from a dict, i.e.: {"current_user": "...", "spark_version": "...", "node_type_id": "...",
+    "regions": {"westeurope": {"node_type_id": "..."}}}. The values of a region override the global ones."""
+
+    def __init__(self, values: dict):
+        self.values = values
+
+    @classmethod
+    def from_file(cls, lookups_file: str) -> 'StaticLookupResolver':
+
+        with open(lookups_file, 'r') as file:
+            return cls(json.load(file))
+
+    def _get(self, name: str, az_region: Optional[str] = None) -> Optional[str]:
+
+        regional = self.values.get('regions', {}).get(az_region, {}) if az_region else {}
+
+        return regional.get(name, self.values.get(name))
+
+    def current_user(self) -> Optional[str]:
+        return self._get('current_user')
+
+    def spark_version(self) -> Optional[str]:
+        return self._get('spark_version')
+
+    def node_type_id(self, az_region: str) -> Optional[str]:
+        return self._get('node_type_id', az_region)
+
+
+def _run_json(command: list[str]) -> Optional[object]:
+
+    try:
+        process = subprocess.run(command, capture_output=True, text=True, stdin=subprocess.DEVNULL, check=True)
+        return json.loads(process.stdout)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+
+def _version_key(spark_version: str) -> tuple[int, ...]:
+    """'13.3.x-scala2.12' -> (13, 3)"""
+
+    return tuple(int(number) for number in re.findall(r'\d+', spark_version.split('-')[0]))
+
+
+class CliLookupResolver(LookupResolver):
+    """The user from the Azure CLI (like data "external" "me"), the latest LTS runtime from the Databricks CLI
+    (its configured workspace). The node type depends on the region of the workspace, so it is left to the data
+    source."""
+
+    def current_user(self) -> Optional[str]:
+
+        user = _run_json(['az', 'account', 'show', '--query', 'user', '--output', 'json'])
+
+        return user.get('name') if isinstance(user, dict) else None
+
+    def spark_version(self) -> Optional[str]:
+        """Same as: data "databricks_spark_version" { long_term_support = true }, so with its default Scala version.
+        A runtime is released for more than one Scala version, i.e. '16.4.x-scala2.12' and '16.4.x-scala2.13'."""
+
+        result = _run_json(['databricks', 'clusters', 'spark-versions', '--output', 'json'])
+        if not isinstance(result, dict):
+            return None
+
+        keys = [version['key'] for version in result.get('versions', [])
+                if 'LTS' in version.get('name', '') and version['key'].endswith(f'-scala{SPARK_SCALA_VERSION}')
+                and not re.search(r'ML|GPU|Photon|aarch64', version.get('name', '') + version['key'])]
+
+        return max(keys, key=_version_key) if keys else None
+
+
+def format_lookup_tfvars(values: dict[str, str]) -> str:
+
+    return ''.join(f'{LOOKUP_VARIABLES[name]} = {json.dumps(value).replace("${", "$${")}\n'
+                   for name, value in sorted(values.items()))
+
+
+def save_lookup_tfvars(values: dict[str, str], prefetch_dir: str) -> str:
+    """The file is named after the hash of its content, so it is written once, and concurrent batches with the
+    same values share it."""
+
+    content = format_lookup_tfvars(values)
+    lookups_file = os.path.join(prefetch_dir, hashlib.sha256(content.encode('utf-8')).hexdigest()[:16] + '.tfvars')
+
+    if not os.path.exists(lookups_file):
+        os.makedirs(prefetch_dir, exist_ok=True)
+        atomic_write(lookups_file, content)
+
+    return lookups_file
+
+
+def prefetch_lookups(environments: list[Environment], resolver: LookupResolver,
+                     prefetch_dir: str = conf.TERRAFORM_PREFETCH_DIR) -> dict[str, str]:
+    """Resolve the lookups once for the batch, and return the var file of every environment (by key).
+    Environments without a resolved value have no var file."""
+
+    regions = {environment.key: read_tfvars_values(environment.tfvars_file).get(REGION_VARIABLE, '')
+               for environment in environments}
+
+    common = {'current_user': resolver.current_user(), 'spark_version': resolver.spark_version()}
+    lookups_files = {}
+
+    for az_region in sorted(set(regions.values())):
+        values = common | {'node_type_id': resolver.node_type_id(az_region) if az_region else None}
+        values = {name: value for name, value in values.items() if value is not None}
+        if values:
+            lookups_files[az_region] = save_lookup_tfvars(values, prefetch_dir)
+
+    return {key: lookups_files[az_region] for key, az_region in regions.items() if az_region in lookups_files}
@@ -5,17 +5,64 @@ DEFAULT_VARIABLE_VALUES = {
     TemplateTag.SUFFIX: "-Personal",
     TemplateTag.AZ_REGION: "westeurope",
     TemplateTag.DBX_ADMIN_GROUP_NAME: "dbx-metastore-admins",
-    TemplateTag.ADMIN_FLAG: "false"
+    TemplateTag.ADMIN_FLAG: "false",
+    TemplateTag.COMPUTE_PROFILE: "standard",     # See 'compute_profiles' in './terraform_code/variables.tf'.
+    TemplateTag.STORAGE_TIER: "standard",        # See 'storage_tiers' in './terraform_code/variables.tf'.
+    TemplateTag.INSTANCE_POOL_ENABLED: "false",
+    TemplateTag.INSTANCE_POOL_MIN_IDLE: "1",
+    TemplateTag.INSTANCE_POOL_IDLE_AUTOTERMINATION: "30",
+    TemplateTag.CLUSTER_NO_WAIT: "false"
 }
 
+# Default values the interactive script uses without asking (the roster can still override them).
+NOT_PROMPTED_TAGS = [
+    TemplateTag.INSTANCE_POOL_ENABLED,
+    TemplateTag.INSTANCE_POOL_MIN_IDLE,
+    TemplateTag.INSTANCE_POOL_IDLE_AUTOTERMINATION,
+    TemplateTag.CLUSTER_NO_WAIT
+]
+
 TERRAFORM_TFVARS_TEMPLATE_FILE = './terraform_code/terraform.tfvars.template'
+TERRAFORM_VARIABLES_FILE = './terraform_code/variables.tf'
 TERRAFORM_TFVARS_FILE = "./terraform_states/{az_subscription}/{environment}/terraform.tfvars"
+TERRAFORM_TFVARS_HASH_SUFFIX = '.sha256'     # The hash of the rendered tfvars is saved next to it, in incremental mode.
+TERRAFORM_TFSTATE_FILE = "./terraform_states/{az_subscription}/{environment}/terraform.tfstate"
+TERRAFORM_LOG_FILE = "./terraform_states/{az_subscription}/{environment}/terraform_{action}.log"
+TERRAFORM_LAYERS_FILE = "./terraform_states/{az_subscription}/{environment}/terraform_layers.txt"
+TERRAFORM_LAYER_TFSTATE_FILE = "./terraform_states/{az_subscription}/{environment}/terraform_{layer}.tfstate"
+TERRAFORM_LAYER_LOG_FILE = "./terraform_states/{az_subscription}/{environment}/terraform_{action}_{layer}.log"
+TERRAFORM_STATES_DIR = './terraform_states'
+INVENTORY_DB_FILE = './terraform_states/inventory.sqlite'
+TERRAFORM_TIMINGS_FILE = './terraform_states/timings.jsonl'     # Durations of the resources and stages.
+TERRAFORM_CODE_DIR = './terraform_code'
+TERRAFORM_LAYERS_DIR = './terraform_code/layers'
+
+# Layered states (see 'terraform_layers.py'): the layers of new environments in apply order (destroyed in reverse
+# order), and the layers whose outputs a layer reads, through its '{upstream}_state_file' variable.
+# With no layers, new environments get a single state, like the environments created before the layers.
+TERRAFORM_LAYERS = ['infra', 'unity_catalog', 'compute']
+TERRAFORM_LAYER_UPSTREAMS = {
+    'infra': [],
+    'unity_catalog': ['infra'],
+    'compute': ['infra']
+}
 
 ADMIN_CONFIG_FILE = './config/admin_config.json'
+SUBSCRIPTIONS_FILE = './config/subscriptions.json'      # Optional, for spreading the environments (see 'placement.py').
 COMMANDS_FILENAME = "./terraform_states/{az_subscription}/{environment}/terraform_commands.txt"
 
+# Locking of the environment directories (see 'atomic_files.py').
+ENVIRONMENT_JOURNAL_FILENAME = '.journal.json'
+ENVIRONMENT_LOCK_TIMEOUT_SECONDS = 60       # The configuration scripts wait this long for i.e. a terraform run.
+ENVIRONMENT_LOCK_POLL_SECONDS = 0.1
+
+# The environments are reviewed this many days after their configuration is created, and destroyed by the expiry
+# sweeper (see 'expiry_sweeper.py') unless their 'review_date' is extended.
+REVIEW_PERIOD_DAYS = 180
+
 EMAIL_PATTERN = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
 USERNAME_SPLIT_SEPARATOR = '.'
+USERNAME_MAX_DISAMBIGUATION = 100     # Colliding usernames get a number suffix: JohnDoe2, JohnDoe3, ...
 ACCEPT_STRINGS = ["Y", "y", "Yes", "yes", ""]
 
 APPLY_COMMAND_TEMPLATE = ('terraform -chdir="./terraform_code" apply '
@@ -25,3 +72,89 @@ APPLY_COMMAND_TEMPLATE = ('terraform -chdir="./terraform_code" apply '
 DESTROY_COMMAND_TEMPLATE = ('terraform -chdir="./terraform_code" destroy '
                             '-var-file="../terraform_states/{az_subscription}/{environment}/terraform.tfvars" '
                             '-state="../terraform_states/{az_subscription}/{environment}/terraform.tfstate"')
+
+# The commands of an environment with layered states, one per layer. The paths are relative to the layer directory.
+LAYER_ENVIRONMENT_DIR = '../../../terraform_states/{az_subscription}/{environment}'
+
+APPLY_LAYER_COMMAND_TEMPLATE = ('terraform -chdir="./terraform_code/layers/{layer}" apply '
+                                '-var-file="{environment_dir}/terraform.tfvars" '
+                                '-state="{environment_dir}/terraform_{layer}.tfstate"{upstream_vars}')
+
+DESTROY_LAYER_COMMAND_TEMPLATE = ('terraform -chdir="./terraform_code/layers/{layer}" destroy '
+                                  '-var-file="{environment_dir}/terraform.tfvars" '
+                                  '-state="{environment_dir}/terraform_{layer}.tfstate"{upstream_vars}')
+
+UPSTREAM_STATE_VAR_TEMPLATE = ' -var="{upstream}_state_file={environment_dir}/terraform_{upstream}.tfstate"'
+
+# Default quotas of a subscription in the registry (Azure defaults, the workspaces are a self-imposed limit).
+DEFAULT_SUBSCRIPTION_QUOTAS = {
+    'resource_groups': 980,
+    'storage_accounts_per_region': 250,
+    'workspaces_per_region': 100
+}
+
+# Reading the state files (see 'tfstate_reader.py') and the fleet report.
+TFSTATE_READ_CHUNK_SIZE = 64 * 1024
+FLEET_REPORT_MAX_WORKERS = 16
+FLEET_REPORT_OUTPUTS = ['dbx_workspace_url']
+
+# Bulk (roster based) configuration.
+ROSTER_EMAIL_COLUMN = 'email'
+ROSTER_BATCH_SIZE = 1024        # Number of roster rows read into memory and dispatched at once.
+ROSTER_CHUNK_SIZE = 64          # Number of rows sent to a worker process in one go.
+ROSTER_MAX_WORKERS = None       # None means: number of processors on the machine.
+
+# Configuration service (see 'config_service.py').
+CONFIG_SERVICE_HOST = '127.0.0.1'
+CONFIG_SERVICE_PORT = 8080
+CONFIG_SERVICE_BACKLOG = 1024           # Pending connections, for bursts of hundreds of concurrent requests.
+CONFIG_SERVICE_MAX_WORKERS = 8          # Threads writing the files of the environments.
+CONFIG_SERVICE_MAX_BODY_BYTES = 64 * 1024
+
+# Running terraform for many environments.
+TERRAFORM_EXECUTABLE = 'terraform'
+TERRAFORM_ACTIONS = ['plan', 'apply', 'destroy']
+TERRAFORM_MAX_WORKERS = 8                       # Environments processed at the same time.
+TERRAFORM_MAX_WORKERS_PER_SUBSCRIPTION = 4      # Keeps the Azure / Databricks API calls under the throttling limits.
+TERRAFORM_RETRIES = 2
+TERRAFORM_RETRY_BACKOFF_SECONDS = 30            # Doubled after every failed attempt.
+TERRAFORM_CACHE_DIR = './.terraform_cache'      # Shared provider plugin cache, initialized code, working copies.
+TERRAFORM_LOCK_FILENAME = '.terraform.lock.hcl'
+TERRAFORM_PLUGIN_MIRROR_DIR = None              # Local filesystem mirror of the providers, for offline init.
+TERRAFORM_PREFETCH_DIR = './.terraform_cache/prefetch'     # Var files with the lookups prefetched for a batch.
+PLAN_CACHE_FILENAME = 'plan_cache.json'         # Saved in the directory of every environment.
+LAYER_PLAN_CACHE_FILENAME = 'plan_cache_{layer}.json'     # One per layer, with layered states.
+TERRAFORM_DRIFT_REFRESH_DAYS = None             # None: up to date environments are never refreshed for drift.
+TERRAFORM_MAX_DRIFT_WORKERS = 2                 # Drift refreshes processed at the same time.
+
+# Destroying the expired environments (see 'expiry_sweeper.py').
+EXPIRY_SWEEP_BATCH_SIZE = 20                    # Environments destroyed in one batch.
+EXPIRY_SWEEP_BATCH_INTERVAL_SECONDS = 300       # Pause between the batches.
+
+# Dependency graph of the terraform code (see 'dependency_graph.py'): estimated durations in seconds, by resource type.
+DEPENDENCY_GRAPH_DURATIONS = {
+    'azurerm_resource_group': 15,
+    'azurerm_role_assignment': 30,
+    'azurerm_storage_account': 30,
+    'azurerm_storage_container': 5,
+    'azurerm_storage_management_policy': 10,
+    'azurerm_databricks_access_connector': 20,
+    'azurerm_databricks_workspace': 240,
+    'databricks_mws_permission_assignment': 10,
+    'databricks_metastore_assignment': 10,
+    'databricks_storage_credential': 10,
+    'databricks_external_location': 15,
+    'databricks_catalog': 10,
+    'databricks_schema': 5,
+    'databricks_grants': 10,
+    'databricks_workspace_binding': 5,
+    'databricks_cluster': 300,
+    'databricks_sql_endpoint': 60,
+    'databricks_permissions': 10,
+}
+DEPENDENCY_GRAPH_DEFAULT_DURATION = 10          # Resources of other types.
+DEPENDENCY_GRAPH_DATA_DURATION = 2              # Data sources.
+DEPENDENCY_GRAPH_REQUIRED_DEPENDS_ON = {        # Needed without a reference, not reported as serializing.
+    ('databricks_catalog.personal_catalog', 'databricks_external_location.personal_unity_ext'),    # Storage root.
+    ('databricks_schema.default', 'databricks_grants.personal_catalog_grants'),    # Created by the granted user.
+}
@@ -0,0 +1,337 @@
+""" Long-running HTTP/JSON service creating environment configurations, i.e. for a self-service portal.
+
+Running 'create_configuration_for_user.py' for every request pays the interpreter start-up, and reads the template,
+the admin config and all the existing environments every time. The service keeps them in memory instead:
+    * the compiled template, the variables of the terraform code and the admin config are loaded again only when their
+      file changes (modification time and size),
+    * the name index (see 'name_index.py') and the placement scheduler (see 'placement.py') are rebuilt only when an
+      environment is added to or removed from './terraform_states' by another process. The environments created by
+      the service itself are added to them directly.
+
+A request is a JSON object like a roster row (see 'create_configurations_for_roster.py'): an 'email', and optionally
+the values it overrides. Names and subscriptions are allocated in the event loop, one request at a time, so
+concurrent requests never get the same names. The files are written by a pool of threads, with the lock of the
+environment held (see 'atomic_files.py').
+
+>  python3 ./python_code/config_service.py --host 127.0.0.1 --port 8080
+>  curl -X POST http://127.0.0.1:8080/configurations -d '{"email": "john.doe@foo.bar", "compute_profile": "heavy"}'
+
+    POST /configurations    201 {"az_subscription", "environment", "tfvars_file", "terraform_commands"}
+                            400 invalid request, 409 existing environment, 503 environment locked,
+                            500 i.e. missing admin config
+    GET  /health            200 {"status": "ok"}
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from typing import Callable, Optional
+
+from python_code.atomic_files import atomic_write, environment_lock
+from python_code.constants import Message, TemplateTag
+from python_code.create_configuration_for_user import (
+    get_admin_config, get_environment_name, get_review_date, get_terraform_commands, save_tfvars
+)
+from python_code.create_configurations_for_roster import (
+    normalize_roster_row, get_roster_user_config, allocate_names, place_row
+)
+from python_code.inventory import update_inventory
+from python_code.name_index import NameIndex
+from python_code.placement import get_placement_scheduler
+from python_code.terraform_layers import assign_layers
+from python_code.terraform_states import Environment
+from python_code.tfvars_template import get_compiled_template
+from python_code.tfvars_validator import get_variable_specs, validate_tfvars
+import python_code.config as conf
+
+
+def get_file_version(file_name: str) -> Optional[tuple[int, int]]:
+    """Modification time and size of the file, None if it does not exist."""
+
+    try:
+        stat = os.stat(file_name)
+    except FileNotFoundError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_states_version(states_dir: str) -> tuple:
+    """Changes when an environment directory is added to or removed from a subscription directory. The states
+    directory itself is not included: the inventory database files in it change all the time."""
+
+    if not os.path.isdir(states_dir):
+        return ()
+
+    with os.scandir(states_dir) as entries:
+        return tuple(sorted((entry.name, entry.stat().st_mtime_ns) for entry in entries
+                            if entry.is_dir() and not entry.name.startswith('.')))
+
+
+class FileCache:
+    """A value loaded from a file, loaded again when the file changes."""
+
+    def __init__(self, file_name: str, loader: Callable[[str], object]):
+        self.file_name = file_name
+        self.loader = loader
+        self.version = None
+        self.value = None
+
+    def get(self) -> object:
+
+        version = get_file_version(self.file_name)
+        if version is None:
+            raise FileNotFoundError(f"'{self.file_name}' not found.")
+
+        if version != self.version:
+            self.value = self.loader(self.file_name)
+            self.version = version
+
+        return self.value
+
+
+class ConfigService:
+
+    def __init__(self, states_dir: str = conf.TERRAFORM_STATES_DIR,
+                 tfvars_template_file: str = conf.TERRAFORM_TFVARS_TEMPLATE_FILE,
+                 variables_file: str = conf.TERRAFORM_VARIABLES_FILE,
+                 admin_config_file: str = conf.ADMIN_CONFIG_FILE,
+                 subscriptions_file: str = conf.SUBSCRIPTIONS_FILE,
+                 tfvars_file_pattern: str = conf.TERRAFORM_TFVARS_FILE,
+                 commands_file_pattern: str = conf.COMMANDS_FILENAME,
+                 inventory_db_file: Optional[str] = conf.INVENTORY_DB_FILE,
+                 max_workers: int = conf.CONFIG_SERVICE_MAX_WORKERS):
+        """Without an inventory database file the inventory is not updated."""
+
+        self.states_dir = states_dir
+        self.subscriptions_file = subscriptions_file
+        self.tfvars_file_pattern = tfvars_file_pattern
+        self.commands_file_pattern = commands_file_pattern
+        self.inventory_db_file = inventory_db_file
+
+        self.tfvars_template = FileCache(tfvars_template_file, get_compiled_template)
+        self.variable_specs = FileCache(variables_file, get_variable_specs)
+        self.admin_config = FileCache(admin_config_file, get_admin_config)
+
+        self.states_version = None
+        self.name_index = None
+        self.scheduler = None
+        self.pending = {}               # The configs of the environments being written, by environment key.
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def refresh_indexes(self) -> None:
+
+        version = (get_states_version(self.states_dir), get_file_version(self.subscriptions_file))
+        if version == self.states_version:
+            return
+
+        self.name_index = NameIndex.from_states_dir(self.states_dir)
+        self.scheduler = get_placement_scheduler(self.subscriptions_file, self.states_dir)
+        self.states_version = version
+
+        # The environments being written may not be in the directory yet.
+        for environment, config in self.pending.values():
+            email = config[TemplateTag.EMAIL.value]
+            self.name_index.add(email, config[TemplateTag.USERNAME.value], config[TemplateTag.PREFIX.value],
+                                config[TemplateTag.SUFFIX.value])
+            if self.scheduler is not None and not os.path.exists(environment.tfvars_file):
+                self.scheduler.add(environment.az_subscription, config[TemplateTag.AZ_REGION.value], email)
+
+    def accept_own_change(self, az_subscription: str) -> None:
+        """The service added an environment to the subscription directory, and to the indexes: that change of the
+        directory should not make them rebuilt."""
+
+        if self.states_version is None:
+            return
+
+        states_version, subscriptions_version = self.states_version
+        versions = dict(states_version)
+        versions[az_subscription] = dict(get_states_version(self.states_dir)).get(az_subscription)
+        self.states_version = (tuple(sorted(versions.items())), subscriptions_version)
+
+    def prepare(self, row: dict) -> tuple[Environment, dict[str, str], str]:
+        """The environment of the request and its tfvars content. Runs in the event loop, so the names and the
+        subscription are allocated one request at a time. Raises ValueError for an invalid request."""
+
+        self.refresh_indexes()
+        row = normalize_roster_row(row)
+
+        config = get_roster_user_config(row, {} if self.scheduler is not None else self.admin_config.get())
+        config[TemplateTag.REVIEW_DATE.value] = config.get(TemplateTag.REVIEW_DATE.value) or get_review_date()
+        try:
+            if self.scheduler is not None:
+                place_row(row, config, self.scheduler)
+            allocate_names(row, config, self.name_index)
+            tfvars_content = self.tfvars_template.get().render(config)
+            errors = validate_tfvars(tfvars_content, self.variable_specs.get())
+            if errors:
+                raise ValueError(' '.join(errors))
+        except ValueError:
+            self.states_version = None      # The allocations of the failed request are dropped by a rebuild.
+            raise
+
+        az_subscription = config[TemplateTag.AZ_SUBSCRIPTION_ID.value]
+        environment = get_environment_name(config)
+        tfvars_file = self.tfvars_file_pattern.format(az_subscription=az_subscription, environment=environment)
+
+        return Environment(az_subscription, environment, os.path.dirname(tfvars_file)), config, tfvars_content
+
+    def save(self, environment: Environment, tfvars_content: str) -> list[str]:
+        """Write the files of a new environment, and return its apply commands. Runs in a thread of the pool."""
+
+        with environment_lock(environment.path, conf.ENVIRONMENT_LOCK_TIMEOUT_SECONDS):
+            if os.path.exists(environment.path):
+                raise FileExistsError(Message.FOLDER_ALREADY_EXISTS.value.format(folder=environment.path).strip())
+
+            save_tfvars(tfvars_content, environment.tfvars_file, incremental=True)
+            apply_commands, destroy_commands = get_terraform_commands(
+                environment.az_subscription, environment.name, assign_layers(environment)
+            )
+            atomic_write(self.commands_file_pattern.format(az_subscription=environment.az_subscription,
+                                                           environment=environment.name),
+                         "\n".join(apply_commands + destroy_commands))
+
+        if self.inventory_db_file:
+            update_inventory([environment], self.inventory_db_file)
+
+        return apply_commands
+
+    async def create_configuration(self, row: dict) -> dict:
+
+        environment, config, tfvars_content = self.prepare(row)
+        if environment.key in self.pending:
+            self.states_version = None      # The subscription placed again is dropped by a rebuild.
+            raise FileExistsError(Message.FOLDER_ALREADY_EXISTS.value.format(folder=environment.path).strip())
+
+        self.pending[environment.key] = (environment, config)
+        try:
+            apply_commands = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.save, environment, tfvars_content
+            )
+        except BaseException:
+            self.states_version = None
+            raise
+        else:
+            self.accept_own_change(environment.az_subscription)
+        finally:
+            del self.pending[environment.key]
+
+        return {'az_subscription': environment.az_subscription, 'environment': environment.name,
+                'tfvars_file': environment.tfvars_file, 'terraform_commands': apply_commands}
+
+    async def dispatch(self, method: str, path: str, body: bytes) -> tuple[HTTPStatus, dict]:
+
+        if path == '/health':
+            if method != 'GET':
+                return HTTPStatus.METHOD_NOT_ALLOWED, {'error': HTTPStatus.METHOD_NOT_ALLOWED.phrase}
+            return HTTPStatus.OK, {'status': 'ok'}
+
+        if path != '/configurations':
+            return HTTPStatus.NOT_FOUND, {'error': HTTPStatus.NOT_FOUND.phrase}
+        if method != 'POST':
+            return HTTPStatus.METHOD_NOT_ALLOWED, {'error': HTTPStatus.METHOD_NOT_ALLOWED.phrase}
+
+        try:
+            row = json.loads(body)
+            if not isinstance(row, dict):
+                raise ValueError(Message.SERVICE_INVALID_REQUEST.value)
+            return HTTPStatus.CREATED, await self.create_configuration(row)
+        except FileExistsError as e:
+            return HTTPStatus.CONFLICT, {'error': str(e)}
+        except TimeoutError as e:
+            return HTTPStatus.SERVICE_UNAVAILABLE, {'error': str(e)}
+        except ValueError as e:             # Including invalid JSON.
+            return HTTPStatus.BAD_REQUEST, {'error': str(e)}
+        except OSError as e:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """HTTP/1.1 with keep-alive: the requests of a connection are answered one after the other."""
+
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+
+                headers = {}
+                while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                    length = int(headers.get('content-length', 0))
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self.respond(writer, HTTPStatus.BAD_REQUEST, {'error': HTTPStatus.BAD_REQUEST.phrase}, False)
+                    break
+
+                if length > conf.CONFIG_SERVICE_MAX_BODY_BYTES:
+                    await self.respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                       {'error': HTTPStatus.REQUEST_ENTITY_TOO_LARGE.phrase}, False)
+                    break
+
+                body = await reader.readexactly(length)
+                status, payload = await self.dispatch(method, target.split('?', 1)[0], body)
+
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def respond(writer: asyncio.StreamWriter, status: HTTPStatus, payload: dict, keep_alive: bool) -> None:
+
+        body = json.dumps(payload).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode('latin-1') + body
+        )
+        await writer.drain()
+
+    async def start(self, host: str = conf.CONFIG_SERVICE_HOST, port: int = conf.CONFIG_SERVICE_PORT) \
+            -> asyncio.AbstractServer:
+
+        return await asyncio.start_server(self.handle_connection, host, port, backlog=conf.CONFIG_SERVICE_BACKLOG)
+
+
+async def serve(service: ConfigService, host: str, port: int) -> None:
+
+    server = await service.start(host, port)
+    print(Message.SERVICE_LISTENING.value.format(host=host, port=server.sockets[0].getsockname()[1]))
+
+    async with server:
+        await server.serve_forever()
+
+
+def parse_arguments() -> argparse.Namespace:
+
+    parser = argparse.ArgumentParser(description="Serve the creation of environment configurations over HTTP.")
+    parser.add_argument("--host", default=conf.CONFIG_SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=conf.CONFIG_SERVICE_PORT)
+    parser.add_argument("--workers", type=int, default=conf.CONFIG_SERVICE_MAX_WORKERS,
+                        help="Threads writing the files of the environments.")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+
+    try:
+        asyncio.run(serve(ConfigService(max_workers=args.workers), args.host, args.port))
+    except KeyboardInterrupt:
+        pass
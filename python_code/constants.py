@@ -20,6 +20,13 @@ class TemplateTag(Enum):
     AZ_REGION = "<AZ_REGION>"
     DBX_ADMIN_GROUP_NAME = "<DBX_ADMIN_GROUP_NAME>"
     ADMIN_FLAG = "<ADMIN_FLAG>"
+    COMPUTE_PROFILE = "<COMPUTE_PROFILE>"
+    STORAGE_TIER = "<STORAGE_TIER>"
+    REVIEW_DATE = "<REVIEW_DATE>"
+    INSTANCE_POOL_ENABLED = "<INSTANCE_POOL_ENABLED>"
+    INSTANCE_POOL_MIN_IDLE = "<INSTANCE_POOL_MIN_IDLE>"
+    INSTANCE_POOL_IDLE_AUTOTERMINATION = "<INSTANCE_POOL_IDLE_AUTOTERMINATION>"
+    CLUSTER_NO_WAIT = "<CLUSTER_NO_WAIT>"
     AZ_SUBSCRIPTION_ID = "<AZ_SUBSCRIPTION_ID>"
     DBX_ACCOUNT_ID = "<DBX_ACCOUNT_ID>"
     DBX_METASTORE_ID = "<DBX_METASTORE_ID>"
@@ -46,6 +53,73 @@ class Message(Enum):
 
     INVALID_EMAIL = "Invalid email address provided. Quiting.."
     TERRAFORM_COMMAND = "\nTo create the environment run the following terraform command:"
+    TERRAFORM_LAYER_COMMANDS = "\nTo create the environment run the following terraform commands, in this order:"
     TRY_AGAIN = "Try again!"
     FOLDER_ALREADY_EXISTS = "\n'{folder}/' folder already exists. Overwriting is prohibited!"
+    ENVIRONMENT_LOCKED = "'{folder}/' is locked by another process (a configuration script or a terraform run)."
     SUCCESS = "\n'{tfvars_file}' file saved.\nSUCCESS!"
+    USERNAME_COLLISION = "Username '{username}' is already used by '{email}'."
+    RESOURCE_GROUP_COLLISION = "Resource group '{resource_group}' is already used by '{email}'."
+    CATALOG_COLLISION = "Catalog '{catalog}' is already used by '{email}'."
+    USERNAME_NOT_ALLOCATED = "No free username found for '{username}'."
+    NO_SUBSCRIPTION_CAPACITY = "No subscription has a metastore and free capacity in region '{az_region}'."
+    UNKNOWN_SUBSCRIPTION = "Subscription '{az_subscription}' is not in the subscriptions registry, give its " \
+                           "Databricks account and metastore too."
+    NO_SUBSCRIPTION_METASTORE = "Subscription '{az_subscription}' has no metastore in region '{az_region}'."
+    PLACED_IN_SUBSCRIPTION = "\nThe environment is placed in subscription: '{az_subscription}'"
+    INVALID_TFVARS = "\nThe configuration is invalid:\n\t{errors}"
+    UNKNOWN_VARIABLE = "'{name}' is not a variable of the terraform code."
+    MISSING_VARIABLE = "No value for the required variable '{name}'."
+    WRONG_VARIABLE_TYPE = "'{name}' should be a {type}, got: '{value}'."
+    NOT_ALLOWED_VARIABLE_VALUE = "'{name}' should be one of: {allowed}, got: '{value}'."
+    NOT_MATCHING_VARIABLE_VALUE = "'{name}' should match '{pattern}', got: '{value}'."
+    TEMPLATE_UNKNOWN_TAGS = "Unknown tag(s) in the template: {tags}."
+    TEMPLATE_MISSING_VALUES = "No value for the template tag(s): {tags}."
+    ROSTER_INVALID_EMAIL = "Invalid email address: '{email}'."
+    EMAIL_NO_AT = "Invalid email address: '{email}', it has no '@'."
+    EMAIL_INVALID_LOCAL_PART = "Invalid email address: '{email}', the part before the '@' should be letters, " \
+                               "digits and '_.+-'."
+    EMAIL_INVALID_DOMAIN = "Invalid email address: '{email}', the domain should be letters, digits and '-', " \
+                           "then a '.', then letters, digits and '-.'."
+    ROSTER_UNKNOWN_COLUMNS = "Unknown roster column(s): {columns}."
+    ROSTER_UNSUPPORTED_FILE = "Unsupported roster file: '{roster_file}'. Use a '.csv' or '.jsonl' file."
+    ROSTER_ROW_SUCCESS = "Row {row_number}: '{email}' -> '{environment}' SUCCESS"
+    ROSTER_ROW_UNCHANGED = "Row {row_number}: '{email}' -> '{environment}' UNCHANGED"
+    ROSTER_ROW_FAILURE = "Row {row_number}: '{email}' FAILED: {error}"
+    ROSTER_SUMMARY = "\nProcessed {total} row(s): {succeeded} succeeded, {failed} failed."
+    SERVICE_INVALID_REQUEST = "The request should be a JSON object, i.e.: {\"email\": \"john.doe@foo.bar\"}"
+    SERVICE_LISTENING = "Serving the configurations on http://{host}:{port}/configurations"
+
+
+class RunMessage(Enum):
+    """Messages output by the script running terraform for many environments."""
+
+    NO_ENVIRONMENTS = "No environments found in '{states_dir}'."
+    STARTING = "Running 'terraform {action}' for {count} environment(s).."
+    INIT_FAILED = "'terraform init' FAILED with exit code {returncode}, see '{log_file}'"
+    ATTEMPT = "\n### terraform {action} - attempt {attempt}: {command}\n"
+    SUCCESS = "'{environment}' {action} SUCCESS (attempt {attempts})"
+    LAYERS_SUCCESS = "'{environment}' {action} SUCCESS for the layer(s): {layers} (attempts {attempts})"
+    FAILURE = "'{environment}' {action} FAILED with exit code {returncode} after {attempts} attempt(s), see '{log_file}'"
+    SKIPPED = "'{environment}' {action} SKIPPED, no changes since the last apply"
+    ERROR = "'{environment}' {action} FAILED: {error}, see '{log_file}'"
+    ERROR_LOG = "\n### terraform {action} - FAILED: {error}\n"
+    SUMMARY = "\n{action}: {succeeded} succeeded, {failed} failed, {skipped} skipped."
+    EXPIRED = "'{environment}' expired on {review_date}"
+    UNREADABLE_STATE = "'{environment}' SKIPPED, its state cannot be read: {error}"
+    NO_EXPIRED_ENVIRONMENTS = "No expired environments in '{states_dir}'."
+    EXPIRED_DRY_RUN = "\n{count} expired environment(s). Run with '--execute' to destroy them."
+    SWEEP_BATCH = "\nDestroying batch {batch} of {batches} ({count} environment(s)).."
+    SWEEP_STOPPED = "\nThe sweep stopped after a batch with failures, {remaining} expired environment(s) left."
+
+
+class GraphMessage(Enum):
+    """Messages output by the dependency graph analyzer."""
+
+    CRITICAL_PATH = "Critical path: {seconds:.0f}s"
+    CRITICAL_PATH_NODE = "\t{address} ({seconds:.0f}s)"
+    REDUNDANT = "\nRedundant 'depends_on' (implied by the references):"
+    EDGE = "\t{address} -> {dependency}"
+    SERIALIZING = "\nSerializing 'depends_on' (not needed by the references, lengthen the critical path):"
+    SERIALIZING_EDGE = "\t{address} -> {dependency}: {before:.0f}s -> {after:.0f}s without it"
+    NO_FINDINGS = "\nNo redundant or serializing 'depends_on'."
@@ -1,15 +1,66 @@
+import datetime
+import hashlib
 import json
 import re
 import sys
 import os
+from typing import Iterable, NamedTuple, Optional, Union
+from python_code.atomic_files import atomic_write, environment_lock, journaled_write
 from python_code.constants import TemplateTag, Prompt, Message
+from python_code.inventory import update_inventory
+from python_code.name_index import NameIndex
+from python_code.placement import PlacementScheduler, get_placement_scheduler
+from python_code.terraform_layers import assign_layers, get_layer_commands
+from python_code.terraform_states import Environment, read_tfvars_values
+from python_code.tfvars_validator import VariableSpec, get_variable_specs, validate_tfvars
+from python_code.tfvars_template import CompiledTemplate, compile_template, get_compiled_template
 import python_code.config as conf
 
 
+# The pattern 'scan_email' checks without a regex, and the characters of its parts.
+SCANNED_EMAIL_PATTERN = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
+_ALNUM = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+_LOCAL_PART_CHARS = frozenset(_ALNUM + '_.+-')
+_DOMAIN_NAME_CHARS = frozenset(_ALNUM + '-')
+_DOMAIN_REST_CHARS = frozenset(_ALNUM + '-.')
+
+
+class ProposedUsername(NamedTuple):
+    """Outcome of checking one email address: 'username' is None and 'error' the reason if it is invalid."""
+
+    email: str
+    username: Optional[str]
+    error: Optional[str]
+
+
+def scan_email(email: str) -> Optional[str]:
+    """The reason why the email address does not match 'SCANNED_EMAIL_PATTERN', None if it does.
+    Every character is looked at a fixed number of times, so the time is linear in the length of the address
+    whatever its content (i.e. long domains from a self-service form), without depending on regex backtracking."""
+
+    # Like '$' in the pattern, a newline at the end is accepted.
+    local_part, at, domain = (email[:-1] if email.endswith('\n') else email).partition('@')
+    if not at:
+        return Message.EMAIL_NO_AT.value.format(email=email)
+    if not local_part or not _LOCAL_PART_CHARS.issuperset(local_part):
+        return Message.EMAIL_INVALID_LOCAL_PART.value.format(email=email)
+
+    # The name cannot contain '.', so the '.' of the pattern is the first one.
+    name, dot, rest = domain.partition('.')
+    if not name or not rest or not _DOMAIN_NAME_CHARS.issuperset(name) or not _DOMAIN_REST_CHARS.issuperset(rest):
+        return Message.EMAIL_INVALID_DOMAIN.value.format(email=email)
+
+    return None
+
+
 def validate_email(email: str) -> bool:
-    """Validate value against email pattern specified in 'config.email_pattern'."""
+    """Validate value against email pattern specified in 'config.email_pattern'.
+    The default pattern is checked by 'scan_email', a changed one by the regex."""
+
+    if conf.EMAIL_PATTERN != SCANNED_EMAIL_PATTERN:
+        return re.match(conf.EMAIL_PATTERN, email) is not None
 
-    return re.match(conf.EMAIL_PATTERN, email) is not None
+    return scan_email(email) is None
 
 
 def get_email() -> str:
@@ -30,6 +81,11 @@ def get_proposed_username(email: str) -> str:
     'config.username_split_separator', capitalizing every split, and joining bac together.
     I.e.: for 'john.doe.jr@foo.bar', it will propose 'JohnDoeJr'."""
 
+    if conf.USERNAME_SPLIT_SEPARATOR == '.':
+        # Title-casing the whole local part capitalizes the same letters as title-casing its splits: '.' and '-'
+        # are not letters, so a word starts after them either way.
+        return email.partition('@')[0].title().replace('.', '').replace('-', '')
+
     email = email.replace('-', '.')     # In some special case '-' is also a separator.
     username_splits = email.split('@')[0].split(conf.USERNAME_SPLIT_SEPARATOR)
 
@@ -38,6 +94,51 @@ def get_proposed_username(email: str) -> str:
     return ''.join(capitalized_splits)
 
 
+def get_proposed_usernames(emails: Iterable[str]) -> list[ProposedUsername]:
+    """Validate many email addresses (i.e. of a roster) at once, and propose the usernames of the valid ones.
+    The results are the same as of 'validate_email' and 'get_proposed_username' called one by one."""
+
+    if conf.EMAIL_PATTERN != SCANNED_EMAIL_PATTERN:
+        return [ProposedUsername(email, get_proposed_username(email), None) if validate_email(email)
+                else ProposedUsername(email, None, Message.ROSTER_INVALID_EMAIL.value.format(email=email))
+                for email in emails]
+
+    results = []
+    for email in emails:
+        error = scan_email(email)
+        results.append(ProposedUsername(email, None if error else get_proposed_username(email), error))
+
+    return results
+
+
+def get_review_date(today: Optional[datetime.date] = None) -> str:
+    """The review date of a new environment: 'config.REVIEW_PERIOD_DAYS' from today."""
+
+    return ((today or datetime.date.today()) + datetime.timedelta(days=conf.REVIEW_PERIOD_DAYS)).isoformat()
+
+
+def set_review_date(config: dict[str, str], tfvars_file: str) -> None:
+    """A regenerated configuration keeps the review date of the existing one, so it is computed only once. A review
+    date already in the config (i.e. from a roster column) is kept. To be called with the lock of the environment
+    held."""
+
+    if config.get(TemplateTag.REVIEW_DATE.value):
+        return
+
+    try:
+        review_date = read_tfvars_values(tfvars_file).get('review_date')
+    except FileNotFoundError:
+        review_date = None
+
+    config[TemplateTag.REVIEW_DATE.value] = review_date or get_review_date()
+
+
+def get_environment_name(config: dict[str, str]) -> str:
+    """The environment (and its Azure resource group) is named as: {PREFIX}{USERNAME}{SUFFIX}."""
+
+    return config[TemplateTag.PREFIX.value] + config[TemplateTag.USERNAME.value] + config[TemplateTag.SUFFIX.value]
+
+
 def get_variable_value_based_on_suggestion(proposed_value: str, accept_prompt: str, input_prompt: str) -> str:
     """Prompts the user to either accept or reject a proposed value.
     If the user rejects, then it prompts for an input value."""
@@ -60,9 +161,7 @@ def accept_user_config(config: dict[str, str]):
 
     print(Prompt.ACCEPT_USER_CONFIG_VALUES.value.format(
         config=config,
-        resource_group=config[TemplateTag.PREFIX.value] +
-                       config[TemplateTag.USERNAME.value] +
-                       config[TemplateTag.SUFFIX.value],
+        resource_group=get_environment_name(config),
         az_region=config[TemplateTag.AZ_REGION.value]))
     proposed_config = input(Prompt.ACCEPT_PROPOSED_CONFIG.value)
 
@@ -92,7 +191,7 @@ def get_user_config_values(email: str = None) -> dict[str, str]:
 
     # Loop through and the required user config values that have defaults.
     for tag in [TemplateTag.PREFIX, TemplateTag.SUFFIX, TemplateTag.AZ_REGION, TemplateTag.DBX_ADMIN_GROUP_NAME,
-                TemplateTag.ADMIN_FLAG]:
+                TemplateTag.ADMIN_FLAG, TemplateTag.COMPUTE_PROFILE, TemplateTag.STORAGE_TIER]:
 
         config[tag.value] = get_variable_value_based_on_suggestion(
             proposed_value=conf.DEFAULT_VARIABLE_VALUES[tag],
@@ -102,11 +201,28 @@ def get_user_config_values(email: str = None) -> dict[str, str]:
             input_prompt=Prompt.ENTER_DESIRED_VALUE.value.format(variable=tag.value)
         )
 
+    config |= {tag.value: conf.DEFAULT_VARIABLE_VALUES[tag] for tag in conf.NOT_PROMPTED_TAGS}
+    config[TemplateTag.REVIEW_DATE.value] = get_review_date()     # The script never overwrites an environment.
+
     accept_user_config(config)
 
     return config
 
 
+def check_name_collisions(config: dict[str, str], name_index: NameIndex) -> None:
+    """Quit if the names of the new environment are already used by the environment of another user."""
+
+    collisions = name_index.find_collisions(
+        config[TemplateTag.EMAIL.value], config[TemplateTag.USERNAME.value],
+        config[TemplateTag.PREFIX.value], config[TemplateTag.SUFFIX.value]
+    )
+
+    if collisions:
+        print('\n'.join(collisions))
+        print(Message.TRY_AGAIN.value)
+        sys.exit()
+
+
 def read_tfvars_template(terraform_tfvars_template_file: str) -> str:
 
     with open(terraform_tfvars_template_file, 'r') as file:
@@ -123,49 +239,122 @@ def get_admin_config(admin_config_file: str) -> dict[str, str]:
     return json.loads(config_file)
 
 
-def replace_values_in_template(tfvars_template: str, config: dict[str, str]) -> str:
+def get_placed_admin_config(config: dict[str, str], scheduler: PlacementScheduler) -> dict[str, str]:
+    """The admin config of the subscription the scheduler places the environment in. Quit if none has capacity."""
+
+    try:
+        subscription = scheduler.place(config[TemplateTag.EMAIL.value], config[TemplateTag.AZ_REGION.value])
+    except ValueError as e:
+        print(e)
+        print(Message.TRY_AGAIN.value)
+        sys.exit()
+
+    print(Message.PLACED_IN_SUBSCRIPTION.value.format(az_subscription=subscription.az_subscription_id))
+
+    return subscription.admin_config(config[TemplateTag.AZ_REGION.value])
+
+
+def replace_values_in_template(tfvars_template: Union[str, CompiledTemplate], config: dict[str, str]) -> str:
 
-    for tag in TemplateTag:
-        tfvars_template = tfvars_template.replace(tag.value, config[tag.value])
+    if isinstance(tfvars_template, str):
+        tfvars_template = compile_template(tfvars_template)
 
-    return tfvars_template
+    return tfvars_template.render(config)
 
 
-def save_tfvars(tfvars_content: str, tfvars_file: str) -> None:
+def get_tfvars_hash(tfvars_content: str) -> str:
+
+    return hashlib.sha256(tfvars_content.encode('utf-8')).hexdigest()
+
+
+def tfvars_changed(tfvars_content: str, tfvars_file: str) -> bool:
+    """Compare the hash of the rendered content with the hash saved when the tfvars file was last written."""
 
     try:
-        os.makedirs(os.path.dirname(tfvars_file), exist_ok=False)
+        with open(tfvars_file + conf.TERRAFORM_TFVARS_HASH_SUFFIX, 'r') as file:
+            saved_hash = file.read().strip()
+    except FileNotFoundError:
+        return True
+
+    return saved_hash != get_tfvars_hash(tfvars_content) or not os.path.isfile(tfvars_file)
+
+
+def check_tfvars(tfvars_content: str, variable_specs: dict[str, VariableSpec]) -> None:
+    """Quit if the rendered tfvars does not match the variables of the terraform code."""
+
+    errors = validate_tfvars(tfvars_content, variable_specs)
+
+    if errors:
+        print(Message.INVALID_TFVARS.value.format(errors='\n\t'.join(errors)))
+        sys.exit()
+
+
+def save_tfvars(tfvars_content: str, tfvars_file: str, incremental: bool = False) -> bool:
+    """Save the tfvars file, and the hash of its content next to it. Returns if the file was written.
+    By default an existing environment folder is never overwritten. In incremental mode the folder may exist,
+    and the file is only rewritten if its content changed. The two files are replaced together (see 'atomic_files.py'),
+    the caller holds the lock of the environment."""
+
+    try:
+        os.makedirs(os.path.dirname(tfvars_file), exist_ok=incremental)
     except FileExistsError:
         print(Message.FOLDER_ALREADY_EXISTS.value.format(folder=os.path.dirname(tfvars_file)))
         sys.exit()
 
-    with open(tfvars_file, "w") as f:
-        f.write(tfvars_content)
+    if incremental and not tfvars_changed(tfvars_content, tfvars_file):
+        return False
 
+    journaled_write(os.path.dirname(tfvars_file), {
+        tfvars_file: tfvars_content,
+        tfvars_file + conf.TERRAFORM_TFVARS_HASH_SUFFIX: get_tfvars_hash(tfvars_content)
+    })
 
-def print_and_save_terraform_commands(file: str, az_subscription: str, environment: str):
+    return True
 
-    apply_command = conf.APPLY_COMMAND_TEMPLATE.format(
-        az_subscription=az_subscription, environment=environment
-    )
-    destroy_command = conf.DESTROY_COMMAND_TEMPLATE.format(
-        az_subscription=az_subscription, environment=environment
+
+def get_terraform_commands(az_subscription: str, environment: str,
+                           layers: Optional[list[str]] = None) -> tuple[list[str], list[str]]:
+    """The apply and the destroy commands of the environment. With layered states there is a command per layer:
+    apply goes in the order of the layers, destroy in the reverse order."""
+
+    if not layers:
+        return (
+            [conf.APPLY_COMMAND_TEMPLATE.format(az_subscription=az_subscription, environment=environment)],
+            [conf.DESTROY_COMMAND_TEMPLATE.format(az_subscription=az_subscription, environment=environment)]
+        )
+
+    return (
+        get_layer_commands(conf.APPLY_LAYER_COMMAND_TEMPLATE, az_subscription, environment, layers),
+        get_layer_commands(conf.DESTROY_LAYER_COMMAND_TEMPLATE, az_subscription, environment, layers[::-1])
     )
 
-    print(Message.TERRAFORM_COMMAND.value + "\n" + apply_command)
 
-    with open(file, "w") as f:
-        f.write(f"{apply_command}\n{destroy_command}")
+def print_and_save_terraform_commands(file: str, az_subscription: str, environment: str,
+                                      layers: Optional[list[str]] = None):
+
+    apply_commands, destroy_commands = get_terraform_commands(az_subscription, environment, layers)
+
+    message = Message.TERRAFORM_LAYER_COMMANDS if layers else Message.TERRAFORM_COMMAND
+    print(message.value + "\n" + "\n".join(apply_commands))
+
+    atomic_write(file, "\n".join(apply_commands + destroy_commands))
 
 
 if __name__ == "__main__":
 
-    config = get_user_config_values() | get_admin_config(conf.ADMIN_CONFIG_FILE)
-    env_name = config[TemplateTag.PREFIX.value] + config[TemplateTag.USERNAME.value] + config[TemplateTag.SUFFIX.value]
+    config = get_user_config_values()
+    placement_scheduler = get_placement_scheduler()
+    if placement_scheduler is not None:
+        config |= get_placed_admin_config(config, placement_scheduler)
+    else:
+        config |= get_admin_config(conf.ADMIN_CONFIG_FILE)
+    check_name_collisions(config, NameIndex.from_states_dir())
+    env_name = get_environment_name(config)
     az_subscription = config[TemplateTag.AZ_SUBSCRIPTION_ID.value]
 
-    tfvars_template = read_tfvars_template(conf.TERRAFORM_TFVARS_TEMPLATE_FILE)
+    tfvars_template = get_compiled_template(conf.TERRAFORM_TFVARS_TEMPLATE_FILE)
     tfvars_content = replace_values_in_template(tfvars_template, config)
+    check_tfvars(tfvars_content, get_variable_specs(conf.TERRAFORM_VARIABLES_FILE))
     tfvars_file = conf.TERRAFORM_TFVARS_FILE.format(
         az_subscription=az_subscription, environment=env_name
     )
@@ -174,8 +363,17 @@ if __name__ == "__main__":
         az_subscription=az_subscription, environment=env_name
     )
 
-    save_tfvars(tfvars_content, tfvars_file)
+    environment = Environment(az_subscription, env_name, os.path.dirname(tfvars_file))
 
-    print(Message.SUCCESS.value.format(tfvars_file=tfvars_file))
+    try:
+        with environment_lock(environment.path, conf.ENVIRONMENT_LOCK_TIMEOUT_SECONDS):
+            save_tfvars(tfvars_content, tfvars_file)
+
+            print(Message.SUCCESS.value.format(tfvars_file=tfvars_file))
+
+            print_and_save_terraform_commands(commands_file, az_subscription, env_name, assign_layers(environment))
+    except TimeoutError as error:
+        print(error)
+        sys.exit()
 
-    print_and_save_terraform_commands(commands_file, az_subscription, env_name)
+    update_inventory([environment])
@@ -0,0 +1,361 @@
+""" Non-interactive, bulk version of 'create_configuration_for_user.py'.
+
+Reads a roster file (CSV with a header row, or JSONL) with one user per row. Every row needs an 'email', and it can
+optionally override any of the template values, i.e.: 'username', 'prefix', 'suffix', 'az_region',
+'dbx_admin_group_name', 'admin_flag'. Values not given in the roster are the same as the ones proposed by the
+interactive script.
+
+With a subscription registry ('./config/subscriptions.json'), every row is placed in the least used subscription
+with capacity in its region (see 'placement.py'), unless the row gives its 'az_subscription_id'.
+
+The rows are streamed and the configurations are rendered and saved by a pool of worker processes.
+A bad row does not stop the run: every row gets a success or failure line in the summary.
+
+In incremental mode existing environments are re-rendered (i.e. after a change of the template or of the defaults),
+but only the ones whose tfvars content changed are rewritten. The list of these changed environments can be saved,
+and passed on to 'run_terraform.py', so only they get planned / applied.
+"""
+
+import argparse
+import contextlib
+import csv
+import io
+import itertools
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, NamedTuple, Optional
+
+from python_code.atomic_files import environment_lock
+from python_code.constants import TemplateTag, Message
+from python_code.create_configuration_for_user import (
+    validate_email, get_proposed_username, get_environment_name, get_admin_config,
+    replace_values_in_template, save_tfvars, print_and_save_terraform_commands, set_review_date
+)
+from python_code.inventory import update_inventory
+from python_code.name_index import NameIndex
+from python_code.placement import PlacementScheduler, get_placement_scheduler
+from python_code.terraform_layers import assign_layers
+from python_code.terraform_states import Environment
+from python_code.tfvars_validator import VariableSpec, get_variable_specs, validate_tfvars
+from python_code.tfvars_template import CompiledTemplate, get_compiled_template
+import python_code.config as conf
+
+ROSTER_COLUMNS = {tag.name.lower(): tag for tag in TemplateTag}
+ROSTER_COLUMNS_BY_TAG = {tag: column for column, tag in ROSTER_COLUMNS.items()}
+
+_worker_context = {}
+
+
+class RowResult(NamedTuple):
+    """Outcome of creating the configuration for one roster row. 'error' is None on success,
+    'changed' is False if the configuration already existed with the same content (incremental mode)."""
+
+    row_number: int
+    email: str
+    az_subscription: Optional[str]
+    environment: Optional[str]
+    error: Optional[str]
+    changed: bool = False
+
+
+def normalize_roster_row(row: dict) -> dict[str, str]:
+    """Column names are case-insensitive and can be given with or without the angle brackets,
+    i.e.: 'prefix', 'PREFIX' and '<PREFIX>' are the same. Empty values are dropped, so defaults are used for them."""
+
+    normalized = {}
+
+    for key, value in row.items():
+        if value is None or value == '':
+            continue
+        if isinstance(value, bool):
+            value = str(value).lower()      # JSON true/false should end up as terraform true/false.
+        normalized[str(key).strip().strip('<>').lower()] = str(value).strip()
+
+    return normalized
+
+
+def read_roster(roster_file: str) -> Iterator[dict[str, str]]:
+    """Stream the normalized rows of a '.csv' or '.jsonl' roster file.
+    A JSONL line that cannot be parsed is passed on as the email, so it gets reported as an invalid row."""
+
+    if roster_file.endswith('.csv'):
+        return _read_csv_roster(roster_file)
+    if roster_file.endswith('.jsonl'):
+        return _read_jsonl_roster(roster_file)
+
+    raise ValueError(Message.ROSTER_UNSUPPORTED_FILE.value.format(roster_file=roster_file))
+
+
+def _read_csv_roster(roster_file: str) -> Iterator[dict[str, str]]:
+
+    with open(roster_file, 'r', newline='', encoding='utf-8-sig') as file:
+        for row in csv.DictReader(file):
+            yield normalize_roster_row(row)
+
+
+def _read_jsonl_roster(roster_file: str) -> Iterator[dict[str, str]]:
+
+    with open(roster_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except json.JSONDecodeError:
+                row = None
+            if not isinstance(row, dict):
+                row = {conf.ROSTER_EMAIL_COLUMN: line.strip()}
+            yield normalize_roster_row(row)
+
+
+def get_roster_user_config(row: dict[str, str], admin_config: dict[str, str]) -> dict[str, str]:
+    """Non-interactive counterpart of 'get_user_config_values': the proposed and default values are
+    accepted unless the row overrides them. Raises ValueError for an invalid row."""
+
+    email = row.get(conf.ROSTER_EMAIL_COLUMN, '')
+
+    if not validate_email(email):
+        raise ValueError(Message.ROSTER_INVALID_EMAIL.value.format(email=email))
+
+    unknown_columns = sorted(set(row) - set(ROSTER_COLUMNS))
+    if unknown_columns:
+        raise ValueError(Message.ROSTER_UNKNOWN_COLUMNS.value.format(columns=', '.join(unknown_columns)))
+
+    config = {
+        TemplateTag.EMAIL.value: email,
+        TemplateTag.USERNAME.value: get_proposed_username(email)
+    }
+    config |= {tag.value: value for tag, value in conf.DEFAULT_VARIABLE_VALUES.items()}
+    config |= admin_config
+    config |= {ROSTER_COLUMNS[column].value: value for column, value in row.items()}
+
+    return config
+
+
+def init_worker(tfvars_template: CompiledTemplate, tfvars_file_pattern: str, commands_file_pattern: str,
+                incremental: bool, variable_specs: Optional[dict[str, VariableSpec]]) -> None:
+    """Runs once in every worker process, so the shared values are not sent with every row."""
+
+    _worker_context['tfvars_template'] = tfvars_template
+    _worker_context['tfvars_file_pattern'] = tfvars_file_pattern
+    _worker_context['commands_file_pattern'] = commands_file_pattern
+    _worker_context['incremental'] = incremental
+    _worker_context['variable_specs'] = variable_specs
+
+
+def create_environment_configuration(row_number: int, email: str, config: Optional[dict[str, str]],
+                                     error: Optional[str]) -> RowResult:
+    """Render and save the tfvars and the commands file of one row. Runs in a worker process.
+    The template is compiled in the parent process, so the workers only render it.
+    The reused functions print to stdout and exit on error, so their output is captured and reported instead."""
+
+    if error:
+        return RowResult(row_number, email, None, None, error)
+
+    environment = get_environment_name(config)
+    az_subscription = config[TemplateTag.AZ_SUBSCRIPTION_ID.value]
+
+    tfvars_file = _worker_context['tfvars_file_pattern'].format(
+        az_subscription=az_subscription, environment=environment
+    )
+    commands_file = _worker_context['commands_file_pattern'].format(
+        az_subscription=az_subscription, environment=environment
+    )
+
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output), \
+                environment_lock(os.path.dirname(tfvars_file), conf.ENVIRONMENT_LOCK_TIMEOUT_SECONDS):
+            set_review_date(config, tfvars_file)
+            tfvars_content = replace_values_in_template(_worker_context['tfvars_template'], config)
+            if _worker_context['variable_specs'] is not None:
+                errors = validate_tfvars(tfvars_content, _worker_context['variable_specs'])
+                if errors:
+                    return RowResult(row_number, email, az_subscription, environment, ' '.join(errors))
+            changed = save_tfvars(tfvars_content, tfvars_file, _worker_context['incremental'])
+            if changed:
+                layers = assign_layers(Environment(az_subscription, environment, os.path.dirname(tfvars_file)))
+                print_and_save_terraform_commands(commands_file, az_subscription, environment, layers)
+    except SystemExit:
+        return RowResult(row_number, email, az_subscription, environment, output.getvalue().strip())
+    except (ValueError, OSError) as e:
+        return RowResult(row_number, email, az_subscription, environment, str(e))
+
+    return RowResult(row_number, email, az_subscription, environment, None, changed)
+
+
+def allocate_names(row: dict[str, str], config: dict[str, str], name_index: NameIndex) -> None:
+    """A proposed username that collides with an existing environment gets a number suffix (in roster order, so it is
+    deterministic). A username given in the roster is kept as is, so a collision makes the row fail instead."""
+
+    email = config[TemplateTag.EMAIL.value]
+    username = config[TemplateTag.USERNAME.value]
+    prefix = config[TemplateTag.PREFIX.value]
+    suffix = config[TemplateTag.SUFFIX.value]
+
+    if ROSTER_COLUMNS_BY_TAG[TemplateTag.USERNAME] in row:
+        collisions = name_index.find_collisions(email, username, prefix, suffix)
+        if collisions:
+            raise ValueError(' '.join(collisions))
+        name_index.add(email, username, prefix, suffix)
+    else:
+        config[TemplateTag.USERNAME.value] = name_index.allocate_username(email, username, prefix, suffix)
+
+
+def place_row(row: dict[str, str], config: dict[str, str], scheduler: PlacementScheduler) -> None:
+    """Set the subscription (and its account and metastore) chosen by the scheduler. A subscription given in the
+    roster is kept, only its usage is counted; its account and metastore come from the registry, unless the row
+    gives them too. Raises ValueError for a subscription (or region) the registry does not know, that the row does
+    not give the account and metastore of."""
+
+    email = config[TemplateTag.EMAIL.value]
+    az_region = config[TemplateTag.AZ_REGION.value]
+
+    if ROSTER_COLUMNS_BY_TAG[TemplateTag.AZ_SUBSCRIPTION_ID] in row:
+        az_subscription = config[TemplateTag.AZ_SUBSCRIPTION_ID.value]
+        missing = [tag for tag in (TemplateTag.DBX_ACCOUNT_ID, TemplateTag.DBX_METASTORE_ID)
+                   if ROSTER_COLUMNS_BY_TAG[tag] not in row]
+        if missing:
+            subscription = scheduler.subscriptions.get(az_subscription)
+            if subscription is None:
+                raise ValueError(Message.UNKNOWN_SUBSCRIPTION.value.format(az_subscription=az_subscription))
+            if az_region not in subscription.metastores and TemplateTag.DBX_METASTORE_ID in missing:
+                raise ValueError(Message.NO_SUBSCRIPTION_METASTORE.value.format(az_subscription=az_subscription,
+                                                                                 az_region=az_region))
+            admin_config = subscription.admin_config(az_region) if az_region in subscription.metastores else \
+                {TemplateTag.DBX_ACCOUNT_ID.value: subscription.dbx_account_id}
+            config |= {tag.value: admin_config[tag.value] for tag in missing}
+        scheduler.add(az_subscription, az_region, email)
+        return
+
+    admin_config = scheduler.place(email, az_region).admin_config(az_region)
+    config |= {name: value for name, value in admin_config.items()
+               if ROSTER_COLUMNS_BY_TAG[TemplateTag(name)] not in row}
+
+
+def _prepare_rows(rows: Iterator[dict[str, str]], admin_config: dict[str, str],
+                  name_index: Optional[NameIndex], scheduler: Optional[PlacementScheduler]) -> Iterator[tuple]:
+    """Runs in the parent process, so the names are allocated and the subscriptions are chosen in roster order."""
+
+    for row_number, row in enumerate(rows, start=1):
+        email = row.get(conf.ROSTER_EMAIL_COLUMN, '')
+        try:
+            config = get_roster_user_config(row, admin_config)
+            if scheduler is not None:
+                place_row(row, config, scheduler)
+            if name_index is not None:
+                allocate_names(row, config, name_index)
+        except ValueError as e:
+            yield row_number, email, None, str(e)
+        else:
+            yield row_number, email, config, None
+
+
+def create_configurations_for_roster(roster_file: str, tfvars_template: CompiledTemplate,
+                                     admin_config: dict[str, str],
+                                     tfvars_file_pattern: str = conf.TERRAFORM_TFVARS_FILE,
+                                     commands_file_pattern: str = conf.COMMANDS_FILENAME,
+                                     max_workers: Optional[int] = conf.ROSTER_MAX_WORKERS,
+                                     incremental: bool = False,
+                                     name_index: Optional[NameIndex] = None,
+                                     variable_specs: Optional[dict[str, VariableSpec]] = None,
+                                     scheduler: Optional[PlacementScheduler] = None) -> list[RowResult]:
+    """Create the configuration for every row of the roster. The roster is read and dispatched to the workers in
+    batches of 'config.ROSTER_BATCH_SIZE' rows, so the rows are not all in memory at once. The result of every row
+    (a small RowResult) is kept for the summary and the changed environments, so that part grows with the roster.
+    If a name index is given, the names are checked against it for collisions. If variable specs are given,
+    every rendered tfvars is validated against them before it is saved. If a placement scheduler is given, it
+    chooses the subscription of every row instead of the admin config."""
+
+    rows = _prepare_rows(read_roster(roster_file), admin_config, name_index, scheduler)
+    results = []
+
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                             initargs=(tfvars_template, tfvars_file_pattern, commands_file_pattern, incremental,
+                                       variable_specs)) as executor:
+        while batch := list(itertools.islice(rows, conf.ROSTER_BATCH_SIZE)):
+            results.extend(executor.map(create_environment_configuration, *zip(*batch),
+                                        chunksize=conf.ROSTER_CHUNK_SIZE))
+
+    return results
+
+
+def print_roster_summary(results: list[RowResult]) -> None:
+
+    for result in results:
+        if result.error is None and not result.changed:
+            print(Message.ROSTER_ROW_UNCHANGED.value.format(
+                row_number=result.row_number, email=result.email, environment=result.environment
+            ))
+        elif result.error is None:
+            print(Message.ROSTER_ROW_SUCCESS.value.format(
+                row_number=result.row_number, email=result.email, environment=result.environment
+            ))
+        else:
+            print(Message.ROSTER_ROW_FAILURE.value.format(
+                row_number=result.row_number, email=result.email, error=result.error
+            ))
+
+    failed = sum(result.error is not None for result in results)
+    print(Message.ROSTER_SUMMARY.value.format(total=len(results), succeeded=len(results) - failed, failed=failed))
+
+
+def save_changed_environments(results: list[RowResult], changed_environments_file: str) -> None:
+    """One '{az_subscription}/{environment}' line for every environment whose configuration was (re)written."""
+
+    with open(changed_environments_file, 'w') as file:
+        for result in results:
+            if result.changed:
+                file.write(f"{result.az_subscription}/{result.environment}\n")
+
+
+def parse_arguments() -> argparse.Namespace:
+
+    parser = argparse.ArgumentParser(description="Create the configurations for every user of a roster file.")
+    parser.add_argument("roster_file", help="'.csv' (with header) or '.jsonl' file, one user per row.")
+    parser.add_argument("--workers", type=int, default=conf.ROSTER_MAX_WORKERS,
+                        help="Number of worker processes. Defaults to the number of processors.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Allow existing environments, and only rewrite the ones whose configuration changed.")
+    parser.add_argument("--changed-environments-file",
+                        help="Save the list of created or changed environments into this file.")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+    placement_scheduler = get_placement_scheduler()
+
+    try:
+        roster_results = create_configurations_for_roster(
+            args.roster_file,
+            get_compiled_template(conf.TERRAFORM_TFVARS_TEMPLATE_FILE),
+            get_admin_config(conf.ADMIN_CONFIG_FILE) if placement_scheduler is None else {},
+            max_workers=args.workers,
+            incremental=args.incremental,
+            name_index=NameIndex.from_states_dir(),
+            variable_specs=get_variable_specs(conf.TERRAFORM_VARIABLES_FILE),
+            scheduler=placement_scheduler
+        )
+    except ValueError as error:
+        print(error)
+        sys.exit(1)
+
+    print_roster_summary(roster_results)
+
+    update_inventory(
+        Environment(result.az_subscription, result.environment,
+                    os.path.dirname(conf.TERRAFORM_TFVARS_FILE.format(az_subscription=result.az_subscription,
+                                                                      environment=result.environment)))
+        for result in roster_results if result.changed
+    )
+
+    if args.changed_environments_file:
+        save_changed_environments(roster_results, args.changed_environments_file)
+
+    if any(result.error is not None for result in roster_results):
+        sys.exit(1)
@@ -0,0 +1,270 @@
+""" Dependency graph of the terraform code, for finding what makes an apply take long.
+
+Terraform creates a resource as soon as everything it depends on is created, so independent resources are created in
+parallel. A resource depends on what it references (implicit dependencies: resources, data sources, and through
+locals and provider configurations, what those reference), and on its 'depends_on' list (explicit dependencies).
+An explicit dependency is:
+    * redundant, if the resource depends on the same thing through its references anyway: it can be removed
+      without changing anything,
+    * serializing, if it adds an order the references do not need, and so lengthens the critical path (the longest
+      chain of dependencies, which is the shortest possible apply time): it should be removed, unless the resource
+      really needs the other one without referencing it (i.e. a catalog needs the external location of its storage),
+      then it is listed in 'config.DEPENDENCY_GRAPH_REQUIRED_DEPENDS_ON'.
+
+The durations of the resources are estimates by resource type ('config.DEPENDENCY_GRAPH_DURATIONS'), they can be
+replaced with measured ones from a JSON file ('{"address or type": seconds}').
+
+>  python3 ./python_code/dependency_graph.py ./terraform_code
+>  python3 ./python_code/dependency_graph.py ./terraform_code/layers/compute --durations ./durations.json --json
+"""
+
+import argparse
+import json
+import os
+import sys
+from graphlib import TopologicalSorter
+from typing import NamedTuple, Optional
+
+from python_code.constants import GraphMessage
+from python_code.hcl import find_references, parse_body, parse_string_list
+import python_code.config as conf
+
+IGNORED_REFERENCE_ROOTS = {'var', 'each', 'count', 'self', 'path', 'terraform', 'module'}
+
+
+class Node(NamedTuple):
+
+    address: str                    # 'type.name', 'data.type.name', 'local.name' or 'provider.name[.alias]'.
+    implicit: frozenset[str]        # Addresses (of the graph or not) referenced by the node.
+    explicit: tuple[str, ...]       # Addresses in its 'depends_on'.
+
+    @property
+    def is_resource(self) -> bool:
+        """Resources and data sources take time to create / read, locals and provider configurations do not."""
+
+        return not self.address.startswith(('local.', 'provider.'))
+
+
+class DependencyReport(NamedTuple):
+
+    critical_path: list[str]                # The resources and data sources on it, in creation order.
+    critical_seconds: float
+    redundant: list[tuple[str, str]]        # (resource, explicit dependency)
+    serializing: list[tuple[str, str, float]]   # (resource, explicit dependency, critical path without it)
+
+
+def _resolve(reference: str, addresses: set[str]) -> Optional[str]:
+    """The address of the graph the reference points to, i.e. 'databricks_cluster.single_user[0].id' ->
+    'databricks_cluster.single_user'."""
+
+    parts = reference.split('.')
+    if parts[0] in IGNORED_REFERENCE_ROOTS:
+        return None
+
+    for length in (3, 2):
+        address = '.'.join(parts[:length])
+        if address in addresses:
+            return address
+
+    return None
+
+
+def parse_code_dir(code_dir: str) -> dict[str, Node]:
+    """The resources, data sources, locals and provider configurations of the '.tf' files, by address."""
+
+    raw_nodes = {}
+
+    for file_name in sorted(os.listdir(code_dir)):
+        if not file_name.endswith('.tf'):
+            continue
+        with open(os.path.join(code_dir, file_name), 'r') as file:
+            body = parse_body(file.read())
+
+        for block in body.blocks:
+            if block.type == 'locals':
+                for name, expression in parse_body(block.body, comments_removed=True).attributes.items():
+                    raw_nodes[f'local.{name}'] = (find_references(expression), [], None)
+            elif block.type == 'provider':
+                block_body = parse_body(block.body, comments_removed=True)
+                alias = parse_string_list(block_body.attributes.get('alias', ''))
+                address = '.'.join(['provider', block.labels[0]] + alias)
+                raw_nodes[address] = (find_references(block.body), [], None)
+            elif block.type in ('resource', 'data') and len(block.labels) == 2:
+                block_body = parse_body(block.body, comments_removed=True)
+                address = '.'.join(block.labels) if block.type == 'resource' else '.'.join(('data',) + block.labels)
+                references = [reference
+                              for name, expression in block_body.attributes.items()
+                              if name not in ('depends_on', 'provider')
+                              for reference in find_references(expression)]
+                references += [reference for nested in block_body.blocks for reference in find_references(nested.body)]
+                provider = block_body.attributes.get('provider') or block.labels[0].split('_')[0]
+                raw_nodes[address] = (references, find_references(block_body.attributes.get('depends_on', '')),
+                                      f'provider.{provider}')
+
+    addresses = set(raw_nodes)
+    nodes = {}
+    for address, (references, depends_on, provider) in raw_nodes.items():
+        implicit = {_resolve(reference, addresses) for reference in references}
+        if provider in addresses:
+            implicit.add(provider)
+        nodes[address] = Node(address, frozenset(implicit - {None, address}),
+                              tuple(dict.fromkeys(filter(None, (_resolve(reference, addresses)
+                                                                for reference in depends_on)))))
+
+    return nodes
+
+
+def get_duration(node: Node, durations: dict[str, float]) -> float:
+    """By address, then by resource type, then the default of resources or data sources."""
+
+    if not node.is_resource:
+        return 0.0
+
+    parts = node.address.split('.')
+    resource_type = parts[1] if parts[0] == 'data' else parts[0]
+
+    if node.address in durations:
+        return durations[node.address]
+    if parts[0] == 'data':
+        return durations.get(f'data.{resource_type}', conf.DEPENDENCY_GRAPH_DATA_DURATION)
+
+    return durations.get(resource_type, conf.DEPENDENCY_GRAPH_DEFAULT_DURATION)
+
+
+def get_dependencies(nodes: dict[str, Node], without: Optional[tuple[str, str]] = None) -> dict[str, set[str]]:
+    """The implicit and explicit dependencies of every node, optionally without one explicit dependency (it stays if
+    it is implicit too)."""
+
+    return {address: {dependency for dependency in node.implicit.union(
+                          explicit for explicit in node.explicit if (address, explicit) != without)
+                      if dependency in nodes}
+            for address, node in nodes.items()}
+
+
+def get_critical_path(nodes: dict[str, Node], durations: dict[str, float],
+                      without: Optional[tuple[str, str]] = None) -> tuple[list[str], float]:
+    """The longest chain of dependencies by duration, and its duration. Raises graphlib.CycleError for a cycle."""
+
+    dependencies = get_dependencies(nodes, without)
+    finish = {}
+    previous = {}
+
+    for address in TopologicalSorter(dependencies).static_order():
+        latest = max(sorted(dependencies[address]), key=lambda dependency: finish[dependency], default=None)
+        previous[address] = latest
+        finish[address] = get_duration(nodes[address], durations) + (finish[latest] if latest else 0.0)
+
+    if not finish:
+        return [], 0.0
+
+    address = max(sorted(finish), key=finish.get)
+    total = finish[address]
+    path = []
+    while address is not None:
+        if nodes[address].is_resource:
+            path.append(address)
+        address = previous[address]
+
+    return path[::-1], total
+
+
+def _reachable(dependencies: dict[str, set[str]], start: str, target: str) -> bool:
+
+    seen = set()
+    stack = list(dependencies[start])
+    while stack:
+        address = stack.pop()
+        if address == target:
+            return True
+        if address not in seen:
+            seen.add(address)
+            stack.extend(dependencies[address])
+
+    return False
+
+
+def analyze(nodes: dict[str, Node], durations: Optional[dict[str, float]] = None,
+            required: set[tuple[str, str]] = conf.DEPENDENCY_GRAPH_REQUIRED_DEPENDS_ON) -> DependencyReport:
+    """Finds the redundant and serializing explicit dependencies. The 'required' ones (needed, but not referenced)
+    are only checked for redundancy."""
+
+    durations = conf.DEPENDENCY_GRAPH_DURATIONS if durations is None else durations
+    critical_path, critical_seconds = get_critical_path(nodes, durations)
+
+    redundant = []
+    serializing = []
+    for address, node in nodes.items():
+        for dependency in node.explicit:
+            if _reachable(get_dependencies(nodes, without=(address, dependency)), address, dependency):
+                redundant.append((address, dependency))
+                continue
+            if (address, dependency) in required:
+                continue
+            _, seconds = get_critical_path(nodes, durations, without=(address, dependency))
+            if seconds < critical_seconds:
+                serializing.append((address, dependency, seconds))
+
+    return DependencyReport(critical_path, critical_seconds, redundant, serializing)
+
+
+def read_durations(durations_file: Optional[str]) -> dict[str, float]:
+    """The estimates of the config, updated with the measured durations of the file."""
+
+    durations = dict(conf.DEPENDENCY_GRAPH_DURATIONS)
+    if durations_file:
+        with open(durations_file, 'r') as file:
+            durations |= json.load(file)
+
+    return durations
+
+
+def print_report(report: DependencyReport, nodes: dict[str, Node], durations: dict[str, float]) -> None:
+
+    print(GraphMessage.CRITICAL_PATH.value.format(seconds=report.critical_seconds))
+    for address in report.critical_path:
+        print(GraphMessage.CRITICAL_PATH_NODE.value.format(address=address,
+                                                           seconds=get_duration(nodes[address], durations)))
+
+    if report.redundant:
+        print(GraphMessage.REDUNDANT.value)
+        for address, dependency in report.redundant:
+            print(GraphMessage.EDGE.value.format(address=address, dependency=dependency))
+
+    if report.serializing:
+        print(GraphMessage.SERIALIZING.value)
+        for address, dependency, seconds in report.serializing:
+            print(GraphMessage.SERIALIZING_EDGE.value.format(address=address, dependency=dependency,
+                                                             before=report.critical_seconds, after=seconds))
+
+    if not report.redundant and not report.serializing:
+        print(GraphMessage.NO_FINDINGS.value)
+
+
+def parse_arguments() -> argparse.Namespace:
+
+    parser = argparse.ArgumentParser(description="Report the critical path and the unneeded 'depends_on' of the "
+                                                 "terraform code.")
+    parser.add_argument("code_dir", nargs='?', default=conf.TERRAFORM_CODE_DIR)
+    parser.add_argument("--durations", help="JSON file of measured durations in seconds, by address or type.")
+    parser.add_argument("--json", action="store_true", help="Output the report as JSON.")
+    parser.add_argument("--check", action="store_true",
+                        help="Exit with 1 if there are redundant or serializing 'depends_on'.")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+
+    graph_nodes = parse_code_dir(args.code_dir)
+    graph_durations = read_durations(args.durations)
+    dependency_report = analyze(graph_nodes, graph_durations)
+
+    if args.json:
+        print(json.dumps(dependency_report._asdict(), indent=2))
+    else:
+        print_report(dependency_report, graph_nodes, graph_durations)
+
+    if args.check and (dependency_report.redundant or dependency_report.serializing):
+        sys.exit(1)
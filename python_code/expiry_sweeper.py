@@ -0,0 +1,159 @@
+""" Find the environments whose review date passed, and destroy them.
+
+The review date is computed once, when the configuration of an environment is created ('config.REVIEW_PERIOD_DAYS'
+from that day), saved in its tfvars and tags its Azure resources. To keep an environment longer, set a later
+'review_date' in its tfvars (i.e. with a roster column and '--incremental'), and apply it.
+
+By default the sweeper only lists the expired environments that still have resources in their state:
+
+>  python3 ./python_code/expiry_sweeper.py
+>  python3 ./python_code/expiry_sweeper.py --execute --batch-size 20 --batch-interval 300
+
+With '--execute' they are destroyed in batches, the oldest review dates first, with a pause between the batches.
+Within a batch the limits of 'run_terraform.py' apply (workers, workers per subscription, retries), so a sweep of
+hundreds of environments neither throttles the Azure and Databricks APIs nor keeps them busy for a long time.
+The sweep stops after a batch with failures (i.e. expired credentials), instead of failing the rest too.
+"""
+
+import argparse
+import datetime
+import sys
+import time
+from typing import Callable, NamedTuple, Optional
+
+from python_code.constants import RunMessage
+from python_code.inventory import remove_from_inventory
+from python_code.provider_cache import InitError
+from python_code.run_terraform import RunResult, run_terraform_for_environments
+from python_code.terraform_states import Environment, discover_environments, read_tfvars_values
+from python_code.tfstate_reader import read_state
+import python_code.config as conf
+
+
+class ExpiredEnvironment(NamedTuple):
+
+    environment: Environment
+    review_date: datetime.date
+
+
+def get_review_date(environment: Environment) -> Optional[datetime.date]:
+    """The review date in the tfvars of the environment. None if it has none (created before the review dates),
+    or it is not a date."""
+
+    try:
+        return datetime.date.fromisoformat(read_tfvars_values(environment.tfvars_file).get('review_date', ''))
+    except (ValueError, FileNotFoundError):
+        return None
+
+
+def has_resources(environment: Environment) -> bool:
+    """A destroyed environment keeps its (empty) state files, so they are checked for resources."""
+
+    return any(read_state(tfstate_file, output_names=[]).resource_count for tfstate_file in environment.tfstate_files)
+
+
+def find_expired_environments(environments: list[Environment], today: Optional[datetime.date] = None,
+                              grace_days: int = 0) -> list[ExpiredEnvironment]:
+    """The environments reviewed more than 'grace_days' before today, which still have resources. The oldest
+    review dates first. Only the states of the expired environments are read. An environment whose state cannot be
+    read (i.e. corrupt or truncated) is reported and skipped."""
+
+    deadline = (today or datetime.date.today()) - datetime.timedelta(days=grace_days)
+
+    expired = []
+    for environment in environments:
+        review_date = get_review_date(environment)
+        if review_date is None or review_date >= deadline:
+            continue
+        try:
+            if has_resources(environment):
+                expired.append(ExpiredEnvironment(environment, review_date))
+        except ValueError as e:
+            print(RunMessage.UNREADABLE_STATE.value.format(environment=environment.key, error=e))
+
+    return sorted(expired, key=lambda item: (item.review_date, item.environment.key))
+
+
+def sweep(expired: list[ExpiredEnvironment], batch_size: int = conf.EXPIRY_SWEEP_BATCH_SIZE,
+          batch_interval_seconds: float = conf.EXPIRY_SWEEP_BATCH_INTERVAL_SECONDS,
+          inventory_db_file: Optional[str] = conf.INVENTORY_DB_FILE,
+          run: Callable[..., list[RunResult]] = run_terraform_for_environments, **run_arguments) -> list[RunResult]:
+    """Destroy the expired environments batch by batch. The destroyed ones are removed from the inventory
+    (without an inventory database file it is not updated). 'run_arguments' go to 'run_terraform_for_environments'.
+    Returns the results of the batches run."""
+
+    environments = [item.environment for item in expired]
+    batches = [environments[start:start + batch_size] for start in range(0, len(environments), batch_size)]
+    results = []
+
+    for number, batch in enumerate(batches, start=1):
+        if number > 1:
+            time.sleep(batch_interval_seconds)
+
+        print(RunMessage.SWEEP_BATCH.value.format(batch=number, batches=len(batches), count=len(batch)))
+        batch_results = run('destroy', batch, **run_arguments)
+        results.extend(batch_results)
+
+        if inventory_db_file:
+            remove_from_inventory([result.environment for result in batch_results if result.returncode == 0],
+                                  inventory_db_file)
+
+        if any(result.returncode != 0 for result in batch_results):
+            print(RunMessage.SWEEP_STOPPED.value.format(remaining=len(environments) - len(results)))
+            break
+
+    return results
+
+
+def parse_arguments() -> argparse.Namespace:
+
+    parser = argparse.ArgumentParser(description="List (or destroy) the environments whose review date passed.")
+    parser.add_argument("--execute", action="store_true", help="Destroy the expired environments.")
+    parser.add_argument("--grace-days", type=int, default=0,
+                        help="Only the environments reviewed more than this many days ago.")
+    parser.add_argument("--subscription", action="append", help="Only environments of this subscription.")
+    parser.add_argument("--batch-size", type=int, default=conf.EXPIRY_SWEEP_BATCH_SIZE)
+    parser.add_argument("--batch-interval", type=float, default=conf.EXPIRY_SWEEP_BATCH_INTERVAL_SECONDS,
+                        help="Seconds to wait between the batches.")
+    parser.add_argument("--workers", type=int, default=conf.TERRAFORM_MAX_WORKERS)
+    parser.add_argument("--workers-per-subscription", type=int, default=conf.TERRAFORM_MAX_WORKERS_PER_SUBSCRIPTION)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+
+    expired_environments = find_expired_environments(
+        [environment for environment in discover_environments()
+         if not args.subscription or environment.az_subscription in args.subscription],
+        grace_days=args.grace_days
+    )
+    if not expired_environments:
+        print(RunMessage.NO_EXPIRED_ENVIRONMENTS.value.format(states_dir=conf.TERRAFORM_STATES_DIR))
+        sys.exit()
+
+    for item in expired_environments:
+        print(RunMessage.EXPIRED.value.format(environment=item.environment.key, review_date=item.review_date))
+
+    if not args.execute:
+        print(RunMessage.EXPIRED_DRY_RUN.value.format(count=len(expired_environments)))
+        sys.exit()
+
+    try:
+        sweep_results = sweep(expired_environments, args.batch_size, args.batch_interval, max_workers=args.workers,
+                              max_workers_per_subscription=args.workers_per_subscription,
+                              provider_cache_dir=conf.TERRAFORM_CACHE_DIR,
+                              plugin_mirror_dir=conf.TERRAFORM_PLUGIN_MIRROR_DIR,
+                              timings_file=conf.TERRAFORM_TIMINGS_FILE)
+    except InitError as error:
+        print(RunMessage.INIT_FAILED.value.format(returncode=error.returncode, log_file=error.log_file))
+        sys.exit(1)
+
+    failed_count = sum(result.returncode != 0 for result in sweep_results)
+    print(RunMessage.SUMMARY.value.format(action='destroy', succeeded=len(sweep_results) - failed_count,
+                                          failed=failed_count, skipped=len(expired_environments) - len(sweep_results)))
+
+    if failed_count:
+        sys.exit(1)
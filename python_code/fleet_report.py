@@ -0,0 +1,114 @@
+""" Fleet-wide report of the outputs and resources of every environment in './terraform_states/'.
+
+The state files are streamed (see 'tfstate_reader.py') by a pool of threads, and only the requested outputs and
+resource attributes are extracted. The report is written as CSV or JSON, one row per environment.
+
+>  python3 ./python_code/fleet_report.py --format csv --output ./fleet.csv
+>  python3 ./python_code/fleet_report.py --format json --attribute databricks_cluster.cluster_id
+"""
+
+import argparse
+import csv
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, TextIO
+
+from python_code.terraform_states import Environment, discover_environments
+from python_code.tfstate_reader import read_state
+import python_code.config as conf
+
+REPORT_FORMATS = ['csv', 'json']
+
+
+def get_report_row(environment: Environment, output_names: list[str], resource_attributes: list[str]) -> dict:
+
+    row = {'az_subscription': environment.az_subscription, 'environment': environment.name}
+
+    outputs = {}
+    resource_count = 0
+    attributes = {resource_attribute: [] for resource_attribute in resource_attributes}
+
+    for tfstate_file in environment.tfstate_files:         # One per layer, for an environment with layered states.
+        try:
+            report = read_state(tfstate_file, output_names, resource_attributes)
+        except ValueError as e:
+            return row | {'error': f"{tfstate_file}: {e}"}
+        outputs |= report.outputs
+        resource_count += report.resource_count
+        for resource_attribute, values in report.attributes.items():
+            attributes[resource_attribute].extend(values)
+
+    return row | {'resource_count': resource_count} | \
+        {name: outputs.get(name) for name in output_names} | attributes
+
+
+def collect_fleet_report(environments: list[Environment], output_names: list[str] = conf.FLEET_REPORT_OUTPUTS,
+                         resource_attributes: Optional[list[str]] = None,
+                         max_workers: int = conf.FLEET_REPORT_MAX_WORKERS) -> list[dict]:
+    """One row per environment, in the order of the environments."""
+
+    resource_attributes = resource_attributes or []
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda environment: get_report_row(environment, output_names, resource_attributes),
+                                 environments))
+
+
+def get_report_columns(output_names: list[str], resource_attributes: list[str]) -> list[str]:
+
+    return ['az_subscription', 'environment', 'resource_count', *output_names, *resource_attributes, 'error']
+
+
+def write_csv_report(rows: list[dict], columns: list[str], file: TextIO) -> None:
+    """Attributes of resource types with many instances are joined with ';'."""
+
+    writer = csv.DictWriter(file, fieldnames=columns)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({column: ';'.join('' if item is None else str(item) for item in value)
+                         if isinstance(value, list) else value for column, value in row.items()})
+
+
+def write_json_report(rows: list[dict], file: TextIO) -> None:
+
+    json.dump(rows, file, indent=2)
+    file.write('\n')
+
+
+def parse_arguments() -> argparse.Namespace:
+
+    parser = argparse.ArgumentParser(description="Report the outputs and resources of every environment.")
+    parser.add_argument("--format", choices=REPORT_FORMATS, default='csv')
+    parser.add_argument("--output", help="Write the report into this file instead of the standard output.")
+    parser.add_argument("--subscription", action="append", help="Only environments of this subscription.")
+    parser.add_argument("--output-name", action="append", dest="output_names",
+                        help=f"Terraform output to report. Defaults to: {', '.join(conf.FLEET_REPORT_OUTPUTS)}.")
+    parser.add_argument("--attribute", action="append", dest="resource_attributes", default=[],
+                        help="Resource attribute to report, as 'type.attribute', i.e.: databricks_cluster.cluster_id")
+    parser.add_argument("--workers", type=int, default=conf.FLEET_REPORT_MAX_WORKERS)
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+    report_outputs = args.output_names or conf.FLEET_REPORT_OUTPUTS
+
+    report_environments = [environment for environment in discover_environments()
+                           if not args.subscription or environment.az_subscription in args.subscription]
+    report_rows = collect_fleet_report(report_environments, report_outputs, args.resource_attributes, args.workers)
+
+    report_file = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        if args.format == 'csv':
+            write_csv_report(report_rows, get_report_columns(report_outputs, args.resource_attributes), report_file)
+        else:
+            write_json_report(report_rows, report_file)
+    finally:
+        if args.output:
+            report_file.close()
+
+    if any('error' in row for row in report_rows):
+        sys.exit(1)
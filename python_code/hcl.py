@@ -0,0 +1,196 @@
+""" Minimal reader for the subset of HCL used in './terraform_code/'.
+
+It splits a body (a whole .tf file, or the content of a block) into its attributes ('name = expression') and its
+nested blocks ('type "label" ... { body }'). Expressions are kept as text. Comments are removed first; strings,
+including interpolations with nested strings, are skipped over when looking for brackets.
+Heredocs are not supported.
+"""
+
+import re
+from typing import NamedTuple
+
+IDENTIFIER_PATTERN = re.compile(r'[A-Za-z_][\w-]*')
+REFERENCE_PATTERN = re.compile(r'(?<![\w.-])[A-Za-z_][\w-]*(?:\.[A-Za-z_][\w-]*)+')
+OPENING_BRACKETS = '([{'
+CLOSING_BRACKETS = ')]}'
+
+
+class Block(NamedTuple):
+
+    type: str
+    labels: tuple[str, ...]
+    body: str
+
+
+class Body(NamedTuple):
+
+    attributes: dict[str, str]
+    blocks: list[Block]
+
+
+def _skip_string(text: str, index: int) -> int:
+    """'index' is at the opening quote; returns the index after the closing quote."""
+
+    index += 1
+    while index < len(text):
+        char = text[index]
+        if char == '\\':
+            index += 2
+            continue
+        if char == '"':
+            return index + 1
+        if text.startswith('${', index) or text.startswith('%{', index):
+            index = _skip_brackets(text, index + 1)
+            continue
+        index += 1
+
+    return index
+
+
+def _skip_brackets(text: str, index: int) -> int:
+    """'index' is at an opening bracket; returns the index after the matching closing bracket."""
+
+    depth = 0
+    while index < len(text):
+        char = text[index]
+        if char == '"':
+            index = _skip_string(text, index)
+            continue
+        if char in OPENING_BRACKETS:
+            depth += 1
+        elif char in CLOSING_BRACKETS:
+            depth -= 1
+            if depth == 0:
+                return index + 1
+        index += 1
+
+    return index
+
+
+def strip_comments(text: str) -> str:
+    """Remove '#', '//' and '/* */' comments, but not their look-alikes inside strings."""
+
+    result = []
+    index = 0
+
+    while index < len(text):
+        char = text[index]
+        if char == '"':
+            end = _skip_string(text, index)
+            result.append(text[index:end])
+            index = end
+        elif char == '#' or text.startswith('//', index):
+            end = text.find('\n', index)
+            index = len(text) if end == -1 else end
+        elif text.startswith('/*', index):
+            end = text.find('*/', index + 2)
+            index = len(text) if end == -1 else end + 2
+        else:
+            result.append(char)
+            index += 1
+
+    return ''.join(result)
+
+
+def _expression_end(text: str, index: int) -> int:
+    """An expression ends at the first new line (or comma, in an object) outside of brackets and strings."""
+
+    while index < len(text):
+        char = text[index]
+        if char == '"':
+            index = _skip_string(text, index)
+        elif char in OPENING_BRACKETS:
+            index = _skip_brackets(text, index)
+        elif char in '\n,' or char in CLOSING_BRACKETS:
+            return index
+        else:
+            index += 1
+
+    return index
+
+
+def parse_body(text: str, comments_removed: bool = False) -> Body:
+
+    if not comments_removed:
+        text = strip_comments(text)
+
+    attributes = {}
+    blocks = []
+    index = 0
+
+    while index < len(text):
+        match = IDENTIFIER_PATTERN.match(text, index)
+        if not match:
+            index += 1
+            continue
+
+        name = match.group()
+        index = match.end()
+        while index < len(text) and text[index] in ' \t':
+            index += 1
+
+        if text.startswith('=', index) and not text.startswith('==', index):
+            end = _expression_end(text, index + 1)
+            attributes[name] = text[index + 1:end].strip()
+            index = end
+            continue
+
+        labels = []
+        while index < len(text):
+            if text[index] in ' \t\r\n':
+                index += 1
+            elif text[index] == '"':
+                end = _skip_string(text, index)
+                labels.append(text[index + 1:end - 1])
+                index = end
+            elif text[index] == '{':
+                end = _skip_brackets(text, index)
+                blocks.append(Block(name, tuple(labels), text[index + 1:end - 1]))
+                index = end
+                break
+            elif label := IDENTIFIER_PATTERN.match(text, index):
+                labels.append(label.group())
+                index = label.end()
+            else:
+                break
+
+    return Body(attributes, blocks)
+
+
+def _without_string_literals(text: str) -> str:
+    """The text with the literal parts of its strings removed; the interpolations in them are kept."""
+
+    result = []
+    index = 0
+
+    while index < len(text):
+        if text[index] != '"':
+            result.append(text[index])
+            index += 1
+            continue
+
+        end = _skip_string(text, index)
+        index += 1
+        while index < end:
+            if text.startswith('${', index) or text.startswith('%{', index):
+                interpolation_end = _skip_brackets(text, index + 1)
+                result.append(' ' + _without_string_literals(text[index + 2:interpolation_end - 1]) + ' ')
+                index = interpolation_end
+            else:
+                index += 2 if text[index] == '\\' else 1
+        result.append(' ')
+
+    return ''.join(result)
+
+
+def find_references(expression: str) -> list[str]:
+    """The dotted names in the expression (or block body), i.e. 'azurerm_resource_group.dbx_environment.name',
+    outside the literal parts of its strings. Comments should be removed first."""
+
+    return REFERENCE_PATTERN.findall(_without_string_literals(expression))
+
+
+def parse_string_list(expression: str) -> list[str]:
+    """The string values of a list literal, i.e.: '["a", "b"]' -> ['a', 'b']."""
+
+    return re.findall(r'"((?:[^"\\]|\\.)*)"', expression)
@@ -0,0 +1,167 @@
+""" Inventory of the environments in './terraform_states/', in a local SQLite database.
+
+Answers questions like "which environments exist for subscription X", "who owns resource group Y" or
+"what is the workspace URL of user Z" without walking the states directory and opening the files one by one.
+
+The inventory is updated by the scripts creating configurations and by 'run_terraform.py' after apply / destroy
+runs. It can also be rebuilt from scratch:
+
+>  python3 ./python_code/inventory.py rebuild
+>  python3 ./python_code/inventory.py query --email john.doe@foo.bar
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from typing import Iterable, Optional
+
+from python_code.terraform_states import Environment, discover_environments, read_tfvars_values, \
+    read_environment_outputs
+import python_code.config as conf
+
+COLUMNS = ['az_subscription', 'environment', 'email', 'username', 'az_region', 'admin_flag', 'workspace_url',
+           'updated_at']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS environments (
+    az_subscription TEXT NOT NULL,
+    environment     TEXT NOT NULL COLLATE NOCASE,
+    email           TEXT COLLATE NOCASE,
+    username        TEXT COLLATE NOCASE,
+    az_region       TEXT,
+    admin_flag      INTEGER,
+    workspace_url   TEXT,
+    updated_at      REAL NOT NULL,
+    PRIMARY KEY (az_subscription, environment)
+);
+CREATE INDEX IF NOT EXISTS environments_environment ON environments (environment);
+CREATE INDEX IF NOT EXISTS environments_email ON environments (email);
+CREATE INDEX IF NOT EXISTS environments_username ON environments (username);
+"""
+
+UPSERT = f"""
+INSERT OR REPLACE INTO environments ({', '.join(COLUMNS)})
+VALUES ({', '.join('?' * len(COLUMNS))})
+"""
+
+
+def open_inventory(db_file: str = conf.INVENTORY_DB_FILE) -> sqlite3.Connection:
+    """Open (and create if needed) the inventory. WAL mode lets the scripts update it while it is queried."""
+
+    os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+
+    connection = sqlite3.connect(db_file, timeout=30)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.executescript(SCHEMA)
+
+    return connection
+
+
+def get_inventory_record(environment: Environment) -> tuple:
+    """Collect the inventory values of an environment from its tfvars and state files."""
+
+    tfvars = read_tfvars_values(environment.tfvars_file)
+    outputs = read_environment_outputs(environment, ['dbx_workspace_url'])
+    admin_flag = tfvars.get('admin_flag')
+
+    return (
+        environment.az_subscription,
+        environment.name,
+        tfvars.get('email'),
+        tfvars.get('username'),
+        tfvars.get('azure-region'),
+        None if admin_flag is None else int(admin_flag.lower() == 'true'),
+        outputs.get('dbx_workspace_url'),
+        time.time()
+    )
+
+
+def update_inventory(environments: Iterable[Environment], db_file: str = conf.INVENTORY_DB_FILE) -> None:
+    """Insert or refresh the records of the given environments, in one transaction."""
+
+    records = [get_inventory_record(environment) for environment in environments]
+
+    with open_inventory(db_file) as connection:
+        connection.executemany(UPSERT, records)
+    connection.close()
+
+
+def remove_from_inventory(environments: Iterable[Environment], db_file: str = conf.INVENTORY_DB_FILE) -> None:
+
+    with open_inventory(db_file) as connection:
+        connection.executemany(
+            "DELETE FROM environments WHERE az_subscription = ? AND environment = ?",
+            [(environment.az_subscription, environment.name) for environment in environments]
+        )
+    connection.close()
+
+
+def rebuild_inventory(states_dir: str = conf.TERRAFORM_STATES_DIR, db_file: str = conf.INVENTORY_DB_FILE) -> int:
+    """Replace the content of the inventory with the environments found in the states directory."""
+
+    records = [get_inventory_record(environment) for environment in discover_environments(states_dir)]
+
+    with open_inventory(db_file) as connection:
+        connection.execute("DELETE FROM environments")
+        connection.executemany(UPSERT, records)
+    connection.close()
+
+    return len(records)
+
+
+def query_inventory(db_file: str = conf.INVENTORY_DB_FILE, az_subscription: Optional[str] = None,
+                    environment: Optional[str] = None, email: Optional[str] = None,
+                    username: Optional[str] = None) -> list[dict]:
+    """Find the environments matching all the given (case-insensitive, except the subscription) values."""
+
+    filters = {'az_subscription': az_subscription, 'environment': environment, 'email': email, 'username': username}
+    conditions = [(f"{column} = ?", value) for column, value in filters.items() if value is not None]
+
+    sql = f"SELECT {', '.join(COLUMNS)} FROM environments"
+    if conditions:
+        sql += " WHERE " + " AND ".join(condition for condition, _ in conditions)
+    sql += " ORDER BY az_subscription, environment"
+
+    connection = open_inventory(db_file)
+    try:
+        return [dict(row) for row in connection.execute(sql, [value for _, value in conditions])]
+    finally:
+        connection.close()
+
+
+def parse_arguments() -> argparse.Namespace:
+
+    parser = argparse.ArgumentParser(description="Inventory of the environments in the terraform states directory.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser("rebuild", help="Rebuild the inventory from the terraform states directory.")
+
+    query = subparsers.add_parser("query", help="List the environments matching all the given values.")
+    query.add_argument("--subscription")
+    query.add_argument("--environment", help="Name of the environment, which is also its resource group name.")
+    query.add_argument("--email")
+    query.add_argument("--username")
+    query.add_argument("--json", action="store_true", help="Output JSON lines instead of a table.")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+
+    if args.command == "rebuild":
+        print(f"{rebuild_inventory()} environment(s) in '{conf.INVENTORY_DB_FILE}'.")
+    else:
+        found = query_inventory(az_subscription=args.subscription, environment=args.environment, email=args.email,
+                                username=args.username)
+        if args.json:
+            for record in found:
+                print(json.dumps(record))
+        else:
+            print('\t'.join(COLUMNS))
+            for record in found:
+                print('\t'.join('' if record[column] is None else str(record[column]) for column in COLUMNS))
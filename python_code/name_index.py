@@ -0,0 +1,96 @@
+""" Index of the names already allocated to environments, for detecting collisions before anything is provisioned.
+
+Different email addresses can result in the same names, i.e.: 'john.doe@a.com' and 'john-doe@b.com' are both
+'JohnDoe'. The resource group name ({PREFIX}{USERNAME}{SUFFIX}) and the catalog name derived from it
+(see 'create_personal_unity_catalog.tf') would then be the same too, and terraform would fail halfway through.
+
+Names are looked up in dicts, so checking a new user is O(1) regardless of the number of environments.
+A name is not a collision if it belongs to the same email address, so configurations can be regenerated.
+"""
+
+from typing import Optional
+
+from python_code.constants import Message
+from python_code.terraform_states import discover_environments, read_tfvars_values
+import python_code.config as conf
+
+
+def get_catalog_name(resource_group: str) -> str:
+    """Same as: replace(lower(azurerm_resource_group.dbx_environment.name), "-", "_")"""
+
+    return resource_group.lower().replace('-', '_')
+
+
+class NameIndex:
+    """Usernames, resource group names and catalog names, mapped to the email address they belong to.
+    Usernames and resource group names are compared case-insensitively, like Azure does."""
+
+    def __init__(self):
+        self.usernames = {}
+        self.resource_groups = {}
+        self.catalogs = {}
+
+    @classmethod
+    def from_states_dir(cls, states_dir: str = conf.TERRAFORM_STATES_DIR) -> 'NameIndex':
+        """Build the index from the environments in the terraform states directory."""
+
+        index = cls()
+
+        for environment in discover_environments(states_dir):
+            tfvars = read_tfvars_values(environment.tfvars_file)
+            email = tfvars.get('email', '')
+            if tfvars.get('username'):
+                index.usernames.setdefault(tfvars['username'].casefold(), email)
+            index.resource_groups.setdefault(environment.name.casefold(), email)
+            index.catalogs.setdefault(get_catalog_name(environment.name), email)
+
+        return index
+
+    def find_collisions(self, email: str, username: str, prefix: str, suffix: str) -> list[str]:
+        """Messages about the names of the new environment that already belong to another email address."""
+
+        resource_group = prefix + username + suffix
+        catalog = get_catalog_name(resource_group)
+        email = email.casefold()
+        collisions = []
+
+        owner = self.usernames.get(username.casefold())
+        if owner is not None and owner.casefold() != email:
+            collisions.append(Message.USERNAME_COLLISION.value.format(username=username, email=owner))
+
+        owner = self.resource_groups.get(resource_group.casefold())
+        if owner is not None and owner.casefold() != email:
+            collisions.append(Message.RESOURCE_GROUP_COLLISION.value.format(resource_group=resource_group,
+                                                                            email=owner))
+
+        owner = self.catalogs.get(catalog)
+        if owner is not None and owner.casefold() != email:
+            collisions.append(Message.CATALOG_COLLISION.value.format(catalog=catalog, email=owner))
+
+        return collisions
+
+    def add(self, email: str, username: str, prefix: str, suffix: str) -> None:
+
+        resource_group = prefix + username + suffix
+
+        self.usernames.setdefault(username.casefold(), email)
+        self.resource_groups.setdefault(resource_group.casefold(), email)
+        self.catalogs.setdefault(get_catalog_name(resource_group), email)
+
+    def allocate_username(self, email: str, username: str, prefix: str, suffix: str,
+                          max_attempts: Optional[int] = conf.USERNAME_MAX_DISAMBIGUATION) -> str:
+        """Return the username, or if it collides, the first free one of: username2, username3, ...
+        The allocated names are added to the index, so the next users see them."""
+
+        candidate = username
+        number = 1
+
+        while self.find_collisions(email, candidate, prefix, suffix):
+            number += 1
+            if max_attempts is not None and number > max_attempts:
+                raise ValueError(Message.USERNAME_NOT_ALLOCATED.value.format(username=username))
+            candidate = f"{username}{number}"
+
+        self.add(email, candidate, prefix, suffix)
+
+        return candidate
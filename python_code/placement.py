@@ -0,0 +1,143 @@
+""" Placement of new environments across many Azure subscriptions, based on their quotas and current usage.
+
+The subscriptions (with their Databricks account and the Unity Catalog metastore of every region) are listed in
+'./config/subscriptions.json'. Without that file every environment goes into the single subscription of
+'./config/admin_config.json', like before.
+
+The usage is counted from the './terraform_states/{az_subscription}/' directories. An environment uses:
+    * 2 resource groups: its own and the managed resource group of the Databricks workspace,
+    * 2 storage accounts in its region: the personal storage and the DBFS root storage of the workspace,
+    * 1 Databricks workspace in its region.
+
+A new environment goes into the least used subscription (the highest ratio of usage to quota after placing it),
+which has a metastore in the region and room for it. A user that already has an environment stays in its
+subscription, so configurations can be regenerated.
+"""
+
+import json
+import os
+from collections import Counter
+from typing import NamedTuple, Optional
+
+from python_code.constants import TemplateTag, Message
+from python_code.terraform_states import discover_environments, read_tfvars_values
+import python_code.config as conf
+
+
+class Quotas(NamedTuple):
+
+    resource_groups: int                    # Per subscription.
+    storage_accounts_per_region: int
+    workspaces_per_region: int
+
+
+ENVIRONMENT_USAGE = Quotas(resource_groups=2, storage_accounts_per_region=2, workspaces_per_region=1)
+
+
+class Subscription(NamedTuple):
+
+    az_subscription_id: str
+    dbx_account_id: str
+    metastores: dict[str, str]              # The metastore id for every region.
+    quotas: Quotas
+
+    def admin_config(self, az_region: str) -> dict[str, str]:
+        """Same values as in 'admin_config.json'."""
+
+        return {
+            TemplateTag.AZ_SUBSCRIPTION_ID.value: self.az_subscription_id,
+            TemplateTag.DBX_ACCOUNT_ID.value: self.dbx_account_id,
+            TemplateTag.DBX_METASTORE_ID.value: self.metastores[az_region]
+        }
+
+
+def load_subscriptions(subscriptions_file: str = conf.SUBSCRIPTIONS_FILE) -> list[Subscription]:
+
+    with open(subscriptions_file, 'r') as file:
+        entries = json.load(file)
+
+    return [
+        Subscription(
+            entry[TemplateTag.AZ_SUBSCRIPTION_ID.value],
+            entry[TemplateTag.DBX_ACCOUNT_ID.value],
+            entry['metastores'],
+            Quotas(**(conf.DEFAULT_SUBSCRIPTION_QUOTAS | entry.get('quotas', {})))
+        )
+        for entry in entries
+    ]
+
+
+class PlacementScheduler:
+
+    def __init__(self, subscriptions: list[Subscription]):
+        self.subscriptions = {subscription.az_subscription_id: subscription for subscription in subscriptions}
+        self.resource_groups = Counter()        # By subscription.
+        self.storage_accounts = Counter()       # By (subscription, region).
+        self.workspaces = Counter()             # By (subscription, region).
+        self.placements = {}                    # Subscription of the email addresses (casefolded).
+
+    @classmethod
+    def from_states_dir(cls, subscriptions: list[Subscription],
+                        states_dir: str = conf.TERRAFORM_STATES_DIR) -> 'PlacementScheduler':
+        """Count the usage of the environments in the terraform states directory."""
+
+        scheduler = cls(subscriptions)
+
+        for environment in discover_environments(states_dir):
+            tfvars = read_tfvars_values(environment.tfvars_file)
+            scheduler.add(environment.az_subscription, tfvars.get('azure-region', ''), tfvars.get('email', ''))
+
+        return scheduler
+
+    def add(self, az_subscription: str, az_region: str, email: str) -> None:
+
+        self.resource_groups[az_subscription] += ENVIRONMENT_USAGE.resource_groups
+        self.storage_accounts[az_subscription, az_region] += ENVIRONMENT_USAGE.storage_accounts_per_region
+        self.workspaces[az_subscription, az_region] += ENVIRONMENT_USAGE.workspaces_per_region
+        if email:
+            self.placements.setdefault(email.casefold(), az_subscription)
+
+    def utilization(self, subscription: Subscription, az_region: str) -> float:
+        """The highest ratio of usage to quota, with one more environment in the region. Above 1 it does not fit."""
+
+        az_subscription = subscription.az_subscription_id
+        quotas = subscription.quotas
+
+        return max(
+            (self.resource_groups[az_subscription] + ENVIRONMENT_USAGE.resource_groups)
+            / quotas.resource_groups,
+            (self.storage_accounts[az_subscription, az_region] + ENVIRONMENT_USAGE.storage_accounts_per_region)
+            / quotas.storage_accounts_per_region,
+            (self.workspaces[az_subscription, az_region] + ENVIRONMENT_USAGE.workspaces_per_region)
+            / quotas.workspaces_per_region
+        )
+
+    def place(self, email: str, az_region: str) -> Subscription:
+        """Choose the subscription of a new environment, and count its usage. Raises ValueError if none fits."""
+
+        placed = self.subscriptions.get(self.placements.get(email.casefold()))
+        if placed is not None and az_region in placed.metastores:
+            return placed
+
+        candidates = [(self.utilization(subscription, az_region), subscription)
+                      for subscription in self.subscriptions.values() if az_region in subscription.metastores]
+        candidates = [(utilization, subscription) for utilization, subscription in candidates if utilization <= 1]
+
+        if not candidates:
+            raise ValueError(Message.NO_SUBSCRIPTION_CAPACITY.value.format(az_region=az_region))
+
+        # min() keeps the first of equally used subscriptions, so the order of the registry breaks ties.
+        _, subscription = min(candidates, key=lambda candidate: candidate[0])
+        self.add(subscription.az_subscription_id, az_region, email)
+
+        return subscription
+
+
+def get_placement_scheduler(subscriptions_file: str = conf.SUBSCRIPTIONS_FILE,
+                            states_dir: str = conf.TERRAFORM_STATES_DIR) -> Optional[PlacementScheduler]:
+    """None if there is no subscription registry, and the single subscription of the admin config is used."""
+
+    if not os.path.isfile(subscriptions_file):
+        return None
+
+    return PlacementScheduler.from_states_dir(load_subscriptions(subscriptions_file), states_dir)
@@ -0,0 +1,139 @@
+""" Cache of the plan / apply results of every environment, keyed by the hash of their inputs.
+
+The inputs of an environment are its tfvars, the terraform code (the .tf files and the dependency lock file) and the
+extra var files passed to terraform (i.e. the prefetched lookups). When they are the same as the inputs of the last
+successful apply, and no plan since then found changes, planning or applying the environment again would only
+refresh it against Azure and Databricks, so it can be skipped.
+
+The infrastructure can still drift from the state outside of terraform. With a drift refresh period, environments
+not verified for longer than that are planned again (with their own, lower concurrency limit).
+
+With layered states (see 'terraform_layers.py') every layer is cached on its own. The inputs of a layer are its code,
+only the variables it references (from the tfvars and the var files), and the outputs of the layers it reads.
+
+The results are saved into 'plan_cache.json' (or 'plan_cache_{layer}.json') in the directory of the environment.
+"""
+
+import hashlib
+import json
+import os
+import re
+from datetime import datetime, timedelta, timezone
+from enum import Enum
+from typing import Optional
+
+from python_code.atomic_files import atomic_write
+from python_code.provider_cache import get_code_version
+from python_code.terraform_layers import get_referenced_variables
+from python_code.terraform_states import Environment, read_tfvars_values, read_tfstate_outputs
+import python_code.config as conf
+
+NO_CHANGES = 'No changes.'
+NO_CHANGES_JSON_PATTERN = re.compile(r'^Plan: (0 to \w+, )*0 to destroy\.$')     # With '-json' (see 'timeline.py').
+SUMMARY_PATTERN = re.compile(r'^(Plan: .*|No changes\..*|Apply complete!.*|Destroy complete!.*)$', re.M)
+
+
+class CacheStatus(Enum):
+
+    UP_TO_DATE = 'up to date'                   # Can be skipped.
+    DRIFT_REFRESH = 'drift refresh'             # Up to date, but not verified for longer than the refresh period.
+    CHANGED = 'changed'
+
+
+def get_plan_cache_file(environment: Environment, layer: Optional[str] = None) -> str:
+
+    if layer is None:
+        return os.path.join(environment.path, conf.PLAN_CACHE_FILENAME)
+    return os.path.join(environment.path, conf.LAYER_PLAN_CACHE_FILENAME.format(layer=layer))
+
+
+def get_inputs_hash(environment: Environment, terraform_code_dir: str = conf.TERRAFORM_CODE_DIR,
+                    var_files: tuple[str, ...] = (), layer: Optional[str] = None) -> str:
+    """For a layer, 'terraform_code_dir' is the directory of the layer. The outputs of the layers it reads are
+    hashed when it is about to run, so they are the ones applied just before."""
+
+    digest = hashlib.sha256(get_code_version(terraform_code_dir).encode('utf-8'))
+
+    if layer is None:
+        for file_name in (environment.tfvars_file, *var_files):
+            with open(file_name, 'rb') as file:
+                digest.update(b'\0' + file.read())
+        return digest.hexdigest()
+
+    variables = get_referenced_variables(terraform_code_dir)
+    values = {}
+    for file_name in (environment.tfvars_file, *var_files):
+        values |= {name: value for name, value in read_tfvars_values(file_name).items() if name in variables}
+
+    upstream_outputs = {upstream: read_tfstate_outputs(environment.layer_tfstate_file(upstream))
+                        for upstream in conf.TERRAFORM_LAYER_UPSTREAMS.get(layer, [])}
+
+    digest.update(json.dumps([values, upstream_outputs], sort_keys=True).encode('utf-8'))
+
+    return digest.hexdigest()
+
+
+def read_plan_cache(environment: Environment, layer: Optional[str] = None) -> dict:
+
+    try:
+        with open(get_plan_cache_file(environment, layer), 'r') as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def get_summary(log_file: str) -> Optional[str]:
+    """The last summary line of the terraform output, i.e.: 'Plan: 1 to add, 0 to change, 0 to destroy.'"""
+
+    try:
+        with open(log_file, 'r') as file:
+            summaries = SUMMARY_PATTERN.findall(file.read())
+    except FileNotFoundError:
+        return None
+
+    return summaries[-1].strip() if summaries else None
+
+
+def record_result(environment: Environment, action: str, inputs_hash: str, returncode: int,
+                  now: Optional[datetime] = None, layer: Optional[str] = None) -> None:
+    """Save the result of the run. A destroyed environment (or layer) has nothing to cache."""
+
+    plan_cache_file = get_plan_cache_file(environment, layer)
+
+    if action == 'destroy':
+        if returncode == 0 and os.path.exists(plan_cache_file):
+            os.remove(plan_cache_file)
+        return
+
+    record = read_plan_cache(environment, layer)
+    record[action] = {
+        'inputs_hash': inputs_hash,
+        'returncode': returncode,
+        'summary': get_summary(environment.log_file(action, layer)),
+        'at': (now or datetime.now(timezone.utc)).isoformat()
+    }
+
+    atomic_write(plan_cache_file, json.dumps(record, indent=2))
+
+
+def get_cache_status(record: dict, inputs_hash: str, drift_refresh_days: Optional[float] = None,
+                     now: Optional[datetime] = None) -> CacheStatus:
+
+    applied = record.get('apply')
+    if not applied or applied['returncode'] != 0 or applied['inputs_hash'] != inputs_hash:
+        return CacheStatus.CHANGED
+
+    verified_at = datetime.fromisoformat(applied['at'])
+
+    planned = record.get('plan')
+    if planned and planned['inputs_hash'] == inputs_hash and datetime.fromisoformat(planned['at']) >= verified_at:
+        summary = planned['summary'] or ''
+        if planned['returncode'] != 0 or not (summary.startswith(NO_CHANGES) or NO_CHANGES_JSON_PATTERN.match(summary)):
+            return CacheStatus.CHANGED          # A plan since the apply failed or found drift.
+        verified_at = datetime.fromisoformat(planned['at'])
+
+    if drift_refresh_days is not None and \
+            (now or datetime.now(timezone.utc)) - verified_at > timedelta(days=drift_refresh_days):
+        return CacheStatus.DRIFT_REFRESH
+
+    return CacheStatus.UP_TO_DATE
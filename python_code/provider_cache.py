@@ -0,0 +1,166 @@
+""" One-time 'terraform init' and cheap, isolated working copies of the terraform code for every environment.
+
+Every environment uses the same './terraform_code' and the same providers. Running 'terraform init' in that
+directory for parallel runs would download / unpack the providers again and again, and the runs would race on
+'./terraform_code/.terraform'. Instead:
+
+* './.terraform_cache/plugins/' is the shared provider plugin cache (TF_PLUGIN_CACHE_DIR).
+* './.terraform_cache/init/{code_version}/' is a copy of the code initialized once for every version of the code
+  (the hash of the .tf files and the dependency lock file). The versions of the providers are pinned by the lock file.
+  Optionally the providers are installed from a local filesystem mirror ('terraform providers mirror'), offline.
+* './.terraform_cache/work/{az_subscription}/{environment}/' is the working copy of an environment: links to the
+  .tf files, the lock file and the providers of the initialized copy. Concurrent runs do not share a '.terraform'.
+* './.terraform_cache/locks/{code_dir_hash}.terraform.lock.hcl' is the lock file created by the first init of a code
+  directory without one. The next inits use it, so the provider versions stay pinned without writing into the code
+  directory (commit it as '{code_dir}/.terraform.lock.hcl' to pin them for everyone).
+"""
+
+import fcntl
+import hashlib
+import os
+import shutil
+import subprocess
+from typing import Optional
+
+from python_code.terraform_states import Environment
+import python_code.config as conf
+
+INITIALIZED_MARKER = '.initialized'
+
+
+class InitError(subprocess.CalledProcessError):
+    """'terraform init' failed, its output is in 'log_file'."""
+
+    def __init__(self, returncode: int, command: list[str], log_file: str):
+        super().__init__(returncode, command)
+        self.log_file = log_file
+
+
+def get_code_files(terraform_code_dir: str) -> list[str]:
+    """The .tf files and the dependency lock file of the terraform code, by name."""
+
+    return sorted(name for name in os.listdir(terraform_code_dir)
+                  if name.endswith('.tf') or name == conf.TERRAFORM_LOCK_FILENAME)
+
+
+def get_code_version(terraform_code_dir: str = conf.TERRAFORM_CODE_DIR) -> str:
+
+    digest = hashlib.sha256()
+
+    for name in get_code_files(terraform_code_dir):
+        digest.update(name.encode('utf-8') + b'\0')
+        with open(os.path.join(terraform_code_dir, name), 'rb') as file:
+            digest.update(file.read() + b'\0')
+
+    return digest.hexdigest()[:16]
+
+
+def get_terraform_environment(cache_dir: str = conf.TERRAFORM_CACHE_DIR) -> dict[str, str]:
+    """Environment variables for running terraform with the shared plugin cache."""
+
+    return os.environ | {'TF_PLUGIN_CACHE_DIR': os.path.abspath(os.path.join(cache_dir, 'plugins')),
+                         'TF_IN_AUTOMATION': '1'}
+
+
+def get_init_log_file(terraform_code_dir: str = conf.TERRAFORM_CODE_DIR,
+                      cache_dir: str = conf.TERRAFORM_CACHE_DIR) -> str:
+
+    return os.path.join(cache_dir, 'init', f"{get_code_version(terraform_code_dir)}.log")
+
+
+def get_generated_lock_file(terraform_code_dir: str = conf.TERRAFORM_CODE_DIR,
+                            cache_dir: str = conf.TERRAFORM_CACHE_DIR) -> str:
+    """Where the lock file created by init is kept for a code directory without its own lock file."""
+
+    code_dir_hash = hashlib.sha256(os.path.abspath(terraform_code_dir).encode('utf-8')).hexdigest()[:16]
+
+    return os.path.join(cache_dir, 'locks', code_dir_hash + conf.TERRAFORM_LOCK_FILENAME)
+
+
+def prepare_initialized_code(terraform_code_dir: str = conf.TERRAFORM_CODE_DIR,
+                             cache_dir: str = conf.TERRAFORM_CACHE_DIR,
+                             plugin_mirror_dir: Optional[str] = None) -> str:
+    """Return the initialized copy of the current version of the code; run 'terraform init' if there is none yet.
+    Safe to call from parallel threads and processes: init runs only once, the others wait for it.
+    Raises InitError if init fails."""
+
+    version = get_code_version(terraform_code_dir)
+    log_file = get_init_log_file(terraform_code_dir, cache_dir)       # Before init, for the version it runs.
+    init_root = os.path.join(cache_dir, 'init')
+    initialized_dir = os.path.join(init_root, version)
+
+    if os.path.exists(os.path.join(initialized_dir, INITIALIZED_MARKER)):
+        return initialized_dir
+
+    os.makedirs(init_root, exist_ok=True)
+    os.makedirs(os.path.join(cache_dir, 'plugins'), exist_ok=True)
+
+    with open(os.path.join(init_root, f"{version}.lock"), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        if os.path.exists(os.path.join(initialized_dir, INITIALIZED_MARKER)):
+            return initialized_dir
+
+        shutil.rmtree(initialized_dir, ignore_errors=True)
+        os.makedirs(initialized_dir)
+        for name in get_code_files(terraform_code_dir):
+            shutil.copy2(os.path.join(terraform_code_dir, name), initialized_dir)
+
+        # Without a lock file in the code, the one created by the first init pins the provider versions.
+        generated_lock_file = get_generated_lock_file(terraform_code_dir, cache_dir)
+        pinned = os.path.exists(os.path.join(terraform_code_dir, conf.TERRAFORM_LOCK_FILENAME))
+        if not pinned and os.path.exists(generated_lock_file):
+            shutil.copy2(generated_lock_file, os.path.join(initialized_dir, conf.TERRAFORM_LOCK_FILENAME))
+            pinned = True
+
+        command = [conf.TERRAFORM_EXECUTABLE, f'-chdir={os.path.abspath(initialized_dir)}', 'init',
+                   '-input=false', '-no-color', '-backend=false']
+        if pinned:
+            command.append('-lockfile=readonly')
+        if plugin_mirror_dir:
+            command.append(f'-plugin-dir={os.path.abspath(plugin_mirror_dir)}')
+
+        with open(log_file, 'w') as log:
+            returncode = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                        env=get_terraform_environment(cache_dir)).returncode
+        if returncode != 0:
+            raise InitError(returncode, command, log_file)
+
+        if not pinned:
+            os.makedirs(os.path.dirname(generated_lock_file), exist_ok=True)
+            shutil.copy2(os.path.join(initialized_dir, conf.TERRAFORM_LOCK_FILENAME), generated_lock_file)
+
+        open(os.path.join(initialized_dir, INITIALIZED_MARKER), 'w').close()
+
+    return initialized_dir
+
+
+def prepare_working_copy(environment: Environment, initialized_dir: str,
+                         cache_dir: str = conf.TERRAFORM_CACHE_DIR, layer: Optional[str] = None) -> str:
+    """Create (or reuse, if it is for the same version of the code) the working copy of the environment (or of one
+    of its layers): symbolic links to the files and the providers of the initialized copy, so it costs no copying."""
+
+    working_dir = os.path.join(cache_dir, 'work', environment.az_subscription, environment.name)
+    if layer is not None:
+        working_dir = os.path.join(working_dir, layer)
+    version_file = os.path.join(working_dir, INITIALIZED_MARKER)
+    version = os.path.basename(initialized_dir)
+
+    if os.path.exists(version_file):
+        with open(version_file, 'r') as file:
+            if file.read() == version:
+                return working_dir
+
+    shutil.rmtree(working_dir, ignore_errors=True)
+    os.makedirs(os.path.join(working_dir, '.terraform'))
+
+    initialized_dir = os.path.abspath(initialized_dir)
+    for name in get_code_files(initialized_dir):
+        os.symlink(os.path.join(initialized_dir, name), os.path.join(working_dir, name))
+    os.symlink(os.path.join(initialized_dir, '.terraform', 'providers'),
+               os.path.join(working_dir, '.terraform', 'providers'))
+
+    with open(version_file, 'w') as file:
+        file.write(version)
+
+    return working_dir
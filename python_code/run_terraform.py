@@ -0,0 +1,386 @@
+""" Run terraform plan / apply / destroy for many environments in parallel.
+
+The environments are discovered in './terraform_states/{az_subscription}/{environment}/'. They are processed by
+a bounded pool of workers, with a separate (lower) limit for the number of environments processed at the same time
+in one Azure subscription, so the Azure and Databricks APIs do not throttle the runs (see 'scheduler.py').
+
+The output of every run is streamed into the log file of the environment. A failed run is retried with an
+exponential backoff, without holding a worker or a slot of its subscription in the meantime. An environment is run
+with its lock held (see 'atomic_files.py'), so the configuration scripts do not rewrite its files in the meantime.
+An environment that cannot be run (i.e. no terraform executable, or its lock is not released) fails on its own, the
+error is written into its log file, and the other environments still run.
+
+By default the terraform code is initialized only once for every version of it, and every environment runs in its own
+working copy sharing the providers (see 'provider_cache.py'). The lookups that are the same for every environment can
+be resolved once for the whole batch (see 'batch_lookups.py'). With the plan cache, environments whose inputs did not
+change since their last apply are skipped (see 'plan_cache.py').
+
+An environment with layered states (see 'terraform_layers.py') runs its layers one after the other: 'infra',
+'unity_catalog', then 'compute' (the reverse order for destroy). A failed layer stops the run of the environment.
+With the plan cache, only the layers whose inputs changed are run.
+
+With a timings file, terraform runs with '-json': its events are parsed as they arrive, into the log file and the
+durations of the resources, and the stages of the script are timed too (see 'timeline.py').
+"""
+
+import argparse
+import contextlib
+import itertools
+import os
+import subprocess
+import sys
+import threading
+from typing import Generator, NamedTuple, Optional, TextIO
+
+from python_code.atomic_files import environment_lock
+from python_code.batch_lookups import LookupResolver, CliLookupResolver, StaticLookupResolver, prefetch_lookups
+from python_code.constants import RunMessage
+from python_code.inventory import update_inventory, remove_from_inventory
+from python_code.plan_cache import CacheStatus, get_cache_status, get_inputs_hash, read_plan_cache, record_result
+from python_code.provider_cache import InitError, prepare_initialized_code, prepare_working_copy
+from python_code.scheduler import Wait, run_scheduled
+from python_code.terraform_layers import get_layer_code_dir, get_run_layers, get_upstream_state_vars
+from python_code.terraform_states import Environment, discover_environments, read_environments_file
+from python_code.timeline import ERRORED, EventTimeline, TimingRecorder
+import python_code.config as conf
+
+
+ERROR_RETURNCODE = 1        # The return code of an environment that could not be run.
+
+
+class RunResult(NamedTuple):
+
+    environment: Environment
+    action: str
+    returncode: int
+    attempts: int
+    skipped: bool = False           # The inputs did not change since the last apply (see 'plan_cache.py').
+    layers: tuple[str, ...] = ()    # With layered states: the layers run (not skipped), the last one failed if any.
+    error: Optional[str] = None     # The environment could not be run (an OSError, i.e. a TimeoutError of the lock).
+
+
+def get_terraform_command(action: str, environment: Environment, terraform_code_dir: str = conf.TERRAFORM_CODE_DIR,
+                          var_files: tuple[str, ...] = (), layer: Optional[str] = None,
+                          json_output: bool = False) -> list[str]:
+    """Same as the commands in 'terraform_commands.txt', but non-interactive, and with absolute paths
+    so it does not matter where the script is run from. For a layer, 'terraform_code_dir' is the directory of
+    the layer. With 'json_output' terraform outputs JSON events (see 'timeline.py')."""
+
+    tfstate_file = environment.tfstate_file if layer is None else environment.layer_tfstate_file(layer)
+
+    command = [
+        conf.TERRAFORM_EXECUTABLE,
+        f'-chdir={os.path.abspath(terraform_code_dir)}',
+        action,
+        '-input=false',
+        '-no-color',
+        *(['-json'] if json_output else []),
+        f'-var-file={os.path.abspath(environment.tfvars_file)}',
+        f'-state={os.path.abspath(tfstate_file)}'
+    ]
+    command.extend(f'-var-file={os.path.abspath(var_file)}' for var_file in var_files)
+    command.extend(f'-var={variable}' for variable in get_upstream_state_vars(environment, layer))
+
+    if action != 'plan':
+        command.append('-auto-approve')
+
+    return command
+
+
+def run_terraform(action: str, environment: Environment, retries: int = conf.TERRAFORM_RETRIES,
+                  backoff_seconds: float = conf.TERRAFORM_RETRY_BACKOFF_SECONDS,
+                  terraform_code_dir: str = conf.TERRAFORM_CODE_DIR, var_files: tuple[str, ...] = (),
+                  layer: Optional[str] = None,
+                  recorder: Optional[TimingRecorder] = None) -> Generator[Wait, None, RunResult]:
+    """Run terraform for one environment (or one layer of it), retrying on failure. The output of all attempts goes
+    to the log file. With an enabled recorder, every attempt and the resources it changed are timed.
+    A generator for the scheduler (see 'scheduler.py'): it yields the backoff before a retry, and returns the result."""
+
+    recorder = recorder or TimingRecorder()
+    command = get_terraform_command(action, environment, terraform_code_dir, var_files, layer, recorder.enabled)
+    log_file = environment.log_file(action, layer)
+
+    open(log_file, 'w').close()
+
+    for attempt in range(1, retries + 2):
+        context = {'environment': environment.key, 'action': action, 'layer': layer, 'attempt': attempt}
+        with open(log_file, 'a') as log, recorder.stage('terraform', **context) as outcome:
+            log.write(RunMessage.ATTEMPT.value.format(action=action, attempt=attempt, command=' '.join(command)))
+            log.flush()
+            if recorder.enabled:
+                timeline = EventTimeline(**context)
+                returncode = run_with_timeline(command, log, timeline)
+                recorder.write(timeline.close())
+            else:
+                returncode = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT,
+                                            stdin=subprocess.DEVNULL).returncode
+            if returncode != 0:
+                outcome['status'] = ERRORED
+
+        if returncode == 0 or attempt > retries:
+            break
+
+        yield Wait(backoff_seconds * 2 ** (attempt - 1))
+
+    return RunResult(environment, action, returncode, attempt, layers=() if layer is None else (layer,))
+
+
+def run_with_timeline(command: list[str], log: TextIO, timeline: EventTimeline) -> int:
+    """Run terraform with '-json', feeding its events to the timeline as they arrive, and logging their messages."""
+
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                          text=True, bufsize=1) as process:
+        for line in process.stdout:
+            log.write(timeline.feed(line))
+            log.flush()
+
+    return process.returncode
+
+
+def interleave_subscriptions(environments: list[Environment]) -> list[Environment]:
+    """Order the environments round-robin by subscription, so the runs of all the subscriptions start early, and
+    the environments of the same subscription are not all queued at the end."""
+
+    by_subscription = {}
+    for environment in environments:
+        by_subscription.setdefault(environment.az_subscription, []).append(environment)
+
+    return [environment
+            for environments_at_position in itertools.zip_longest(*by_subscription.values())
+            for environment in environments_at_position if environment is not None]
+
+
+def run_terraform_for_environments(action: str, environments: list[Environment],
+                                   max_workers: int = conf.TERRAFORM_MAX_WORKERS,
+                                   max_workers_per_subscription: int = conf.TERRAFORM_MAX_WORKERS_PER_SUBSCRIPTION,
+                                   retries: int = conf.TERRAFORM_RETRIES,
+                                   backoff_seconds: float = conf.TERRAFORM_RETRY_BACKOFF_SECONDS,
+                                   terraform_code_dir: str = conf.TERRAFORM_CODE_DIR,
+                                   layers_dir: str = conf.TERRAFORM_LAYERS_DIR,
+                                   provider_cache_dir: Optional[str] = None,
+                                   plugin_mirror_dir: Optional[str] = None,
+                                   lookup_resolver: Optional[LookupResolver] = None,
+                                   prefetch_dir: str = conf.TERRAFORM_PREFETCH_DIR,
+                                   use_plan_cache: bool = False,
+                                   drift_refresh_days: Optional[float] = None,
+                                   max_drift_workers: int = conf.TERRAFORM_MAX_DRIFT_WORKERS,
+                                   timings_file: Optional[str] = None) -> list[RunResult]:
+    """With a provider cache directory, 'terraform init' runs once (if this version of the code is not initialized
+    yet), then every environment runs in its own working copy, otherwise all of them in the terraform code directory.
+    With a lookup resolver, the lookups are resolved once for all the environments.
+    With the plan cache, plan and apply skip the environments that are up to date, and at most 'max_drift_workers'
+    environments are refreshed for drift at the same time.
+    The layers of the environments with layered states are in 'layers_dir', and initialized once each.
+    With a timings file, the durations of the resources and of the stages are appended to it (see 'timeline.py')."""
+
+    recorder = TimingRecorder(timings_file)
+
+    lookups_files = {}
+    if lookup_resolver:
+        with recorder.stage('prefetch_lookups', action=action):
+            lookups_files = prefetch_lookups(environments, lookup_resolver, prefetch_dir)
+
+    code_dirs = {layer: get_layer_code_dir(layer, terraform_code_dir, layers_dir)
+                 for environment in environments for layer in get_run_layers(environment, action)}
+
+    initialized_dirs = {}
+    if provider_cache_dir:
+        for layer, code_dir in code_dirs.items():
+            with recorder.stage('init', action=action, layer=layer):
+                initialized_dirs[layer] = prepare_initialized_code(code_dir, provider_cache_dir, plugin_mirror_dir)
+
+    drift_limit = threading.Semaphore(max_drift_workers)
+
+    def run_layer(environment: Environment, layer: Optional[str],
+                  var_files: tuple[str, ...]) -> Generator[Wait, None, RunResult]:
+        context = {'environment': environment.key, 'action': action, 'layer': layer}
+        drift_refresh = False
+        if use_plan_cache:
+            with recorder.stage('inputs_hash', **context):
+                inputs_hash = get_inputs_hash(environment, code_dirs[layer], var_files, layer)
+            status = CacheStatus.CHANGED if action == 'destroy' else \
+                get_cache_status(read_plan_cache(environment, layer), inputs_hash, drift_refresh_days)
+            if status is CacheStatus.UP_TO_DATE:
+                return RunResult(environment, action, 0, 0, skipped=True)
+            drift_refresh = status is CacheStatus.DRIFT_REFRESH
+
+        working_dir = code_dirs[layer]
+        if initialized_dirs:
+            with recorder.stage('working_copy', **context):
+                working_dir = prepare_working_copy(environment, initialized_dirs[layer], provider_cache_dir, layer)
+        if drift_refresh:
+            with recorder.stage('drift_wait', **context):
+                yield Wait(semaphore=drift_limit)
+        try:
+            result = yield from run_terraform(action, environment, retries, backoff_seconds, working_dir, var_files,
+                                              layer, recorder)
+        finally:
+            if drift_refresh:
+                drift_limit.release()
+
+        if use_plan_cache:
+            record_result(environment, action, inputs_hash, result.returncode, layer=layer)
+        return result
+
+    def run(environment: Environment) -> Generator[Wait, None, RunResult]:
+        var_files = (lookups_files[environment.key],) if environment.key in lookups_files else ()
+
+        layer_results = []
+        layer = None
+        try:
+            with contextlib.ExitStack() as lock:
+                with recorder.stage('lock_wait', environment=environment.key, action=action):
+                    lock.enter_context(environment_lock(environment.path))
+                for layer in get_run_layers(environment, action):
+                    layer_results.append((yield from run_layer(environment, layer, var_files)))
+                    if layer_results[-1].returncode != 0:
+                        break
+        except OSError as error:
+            result = get_error_result(environment, action, layer, layer_results, error)
+            print_run_result(result)
+            return result
+
+        result = RunResult(
+            environment, action, layer_results[-1].returncode,
+            sum(layer_result.attempts for layer_result in layer_results),
+            skipped=all(layer_result.skipped for layer_result in layer_results),
+            layers=tuple(layer for layer_result in layer_results for layer in layer_result.layers)
+        )
+        print_run_result(result)
+        return result
+
+    return run_scheduled([(environment.az_subscription, run(environment))
+                          for environment in interleave_subscriptions(environments)],
+                         max_workers, max_workers_per_subscription)
+
+
+def get_error_result(environment: Environment, action: str, layer: Optional[str], layer_results: list[RunResult],
+                     error: OSError) -> RunResult:
+    """The failed result of an environment whose run raised an error; the error is appended to the log file of the
+    layer it stopped at."""
+
+    layers = tuple(name for layer_result in layer_results for name in layer_result.layers)
+    if layer is not None and layer not in layers:
+        layers += (layer,)
+
+    with contextlib.suppress(OSError):
+        with open(environment.log_file(action, layer), 'a') as log:
+            log.write(RunMessage.ERROR_LOG.value.format(action=action, error=error))
+
+    return RunResult(environment, action, ERROR_RETURNCODE,
+                     sum(layer_result.attempts for layer_result in layer_results), layers=layers, error=str(error))
+
+
+def print_run_result(result: RunResult) -> None:
+
+    environment = result.environment.key
+
+    if result.error is not None:
+        print(RunMessage.ERROR.value.format(
+            environment=environment, action=result.action, error=result.error,
+            log_file=result.environment.log_file(result.action, result.layers[-1] if result.layers else None)
+        ))
+    elif result.skipped:
+        print(RunMessage.SKIPPED.value.format(environment=environment, action=result.action))
+    elif result.returncode == 0 and result.layers:
+        print(RunMessage.LAYERS_SUCCESS.value.format(environment=environment, action=result.action,
+                                                     layers=', '.join(result.layers), attempts=result.attempts))
+    elif result.returncode == 0:
+        print(RunMessage.SUCCESS.value.format(environment=environment, action=result.action, attempts=result.attempts))
+    else:
+        print(RunMessage.FAILURE.value.format(
+            environment=environment, action=result.action, returncode=result.returncode, attempts=result.attempts,
+            log_file=result.environment.log_file(result.action, result.layers[-1] if result.layers else None)
+        ))
+
+
+def filter_environments(environments: list[Environment], az_subscriptions: Optional[list[str]] = None,
+                        names: Optional[list[str]] = None, keys: Optional[set[str]] = None) -> list[Environment]:
+
+    return [environment for environment in environments
+            if (not az_subscriptions or environment.az_subscription in az_subscriptions)
+            and (not names or environment.name in names)
+            and (keys is None or environment.key in keys)]
+
+
+def parse_arguments() -> argparse.Namespace:
+
+    parser = argparse.ArgumentParser(description="Run terraform for many environments in parallel.")
+    parser.add_argument("action", choices=conf.TERRAFORM_ACTIONS)
+    parser.add_argument("--subscription", action="append", help="Only environments of this subscription.")
+    parser.add_argument("--environment", action="append", help="Only this environment.")
+    parser.add_argument("--environments-file",
+                        help="Only the environments listed in this file ('{az_subscription}/{environment}' lines), "
+                             "i.e. the changed environments saved by 'create_configurations_for_roster.py'.")
+    parser.add_argument("--workers", type=int, default=conf.TERRAFORM_MAX_WORKERS)
+    parser.add_argument("--workers-per-subscription", type=int, default=conf.TERRAFORM_MAX_WORKERS_PER_SUBSCRIPTION)
+    parser.add_argument("--retries", type=int, default=conf.TERRAFORM_RETRIES)
+    parser.add_argument("--plugin-mirror", default=conf.TERRAFORM_PLUGIN_MIRROR_DIR,
+                        help="Install the providers from this local filesystem mirror ('terraform providers mirror').")
+    parser.add_argument("--no-provider-cache", action="store_true",
+                        help="Run in the terraform code directory, without the shared init and working copies.")
+    parser.add_argument("--use-plan-cache", action="store_true",
+                        help="Skip the environments whose inputs did not change since their last apply.")
+    parser.add_argument("--drift-refresh-days", type=float, default=conf.TERRAFORM_DRIFT_REFRESH_DAYS,
+                        help="With the plan cache: still run the environments not verified for this many days.")
+    parser.add_argument("--drift-workers", type=int, default=conf.TERRAFORM_MAX_DRIFT_WORKERS,
+                        help="Environments refreshed for drift at the same time.")
+    parser.add_argument("--prefetch-lookups", action="store_true",
+                        help="Resolve the current user and the Databricks runtime once, with the az / databricks CLIs.")
+    parser.add_argument("--lookups-file",
+                        help="Use the lookups in this JSON file (see 'batch_lookups.py') instead of the data sources.")
+    parser.add_argument("--no-timings", action="store_true",
+                        help=f"Run terraform without '-json', and do not time the runs into "
+                             f"'{conf.TERRAFORM_TIMINGS_FILE}'.")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+
+    selected_environments = filter_environments(
+        discover_environments(), args.subscription, args.environment,
+        set(read_environments_file(args.environments_file)) if args.environments_file else None
+    )
+    if not selected_environments:
+        print(RunMessage.NO_ENVIRONMENTS.value.format(states_dir=conf.TERRAFORM_STATES_DIR))
+        sys.exit(1)
+
+    print(RunMessage.STARTING.value.format(action=args.action, count=len(selected_environments)))
+
+    resolver = None
+    if args.lookups_file:
+        resolver = StaticLookupResolver.from_file(args.lookups_file)
+    elif args.prefetch_lookups:
+        resolver = CliLookupResolver()
+
+    try:
+        run_results = run_terraform_for_environments(
+            args.action, selected_environments, max_workers=args.workers,
+            max_workers_per_subscription=args.workers_per_subscription, retries=args.retries,
+            provider_cache_dir=None if args.no_provider_cache else conf.TERRAFORM_CACHE_DIR,
+            plugin_mirror_dir=args.plugin_mirror, lookup_resolver=resolver, use_plan_cache=args.use_plan_cache,
+            drift_refresh_days=args.drift_refresh_days, max_drift_workers=args.drift_workers,
+            timings_file=None if args.no_timings else conf.TERRAFORM_TIMINGS_FILE
+        )
+    except InitError as error:
+        print(RunMessage.INIT_FAILED.value.format(returncode=error.returncode, log_file=error.log_file))
+        sys.exit(1)
+
+    succeeded_environments = [result.environment for result in run_results if result.returncode == 0]
+    if args.action == 'apply':
+        update_inventory(succeeded_environments)
+    elif args.action == 'destroy':
+        remove_from_inventory(succeeded_environments)
+
+    failed_count = sum(result.returncode != 0 for result in run_results)
+    skipped_count = sum(result.skipped for result in run_results)
+    print(RunMessage.SUMMARY.value.format(
+        action=args.action, succeeded=len(run_results) - failed_count - skipped_count, failed=failed_count,
+        skipped=skipped_count
+    ))
+
+    if failed_count:
+        sys.exit(1)
@@ -0,0 +1,94 @@
+""" Scheduling of the runs of many environments on a bounded pool of workers, with a lower limit for the runs at the
+same time in one Azure subscription.
+
+A run is a generator, executed step by step on the workers. Between two steps it waits without holding a worker or a
+slot of its subscription: it yields a 'Wait', for the backoff before a retry, or for a semaphore it needs (i.e. the
+drift refresh limit). A run is only given a worker when its subscription has a free slot, so the runs of a busy
+subscription wait in the queue, while the workers run the other subscriptions.
+"""
+
+import heapq
+import threading
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Generator, NamedTuple, Optional
+
+
+class Wait(NamedTuple):
+    """Yielded by a run: resume it after 'seconds', with 'semaphore' (if any) acquired for it. The run releases the
+    semaphore itself."""
+
+    seconds: float = 0
+    semaphore: Optional[threading.Semaphore] = None
+
+
+Run = Generator[Wait, None, Any]
+
+
+def step(run: Run) -> tuple[bool, Any]:
+    """Execute the run up to its next wait. Returns (False, the wait), or (True, the result) at its end."""
+
+    try:
+        return False, next(run)
+    except StopIteration as stop:
+        return True, stop.value
+
+
+def run_scheduled(runs: list[tuple[str, Run]], max_workers: int, max_workers_per_subscription: int) -> list[Any]:
+    """Execute the runs, (az_subscription, generator) pairs, and return their results in the same order. The runs
+    are started in order, the ones of the subscriptions at their limit are skipped until a slot is free. A run
+    resuming after a wait goes before the runs not started yet. A run should handle its own errors: an exception
+    raised by a run stops all of them."""
+
+    results = [None] * len(runs)
+    ready = list(range(len(runs)))      # Indexes of the runs to execute, in order.
+    waiting = []                        # Heap of (resume at, index) of the runs waiting.
+    semaphores = {}                     # Index -> the semaphore the run waits for.
+    running = {}                        # Future -> index.
+    subscription_running = Counter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while ready or waiting or running:
+                now = time.monotonic()
+                resumed = []
+                while waiting and waiting[0][0] <= now:
+                    resumed.append(heapq.heappop(waiting)[1])
+                ready[:0] = resumed
+
+                for index in list(ready):
+                    if len(running) >= max_workers:
+                        break
+                    az_subscription, run = runs[index]
+                    if subscription_running[az_subscription] >= max_workers_per_subscription:
+                        continue
+                    if index in semaphores and not semaphores[index].acquire(blocking=False):
+                        continue
+                    semaphores.pop(index, None)
+                    ready.remove(index)
+                    subscription_running[az_subscription] += 1
+                    running[executor.submit(step, run)] = index
+
+                timeout = max(waiting[0][0] - time.monotonic(), 0) if waiting else None
+                if not running:
+                    time.sleep(timeout or 0)
+                    continue
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    index = running.pop(future)
+                    subscription_running[runs[index][0]] -= 1
+                    finished, value = future.result()
+                    if finished:
+                        results[index] = value
+                    else:
+                        heapq.heappush(waiting, (time.monotonic() + value.seconds, index))
+                        if value.semaphore is not None:
+                            semaphores[index] = value.semaphore
+    finally:
+        # An unexpected error of a run stops the batch: the unfinished runs release what they hold (i.e. their locks).
+        for _, run in runs:
+            run.close()
+
+    return results
@@ -0,0 +1,101 @@
+""" Layered terraform states: every environment in a state per layer, instead of one state for everything.
+
+The resources of an environment change at very different rates: the resource group, storage and workspace ('infra')
+almost never, the catalog, schema and grants ('unity_catalog') rarely, the cluster, pool and SQL warehouse
+('compute') with every change of a compute profile or of the runtime. With one state, every plan / apply refreshes
+all of them.
+
+Every layer is a terraform root of its own, in './terraform_code/layers/{layer}/': symbolic links to the shared .tf
+files of './terraform_code/', and the wiring of the layer. It has its own state file in the directory of the
+environment. The 'unity_catalog' and 'compute' layers read the outputs of 'infra' (workspace URL and id, storage
+names..) from its state file, with a 'terraform_remote_state' data source.
+
+The inputs of a layer are its code, the variables it references, and the outputs of the layers it reads. With the plan
+cache (see 'plan_cache.py'), a change of the compute profile only plans / applies the 'compute' layer.
+
+New environments get layered states. Environments already applied with one 'terraform.tfstate' keep it.
+"""
+
+import os
+import re
+from typing import Optional
+
+from python_code.atomic_files import atomic_write
+from python_code.hcl import parse_body
+from python_code.terraform_states import Environment
+import python_code.config as conf
+
+VARIABLE_REFERENCE_PATTERN = re.compile(r'\bvar\.([A-Za-z_][\w-]*)')
+
+
+def assign_layers(environment: Environment, layers: list[str] = conf.TERRAFORM_LAYERS) -> list[str]:
+    """The layers of the environment. A new environment gets the given layers, saved into its directory. An existing
+    environment keeps its layers, or its single state (no layers)."""
+
+    if os.path.exists(environment.layers_file):
+        return environment.layers
+    if not layers or os.path.exists(environment.tfstate_file):
+        return []
+
+    atomic_write(environment.layers_file, ''.join(f"{layer}\n" for layer in layers))
+
+    return list(layers)
+
+
+def get_run_layers(environment: Environment, action: str) -> list[Optional[str]]:
+    """The layers to run the action for, in order: destroy goes in reverse order. [None] for an environment with
+    one state."""
+
+    layers = environment.layers
+    if not layers:
+        return [None]
+
+    return layers[::-1] if action == 'destroy' else layers
+
+
+def get_layer_code_dir(layer: Optional[str], terraform_code_dir: str = conf.TERRAFORM_CODE_DIR,
+                       layers_dir: str = conf.TERRAFORM_LAYERS_DIR) -> str:
+
+    return terraform_code_dir if layer is None else os.path.join(layers_dir, layer)
+
+
+def get_upstream_state_vars(environment: Environment, layer: Optional[str]) -> list[str]:
+    """The '{upstream}_state_file=...' variables of a layer, with absolute paths."""
+
+    return [f'{upstream}_state_file={os.path.abspath(environment.layer_tfstate_file(upstream))}'
+            for upstream in conf.TERRAFORM_LAYER_UPSTREAMS.get(layer, [])]
+
+
+def get_referenced_variables(code_dir: str) -> set[str]:
+    """The variables used by the code. Every layer declares all the variables (the shared 'variables.tf'), so the
+    'variable' blocks (i.e. their validations) do not count."""
+
+    names = set()
+
+    for file_name in sorted(os.listdir(code_dir)):
+        if not file_name.endswith('.tf'):
+            continue
+        with open(os.path.join(code_dir, file_name), 'r') as file:
+            body = parse_body(file.read())
+        for block in body.blocks:
+            if block.type != 'variable':
+                names.update(VARIABLE_REFERENCE_PATTERN.findall(block.body))
+
+    return names
+
+
+def get_layer_commands(command_template: str, az_subscription: str, environment: str,
+                       layers: list[str]) -> list[str]:
+    """The commands of 'terraform_commands.txt' for the layers, in the given order."""
+
+    environment_dir = conf.LAYER_ENVIRONMENT_DIR.format(az_subscription=az_subscription, environment=environment)
+
+    return [
+        command_template.format(
+            layer=layer, environment_dir=environment_dir,
+            upstream_vars=''.join(conf.UPSTREAM_STATE_VAR_TEMPLATE.format(upstream=upstream,
+                                                                          environment_dir=environment_dir)
+                                  for upstream in conf.TERRAFORM_LAYER_UPSTREAMS.get(layer, []))
+        )
+        for layer in layers
+    ]
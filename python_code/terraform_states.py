@@ -0,0 +1,139 @@
+""" Helpers for the './terraform_states/{az_subscription}/{environment}/' directory layout.
+
+Every environment has its own directory, named after its Azure resource group, under the directory of the
+Azure subscription it is created in. An environment directory holds the 'terraform.tfvars' created by the scripts
+and the 'terraform.tfstate' created by terraform. An environment with layered states (see 'terraform_layers.py') has a
+'terraform_{layer}.tfstate' per layer instead, and the list of its layers in 'terraform_layers.txt'.
+"""
+
+import os
+import re
+from typing import Iterable, NamedTuple, Optional
+
+from python_code.tfstate_reader import read_state
+import python_code.config as conf
+
+TFVARS_FILENAME = os.path.basename(conf.TERRAFORM_TFVARS_FILE)
+TFSTATE_FILENAME = os.path.basename(conf.TERRAFORM_TFSTATE_FILE)
+LOG_FILENAME = os.path.basename(conf.TERRAFORM_LOG_FILE)
+LAYERS_FILENAME = os.path.basename(conf.TERRAFORM_LAYERS_FILE)
+LAYER_TFSTATE_FILENAME = os.path.basename(conf.TERRAFORM_LAYER_TFSTATE_FILE)
+LAYER_LOG_FILENAME = os.path.basename(conf.TERRAFORM_LAYER_LOG_FILE)
+
+TFVARS_LINE_PATTERN = re.compile(r'^\s*([A-Za-z_][\w-]*)\s*=\s*(.*?)\s*$')
+
+
+class Environment(NamedTuple):
+
+    az_subscription: str
+    name: str
+    path: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.az_subscription}/{self.name}"
+
+    @property
+    def tfvars_file(self) -> str:
+        return os.path.join(self.path, TFVARS_FILENAME)
+
+    @property
+    def tfstate_file(self) -> str:
+        return os.path.join(self.path, TFSTATE_FILENAME)
+
+    @property
+    def layers_file(self) -> str:
+        return os.path.join(self.path, LAYERS_FILENAME)
+
+    @property
+    def layers(self) -> list[str]:
+        """The layers of an environment with layered states, in apply order. Empty if it has one state."""
+
+        try:
+            with open(self.layers_file, 'r') as file:
+                return [line.strip() for line in file if line.strip()]
+        except FileNotFoundError:
+            return []
+
+    def layer_tfstate_file(self, layer: str) -> str:
+        return os.path.join(self.path, LAYER_TFSTATE_FILENAME.format(layer=layer))
+
+    @property
+    def tfstate_files(self) -> list[str]:
+        """The state file, or the state files of the layers."""
+
+        return [self.layer_tfstate_file(layer) for layer in self.layers] or [self.tfstate_file]
+
+    def log_file(self, action: str, layer: Optional[str] = None) -> str:
+        if layer is None:
+            return os.path.join(self.path, LOG_FILENAME.format(action=action))
+        return os.path.join(self.path, LAYER_LOG_FILENAME.format(action=action, layer=layer))
+
+
+def _sub_directories(directory: str) -> list[os.DirEntry]:
+
+    with os.scandir(directory) as entries:
+        return sorted((entry for entry in entries if entry.is_dir() and not entry.name.startswith('.')),
+                      key=lambda entry: entry.name)
+
+
+def discover_environments(states_dir: str = conf.TERRAFORM_STATES_DIR) -> list[Environment]:
+    """List every environment (directory with a tfvars file) under the states directory,
+    ordered by subscription and name."""
+
+    if not os.path.isdir(states_dir):
+        return []
+
+    return [
+        Environment(az_subscription.name, environment.name, environment.path)
+        for az_subscription in _sub_directories(states_dir)
+        for environment in _sub_directories(az_subscription.path)
+        if os.path.isfile(os.path.join(environment.path, TFVARS_FILENAME))
+    ]
+
+
+def read_environments_file(environments_file: str) -> list[str]:
+    """Read a file with one '{az_subscription}/{environment}' line per environment,
+    i.e. the list of changed environments saved by 'create_configurations_for_roster.py'."""
+
+    with open(environments_file, 'r') as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def parse_tfvars(tfvars_content: str) -> dict[str, str]:
+    """Parse the 'name = value' lines of a tfvars file into a dict. Quotes around string values are removed.
+    Only single line values are supported, which is all the template has."""
+
+    values = {}
+
+    for line in tfvars_content.splitlines():
+        match = TFVARS_LINE_PATTERN.match(line)
+        if not match:
+            continue
+        name, value = match.groups()
+        if len(value) >= 2 and value[0] == value[-1] == '"':
+            value = value[1:-1]
+        values[name] = value
+
+    return values
+
+
+def read_tfvars_values(tfvars_file: str) -> dict[str, str]:
+
+    with open(tfvars_file, 'r') as file:
+        return parse_tfvars(file.read())
+
+
+def read_tfstate_outputs(tfstate_file: str, output_names: Optional[Iterable[str]] = None) -> dict:
+    """The values of the outputs (all of them, or the ones named) in the state file. Empty if terraform did not create
+    the state (yet). The state file is streamed, the resources are not loaded."""
+
+    return read_state(tfstate_file, output_names).outputs
+
+
+def read_environment_outputs(environment: Environment, output_names: Optional[Iterable[str]] = None) -> dict:
+    """The outputs of the environment, from all of its state files."""
+
+    return {name: value
+            for tfstate_file in environment.tfstate_files
+            for name, value in read_tfstate_outputs(tfstate_file, output_names).items()}
@@ -0,0 +1,236 @@
+""" Streaming reader for 'terraform.tfstate' files.
+
+A state file holds the whole resource graph of an environment (workspace, cluster, SQL endpoint, catalog, grants..).
+Reports only need a few outputs and attributes of it, so instead of loading the whole document with 'json.load',
+the file is read in chunks and only the requested parts are decoded:
+    * the members of 'outputs' that are asked for,
+    * the elements of 'resources', one at a time, so at most one resource is in memory,
+    * everything else is skipped by scanning over it, without decoding it.
+"""
+
+import json
+import re
+from typing import Iterable, Iterator, NamedTuple, Optional, TextIO
+
+import python_code.config as conf
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = ' \t\r\n'
+_STRUCTURE_CHARS = re.compile(r'["\[\]{}]')
+_STRING_CHARS = re.compile(r'["\\]')
+_NUMBER_CONTINUATION_CHARS = '.eE+-'     # After a cut number, i.e. '-2.' of '-2.5e10'.
+
+
+class JsonStream:
+    """Pull parser over a JSON text file, reading it in chunks."""
+
+    def __init__(self, file: TextIO, chunk_size: int = conf.TFSTATE_READ_CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ''
+        self.position = 0
+        self.eof = False
+
+    def _read_more(self, size: Optional[int] = None) -> bool:
+        """Append the next chunk to the unconsumed part of the buffer. False at the end of the file."""
+
+        if self.eof:
+            return False
+
+        chunk = self.file.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+
+        self.buffer = self.buffer[self.position:] + chunk
+        self.position = 0
+
+        return True
+
+    def peek(self) -> str:
+        """The next non-whitespace character, without consuming it. Empty at the end of the file."""
+
+        while True:
+            while self.position < len(self.buffer) and self.buffer[self.position] in _WHITESPACE:
+                self.position += 1
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._read_more():
+                return ''
+
+    def expect(self, char: str) -> None:
+
+        if self.peek() != char:
+            raise ValueError(f"Invalid JSON: expected '{char}', got '{self.peek()}'.")
+        self.position += 1
+
+    def value(self) -> object:
+        """Decode the next value. A value ending at the end of the buffer may be cut (i.e. a number), so it is only
+        accepted at the end of the file; otherwise more is read (in growing chunks) and it is decoded again. So is a
+        number followed by a character that can continue it: '-2.5e10' cut after '-2.' decodes as -2, ending at '.'."""
+
+        size = self.chunk_size
+        self.peek()
+
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.position)
+                is_cut_number = end < len(self.buffer) and self.buffer[end] in _NUMBER_CONTINUATION_CHARS \
+                    and isinstance(value, (int, float)) and not isinstance(value, bool)
+                if (end < len(self.buffer) and not is_cut_number) or self.eof:
+                    self.position = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._read_more(size)
+            size *= 2
+
+    def skip(self) -> None:
+        """Consume the next value without decoding it."""
+
+        if self.peek() not in '{["':
+            self.value()
+            return
+
+        depth = 0
+        while True:
+            match = _STRUCTURE_CHARS.search(self.buffer, self.position)
+            if match is None:
+                self.position = len(self.buffer)
+                if not self._read_more():
+                    raise ValueError("Invalid JSON: unexpected end of the file.")
+                continue
+
+            self.position = match.end()
+            char = match.group()
+            if char == '"':
+                self._skip_string()
+            elif char in '{[':
+                depth += 1
+            else:
+                depth -= 1
+            if depth == 0:
+                return
+
+    def _skip_string(self) -> None:
+        """The opening quote is already consumed."""
+
+        while True:
+            match = _STRING_CHARS.search(self.buffer, self.position)
+            if match is None or match.end() == len(self.buffer) and match.group() == '\\':
+                self.position = match.start() if match else len(self.buffer)
+                if not self._read_more():
+                    raise ValueError("Invalid JSON: unexpected end of the file.")
+                continue
+
+            if match.group() == '\\':
+                self.position = match.end() + 1
+            else:
+                self.position = match.end()
+                return
+
+    def keys(self) -> Iterator[str]:
+        """The keys of the next object. The value of every key has to be consumed (value() or skip()) before
+        asking for the next key."""
+
+        self.expect('{')
+        if self.peek() == '}':
+            self.position += 1
+            return
+
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            separator = self.peek()
+            self.position += 1
+            if separator == '}':
+                return
+            if separator != ',':
+                raise ValueError(f"Invalid JSON: expected ',' or '}}', got '{separator}'.")
+
+    def elements(self) -> Iterator[object]:
+        """The elements of the next array, decoded one at a time."""
+
+        self.expect('[')
+        if self.peek() == ']':
+            self.position += 1
+            return
+
+        while True:
+            yield self.value()
+            separator = self.peek()
+            self.position += 1
+            if separator == ']':
+                return
+            if separator != ',':
+                raise ValueError(f"Invalid JSON: expected ',' or ']', got '{separator}'.")
+
+
+class StateReport(NamedTuple):
+
+    outputs: dict[str, object]              # The values of the requested outputs.
+    resource_count: int                     # Number of managed resource instances.
+    attributes: dict[str, list]             # 'type.attribute' -> its value in every instance of the resource type.
+
+
+def read_state(tfstate_file: str, output_names: Optional[Iterable[str]] = None,
+               resource_attributes: Iterable[str] = (),
+               chunk_size: int = conf.TFSTATE_READ_CHUNK_SIZE) -> StateReport:
+    """Read the requested outputs (all of them if None) and resource attributes ('type.attribute', i.e.
+    'databricks_cluster.cluster_id') of a state file. Empty if terraform did not create the state (yet)."""
+
+    output_names = None if output_names is None else set(output_names)
+    requested = {}
+    for resource_attribute in resource_attributes:
+        resource_type, attribute = resource_attribute.split('.', 1)
+        requested.setdefault(resource_type, []).append(attribute)
+
+    outputs = {}
+    resource_count = 0
+    attributes = {resource_attribute: [] for resource_attribute in resource_attributes}
+
+    try:
+        file = open(tfstate_file, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return StateReport(outputs, resource_count, attributes)
+
+    with file:
+        stream = JsonStream(file, chunk_size)
+        if stream.peek() == '':
+            return StateReport(outputs, resource_count, attributes)
+
+        for key in stream.keys():
+            if key == 'outputs':
+                for name in stream.keys():
+                    if output_names is None or name in output_names:
+                        outputs[name] = stream.value().get('value')
+                    else:
+                        stream.skip()
+            elif key == 'resources':
+                for resource in stream.elements():
+                    if resource.get('mode') != 'managed':
+                        continue
+                    instances = resource.get('instances', [])
+                    resource_count += len(instances)
+                    for attribute in requested.get(resource.get('type'), []):
+                        attributes[f"{resource['type']}.{attribute}"].extend(
+                            instance.get('attributes', {}).get(attribute) for instance in instances
+                        )
+            else:
+                stream.skip()
+
+    return StateReport(outputs, resource_count, attributes)
+
+
+def iter_resources(tfstate_file: str, chunk_size: int = conf.TFSTATE_READ_CHUNK_SIZE) -> Iterator[dict]:
+    """The resources of a state file, one at a time."""
+
+    with open(tfstate_file, 'r', encoding='utf-8') as file:
+        stream = JsonStream(file, chunk_size)
+        for key in stream.keys():
+            if key == 'resources':
+                yield from stream.elements()
+            else:
+                stream.skip()
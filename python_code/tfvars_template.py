@@ -0,0 +1,81 @@
+""" Compiled version of the tfvars template.
+
+The template is parsed once into literal text and placeholder (TemplateTag) segments.
+Rendering a configuration is a single join over the segments, instead of one full copy of the template per tag.
+Compiled templates are cached by file path and modification time, so the template file is parsed only once
+however many environments are rendered.
+"""
+
+import os
+import re
+from functools import lru_cache
+
+from python_code.constants import TemplateTag, Message
+
+TAG_PATTERN = re.compile(r'<[A-Z][A-Z0-9_]*>')
+KNOWN_TAGS = frozenset(tag.value for tag in TemplateTag)
+
+_template_cache = {}
+
+
+class TemplateError(ValueError):
+    """The template has an unknown tag, or the configuration has no value for a tag of the template."""
+
+
+class CompiledTemplate:
+    """Template text split up on the tags. The tags are at the odd positions of the segments."""
+
+    __slots__ = ('segments', 'tags')
+
+    def __init__(self, template: str):
+
+        segments = TAG_PATTERN.split(template)
+        tags = TAG_PATTERN.findall(template)
+
+        unknown_tags = sorted(set(tags) - KNOWN_TAGS)
+        if unknown_tags:
+            raise TemplateError(Message.TEMPLATE_UNKNOWN_TAGS.value.format(tags=', '.join(unknown_tags)))
+
+        # Interleave: literal, tag, literal, tag, ..., literal
+        self.segments = [None] * (len(segments) + len(tags))
+        self.segments[::2] = segments
+        self.segments[1::2] = tags
+        self.tags = tuple(dict.fromkeys(tags))
+
+    def render(self, config: dict[str, str]) -> str:
+        """Replace the tags with their values from the config in one pass. Fails before rendering anything
+        if any value is missing."""
+
+        missing_tags = [tag for tag in self.tags if tag not in config]
+        if missing_tags:
+            raise TemplateError(Message.TEMPLATE_MISSING_VALUES.value.format(tags=', '.join(missing_tags)))
+
+        parts = self.segments.copy()
+        parts[1::2] = [config[tag] for tag in self.segments[1::2]]
+
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=8)
+def compile_template(template: str) -> CompiledTemplate:
+
+    return CompiledTemplate(template)
+
+
+def get_compiled_template(template_file: str) -> CompiledTemplate:
+    """Compile the template file, or return the cached compiled template if the file did not change since."""
+
+    path = os.path.abspath(template_file)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _template_cache.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with open(path, 'r') as file:
+        compiled = compile_template(file.read())
+
+    _template_cache[path] = (version, compiled)
+
+    return compiled
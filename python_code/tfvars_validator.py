@@ -0,0 +1,119 @@
+""" Offline validation of rendered tfvars against the variable declarations in './terraform_code/variables.tf'.
+
+Catches unknown variables, missing required values, wrong primitive types (i.e. a non-boolean admin flag) and values
+outside the allowed ones (the 'contains([...], var.name)' validation conditions) or not matching a pattern (the
+'can(regex("...", var.name))' conditions) before anything is written, and without running terraform.
+"""
+
+import json
+import os
+import re
+from typing import NamedTuple, Optional
+
+from python_code.constants import Message
+from python_code.hcl import parse_body, parse_string_list
+from python_code.terraform_states import parse_tfvars
+import python_code.config as conf
+
+_specs_cache = {}
+
+
+class VariableSpec(NamedTuple):
+
+    name: str
+    type: str                                       # The type expression, i.e.: 'string', 'bool', 'list(string)'.
+    required: bool                                  # No default value.
+    allowed_values: Optional[tuple[str, ...]]       # From a 'contains([...], var.name)' validation condition.
+    pattern: Optional[str] = None                   # From a 'can(regex("...", var.name))' validation condition.
+
+
+def parse_variables(variables_tf: str) -> dict[str, VariableSpec]:
+
+    specs = {}
+
+    for block in parse_body(variables_tf).blocks:
+        if block.type != 'variable' or not block.labels:
+            continue
+
+        name = block.labels[0]
+        body = parse_body(block.body, comments_removed=True)
+
+        allowed_values = None
+        pattern = None
+        for validation in body.blocks:
+            if validation.type != 'validation':
+                continue
+            condition = parse_body(validation.body, comments_removed=True).attributes.get('condition', '')
+            match = re.search(r'contains\(\s*(\[.*?])\s*,\s*var\.' + re.escape(name) + r'\s*\)', condition, re.S)
+            if match:
+                allowed_values = tuple(parse_string_list(match.group(1)))
+            match = re.search(r'can\(\s*regex\(\s*("(?:[^"\\]|\\.)*")\s*,\s*var\.' + re.escape(name) + r'\s*\)\s*\)',
+                              condition)
+            if match:
+                pattern = json.loads(match.group(1))
+
+        specs[name] = VariableSpec(name, body.attributes.get('type', 'any'), 'default' not in body.attributes,
+                                   allowed_values, pattern)
+
+    return specs
+
+
+def get_variable_specs(variables_file: str = conf.TERRAFORM_VARIABLES_FILE) -> dict[str, VariableSpec]:
+    """Parse the variables file, or return the cached result if the file did not change since."""
+
+    path = os.path.abspath(variables_file)
+    stat = os.stat(path)
+    version = (stat.st_mtime_ns, stat.st_size)
+
+    cached = _specs_cache.get(path)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with open(path, 'r') as file:
+        specs = parse_variables(file.read())
+
+    _specs_cache[path] = (version, specs)
+
+    return specs
+
+
+def _is_number(value: str) -> bool:
+
+    try:
+        float(value)
+    except ValueError:
+        return False
+
+    return True
+
+
+def validate_tfvars(tfvars_content: str, variable_specs: dict[str, VariableSpec]) -> list[str]:
+    """All the problems of the tfvars content, as messages. Empty if it is valid."""
+
+    values = parse_tfvars(tfvars_content)
+    errors = []
+
+    for name in values:
+        if name not in variable_specs:
+            errors.append(Message.UNKNOWN_VARIABLE.value.format(name=name))
+
+    for spec in variable_specs.values():
+        value = values.get(spec.name)
+
+        if value is None:
+            if spec.required:
+                errors.append(Message.MISSING_VARIABLE.value.format(name=spec.name))
+            continue
+
+        if (spec.type == 'bool' and value not in ('true', 'false')) or \
+                (spec.type == 'number' and not _is_number(value)):
+            errors.append(Message.WRONG_VARIABLE_TYPE.value.format(name=spec.name, type=spec.type, value=value))
+        elif spec.allowed_values is not None and value not in spec.allowed_values:
+            errors.append(Message.NOT_ALLOWED_VARIABLE_VALUE.value.format(
+                name=spec.name, allowed=', '.join(f"'{allowed}'" for allowed in spec.allowed_values), value=value
+            ))
+        elif spec.pattern is not None and not re.search(spec.pattern, value):
+            errors.append(Message.NOT_MATCHING_VARIABLE_VALUE.value.format(name=spec.name, pattern=spec.pattern,
+                                                                           value=value))
+
+    return errors
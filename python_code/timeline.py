@@ -0,0 +1,274 @@
+""" Timeline of the terraform runs: how long every resource, and every stage of the scripts, took.
+
+With timings, 'run_terraform.py' runs terraform with '-json', so terraform outputs one JSON event per line
+('apply_start', 'apply_complete', 'refresh_complete', 'change_summary', 'diagnostic'..). The events are parsed as they
+arrive: their messages go to the log file of the environment (so it reads like the usual output), and the start, end
+and duration of every create / update / delete / read / refresh of a resource are recorded. The stages of the script
+itself (prefetching the lookups, 'terraform init', waiting for the lock and the drift refresh limit, hashing the
+inputs, preparing the working copy, every terraform attempt) are timed too.
+
+The records are appended as JSON lines to './terraform_states/timings.jsonl' ('config.TERRAFORM_TIMINGS_FILE'), and
+rolled up for the fleet: count, p50, p95 and max of the durations by resource type and operation, and by stage.
+
+>  python3 ./python_code/timeline.py rollup --action apply
+
+A recorded event log ('terraform apply -json > events.jsonl') can be replayed into timing records:
+
+>  python3 ./python_code/timeline.py replay ./events.jsonl --environment sub/INT-DP-DEV-JohnDoe-Personal
+"""
+
+import argparse
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+import python_code.config as conf
+
+COMPLETE = 'complete'
+ERRORED = 'errored'
+INTERRUPTED = 'interrupted'         # Started, but terraform stopped before it completed or failed.
+
+START_EVENTS = {'apply_start', 'refresh_start'}
+END_EVENTS = {'apply_complete': COMPLETE, 'apply_errored': ERRORED, 'refresh_complete': COMPLETE}
+
+ROLLUP_COLUMNS = ['kind', 'category', 'operation', 'count', 'p50', 'p95', 'max']
+
+
+class TimingRecord(NamedTuple):
+
+    kind: str                           # 'resource' or 'stage'.
+    name: str                           # Address of the resource, or name of the stage.
+    category: str                       # Resource type, or name of the stage: what the rollup groups by.
+    operation: str                      # 'create', 'update', 'delete', 'read', 'refresh', or '' for a stage.
+    start: str                          # ISO timestamps.
+    end: str
+    seconds: float
+    status: str                         # 'complete', 'errored' or 'interrupted'.
+    environment: Optional[str] = None   # Key of the environment, None for a stage of the whole batch.
+    action: Optional[str] = None        # plan / apply / destroy
+    layer: Optional[str] = None
+    attempt: Optional[int] = None
+
+
+class RollupRow(NamedTuple):
+
+    kind: str
+    category: str
+    operation: str
+    count: int
+    p50: float
+    p95: float
+    max: float
+
+
+def format_event(event: dict) -> str:
+    """The text of the event for the log file: its message, with the detail of a diagnostic (an error or warning)."""
+
+    detail = (event.get('diagnostic') or {}).get('detail')
+
+    return event['@message'] + (f"\n\n{detail}\n" if detail else '')
+
+
+class EventTimeline:
+    """Parses the '-json' output of one terraform run, line by line. 'context' (environment, action, layer, attempt)
+    is added to the records."""
+
+    def __init__(self, **context):
+        self.context = context
+        self.started = {}
+        self.records = []
+        self.last_timestamp = None
+
+    def feed(self, line: str) -> str:
+        """Records the timing an event completes. Returns the text to log: the message of the event, or the line
+        itself if it is not an event (i.e. a crash of terraform, or a version without '-json')."""
+
+        try:
+            event = json.loads(line)
+        except ValueError:
+            return line
+        if not isinstance(event, dict) or '@message' not in event:
+            return line
+
+        self._add(event)
+        return format_event(event) + '\n'
+
+    def _add(self, event: dict) -> None:
+
+        try:
+            timestamp = datetime.fromisoformat(event['@timestamp'])
+        except (KeyError, TypeError, ValueError):
+            return
+        self.last_timestamp = timestamp
+
+        hook = event.get('hook') or {}
+        resource = hook.get('resource') or {}
+        event_type = event.get('type') or ''
+        if 'addr' not in resource:
+            return
+
+        is_refresh = event_type.startswith('refresh_')
+        key = (resource['addr'], is_refresh)
+
+        if event_type in START_EVENTS:
+            self.started[key] = (timestamp, 'refresh' if is_refresh else hook.get('action', ''), resource)
+        elif event_type in END_EVENTS:
+            start, operation, _ = self.started.pop(key, (None, 'refresh' if is_refresh else hook.get('action', ''),
+                                                         resource))
+            if start is None:
+                start = timestamp - timedelta(seconds=hook.get('elapsed_seconds') or 0)
+            self._record(resource, operation, start, timestamp, END_EVENTS[event_type])
+
+    def _record(self, resource: dict, operation: str, start: datetime, end: datetime, status: str) -> None:
+
+        self.records.append(TimingRecord(
+            'resource', resource['addr'], resource.get('resource_type', ''), operation, start.isoformat(),
+            end.isoformat(), round((end - start).total_seconds(), 3), status, **self.context
+        ))
+
+    def close(self) -> list[TimingRecord]:
+        """The records of the run, with the resources still in progress as interrupted at the last event."""
+
+        for start, operation, resource in self.started.values():
+            self._record(resource, operation, start, self.last_timestamp, INTERRUPTED)
+        self.started = {}
+
+        return self.records
+
+
+def replay(lines: Iterable[str], **context) -> tuple[list[TimingRecord], str]:
+    """The timing records and the log text of a recorded event log."""
+
+    timeline = EventTimeline(**context)
+    log = ''.join(timeline.feed(line) for line in lines)
+
+    return timeline.close(), log
+
+
+class TimingRecorder:
+    """Appends timing records to a JSON lines file, from any thread. Without a file nothing is recorded."""
+
+    def __init__(self, timings_file: Optional[str] = None):
+        self.timings_file = timings_file
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.timings_file is not None
+
+    def write(self, records: list[TimingRecord]) -> None:
+
+        if not self.enabled or not records:
+            return
+
+        text = ''.join(json.dumps(record._asdict()) + '\n' for record in records)
+        with self.lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.timings_file)), exist_ok=True)
+            with open(self.timings_file, 'a') as file:
+                file.write(text)
+
+    @contextlib.contextmanager
+    def stage(self, name: str, **context) -> Iterator[dict]:
+        """Times the block as a stage; 'context' (environment, action, layer, attempt) is added to the record.
+        The stage errored if the block raises, or sets the 'status' of the dict it gets to 'errored'."""
+
+        start = datetime.now(timezone.utc)
+        counter = time.perf_counter()
+        outcome = {'status': ERRORED}
+
+        try:
+            outcome['status'] = COMPLETE
+            yield outcome
+        except BaseException:
+            outcome['status'] = ERRORED
+            raise
+        finally:
+            seconds = time.perf_counter() - counter
+            self.write([TimingRecord('stage', name, name, '', start.isoformat(),
+                                     (start + timedelta(seconds=seconds)).isoformat(), round(seconds, 3),
+                                     outcome['status'], **context)])
+
+
+def read_timings(timings_file: str = conf.TERRAFORM_TIMINGS_FILE) -> list[TimingRecord]:
+    """The records of the file; a line cut by a crash is skipped."""
+
+    records = []
+    with open(timings_file, 'r') as file:
+        for line in file:
+            try:
+                records.append(TimingRecord(**json.loads(line)))
+            except (ValueError, TypeError):
+                continue
+
+    return records
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    """Nearest-rank percentile of sorted values, i.e. fraction 0.95 for p95."""
+
+    return sorted_values[max(math.ceil(fraction * len(sorted_values)) - 1, 0)]
+
+
+def rollup(records: list[TimingRecord], action: Optional[str] = None) -> list[RollupRow]:
+    """Durations of the completed resources and stages, by kind, category and operation."""
+
+    groups = {}
+    for record in records:
+        if record.status == COMPLETE and (action is None or record.action == action):
+            groups.setdefault((record.kind, record.category, record.operation), []).append(record.seconds)
+
+    rows = []
+    for (kind, category, operation), durations in sorted(groups.items()):
+        durations.sort()
+        rows.append(RollupRow(kind, category, operation, len(durations), percentile(durations, 0.5),
+                              percentile(durations, 0.95), durations[-1]))
+
+    return rows
+
+
+def parse_arguments() -> argparse.Namespace:
+
+    parser = argparse.ArgumentParser(description="Timings of the terraform runs of the environments.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rollup_parser = subparsers.add_parser("rollup", help="p50 / p95 of the durations by resource type and stage.")
+    rollup_parser.add_argument("--timings-file", default=conf.TERRAFORM_TIMINGS_FILE)
+    rollup_parser.add_argument("--action", choices=conf.TERRAFORM_ACTIONS, help="Only the runs of this action.")
+    rollup_parser.add_argument("--json", action="store_true", help="Output JSON lines instead of a table.")
+
+    replay_parser = subparsers.add_parser("replay", help="Timing records of a recorded 'terraform -json' output.")
+    replay_parser.add_argument("events_file")
+    replay_parser.add_argument("--environment", help="Key of the environment, '{az_subscription}/{environment}'.")
+    replay_parser.add_argument("--action", choices=conf.TERRAFORM_ACTIONS)
+    replay_parser.add_argument("--record", action="store_true",
+                               help=f"Append the records to '{conf.TERRAFORM_TIMINGS_FILE}' instead of printing them.")
+
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+
+    args = parse_arguments()
+
+    if args.command == "rollup":
+        rollup_rows = rollup(read_timings(args.timings_file), args.action)
+        if args.json:
+            for row in rollup_rows:
+                print(json.dumps(row._asdict()))
+        else:
+            print('\t'.join(ROLLUP_COLUMNS))
+            for row in rollup_rows:
+                print('\t'.join(str(value) for value in row))
+    else:
+        with open(args.events_file, 'r') as events_file:
+            replayed_records, _ = replay(events_file, environment=args.environment, action=args.action)
+        if args.record:
+            TimingRecorder(conf.TERRAFORM_TIMINGS_FILE).write(replayed_records)
+        else:
+            for replayed_record in replayed_records:
+                print(json.dumps(replayed_record._asdict()))
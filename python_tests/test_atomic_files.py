@@ -0,0 +1,118 @@
+import unittest
+import os
+import json
+import shutil, tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import python_code.atomic_files as code
+from python_code.create_configuration_for_user import get_tfvars_hash, save_tfvars
+import python_code.config as conf
+
+
+def save_many_times(tfvars_file: str, writer: int, times: int) -> None:
+    """Runs in a worker process: rewrites the tfvars of the environment, every time with another content."""
+
+    for number in range(times):
+        with code.environment_lock(os.path.dirname(tfvars_file)):
+            save_tfvars(f'email = "writer{writer}-{number}@foo.bar"\n' * 100, tfvars_file, incremental=True)
+
+
+class AtomicFilesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.environment_dir = os.path.join(self.test_dir, "sub", "Env")
+        os.makedirs(self.environment_dir)
+        self.file_a = os.path.join(self.environment_dir, "a.txt")
+        self.file_b = os.path.join(self.environment_dir, "b.txt")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def read(self, file_name):
+        with open(file_name, 'r') as file:
+            return file.read()
+
+
+class AtomicWrite(AtomicFilesTestCase):
+
+    def test_write_and_replace(self):
+        code.atomic_write(self.file_a, "old")
+        code.atomic_write(self.file_a, "new")
+
+        self.assertEqual(self.read(self.file_a), "new")
+        self.assertEqual(os.listdir(self.environment_dir), ["a.txt"])
+
+    def test_journaled_write(self):
+        code.journaled_write(self.environment_dir, {self.file_a: "A", self.file_b: "B"})
+
+        self.assertEqual((self.read(self.file_a), self.read(self.file_b)), ("A", "B"))
+        self.assertEqual(sorted(os.listdir(self.environment_dir)), ["a.txt", "b.txt"])
+
+
+class Recover(AtomicFilesTestCase):
+
+    def test_finish_journaled_write(self):
+        """A process dying after writing the journal should have its writes finished by the next lock holder."""
+
+        code.atomic_write(self.file_a, "old A")
+        code.atomic_write(self.file_b, "old B")
+        renames = [(code._write_temporary(self.file_a, "new A"), self.file_a),
+                   (code._write_temporary(self.file_b, "new B"), self.file_b)]
+        os.replace(*renames[0])
+        code.atomic_write(code.get_journal_file(self.environment_dir), json.dumps(renames))
+
+        with code.environment_lock(self.environment_dir):
+            self.assertEqual((self.read(self.file_a), self.read(self.file_b)), ("new A", "new B"))
+
+        self.assertEqual(sorted(os.listdir(self.environment_dir)), ["a.txt", "b.txt"])
+
+    def test_roll_back_without_journal(self):
+        """A process dying before writing the journal should leave the files unchanged."""
+
+        code.atomic_write(self.file_a, "old A")
+        code._write_temporary(self.file_a, "new A")
+
+        with code.environment_lock(self.environment_dir):
+            self.assertEqual(self.read(self.file_a), "old A")
+
+        self.assertEqual(os.listdir(self.environment_dir), ["a.txt"])
+
+
+class EnvironmentLock(AtomicFilesTestCase):
+
+    def test_lock_file_next_to_the_directory(self):
+        new_environment_dir = os.path.join(self.test_dir, "sub", "New")
+
+        with code.environment_lock(new_environment_dir):
+            pass
+
+        self.assertTrue(os.path.isfile(os.path.join(self.test_dir, "sub", ".New.lock")))
+        self.assertFalse(os.path.exists(new_environment_dir))
+
+    def test_timeout(self):
+        with code.environment_lock(self.environment_dir):
+            with self.assertRaises(TimeoutError):
+                with code.environment_lock(self.environment_dir, timeout=0.2):
+                    pass
+
+        with code.environment_lock(self.environment_dir, timeout=0.2):
+            pass
+
+    def test_concurrent_writers(self):
+        """The tfvars and its hash written by concurrent processes should always belong together."""
+
+        tfvars_file = os.path.join(self.environment_dir, "terraform.tfvars")
+
+        with ProcessPoolExecutor(max_workers=4) as executor:
+            for future in [executor.submit(save_many_times, tfvars_file, writer, 20) for writer in range(4)]:
+                future.result()
+
+        self.assertEqual(self.read(tfvars_file + conf.TERRAFORM_TFVARS_HASH_SUFFIX),
+                         get_tfvars_hash(self.read(tfvars_file)))
+        self.assertEqual(sorted(os.listdir(self.environment_dir)),
+                         ["terraform.tfvars", "terraform.tfvars" + conf.TERRAFORM_TFVARS_HASH_SUFFIX])
+
+
+if __name__ == '__main__':
+    unittest.main()
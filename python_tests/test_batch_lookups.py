@@ -0,0 +1,133 @@
+import unittest
+import os
+import shutil, tempfile
+from unittest.mock import patch
+
+import python_code.batch_lookups as code
+from python_code.run_terraform import get_terraform_command
+from python_code.terraform_states import Environment
+
+
+class CountingResolver(code.StaticLookupResolver):
+    """Counts the lookups, like the round-trips to the APIs."""
+
+    def __init__(self, values):
+        super().__init__(values)
+        self.calls = []
+
+    def current_user(self):
+        self.calls.append('current_user')
+        return super().current_user()
+
+    def spark_version(self):
+        self.calls.append('spark_version')
+        return super().spark_version()
+
+    def node_type_id(self, az_region):
+        self.calls.append(f'node_type_id {az_region}')
+        return super().node_type_id(az_region)
+
+
+class StaticLookupResolver(unittest.TestCase):
+
+    def test_region_overrides(self):
+        resolver = code.StaticLookupResolver({
+            "current_user": "admin@foo.bar", "node_type_id": "Standard_DS3_v2",
+            "regions": {"northeurope": {"node_type_id": "Standard_F4"}}
+        })
+
+        self.assertEqual(resolver.current_user(), "admin@foo.bar")
+        self.assertIsNone(resolver.spark_version())
+        self.assertEqual(resolver.node_type_id("westeurope"), "Standard_DS3_v2")
+        self.assertEqual(resolver.node_type_id("northeurope"), "Standard_F4")
+
+
+class CliLookupResolver(unittest.TestCase):
+
+    def test_latest_lts_spark_version(self):
+        versions = {"versions": [
+            {"key": "12.2.x-scala2.12", "name": "12.2 LTS (includes Apache Spark 3.3.2, Scala 2.12)"},
+            {"key": "13.3.x-scala2.12", "name": "13.3 LTS (includes Apache Spark 3.4.1, Scala 2.12)"},
+            {"key": "13.3.x-cpu-ml-scala2.12", "name": "13.3 LTS ML (includes Apache Spark 3.4.1, Scala 2.12)"},
+            {"key": "14.0.x-scala2.12", "name": "14.0 (includes Apache Spark 3.5.0, Scala 2.12)"}
+        ]}
+
+        with patch('python_code.batch_lookups._run_json', return_value=versions):
+            self.assertEqual(code.CliLookupResolver().spark_version(), "13.3.x-scala2.12")
+
+    def test_default_scala_version(self):
+        """Of the Scala versions of the latest LTS, the default one of the data source should be chosen."""
+
+        versions = {"versions": [
+            {"key": "15.4.x-scala2.12", "name": "15.4 LTS (includes Apache Spark 3.5.0, Scala 2.12)"},
+            {"key": "16.4.x-scala2.13", "name": "16.4 LTS (includes Apache Spark 3.5.2, Scala 2.13)"},
+            {"key": "16.4.x-scala2.12", "name": "16.4 LTS (includes Apache Spark 3.5.2, Scala 2.12)"}
+        ]}
+
+        with patch('python_code.batch_lookups._run_json', return_value=versions):
+            self.assertEqual(code.CliLookupResolver().spark_version(), "16.4.x-scala2.12")
+
+    def test_cli_not_available(self):
+        with patch('python_code.batch_lookups._run_json', return_value=None):
+            self.assertIsNone(code.CliLookupResolver().current_user())
+            self.assertIsNone(code.CliLookupResolver().spark_version())
+
+
+class PrefetchLookups(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.prefetch_dir = os.path.join(self.test_dir, "prefetch")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def create_environment(self, name, az_region):
+        path = os.path.join(self.test_dir, "sub", name)
+        os.makedirs(path)
+        with open(os.path.join(path, "terraform.tfvars"), 'w') as file:
+            file.write(f'azure-region = "{az_region}"\n')
+        return Environment("sub", name, path)
+
+    def test_once_per_batch(self):
+        """The lookups should be resolved once for the batch, the node type once per region."""
+
+        environments = [self.create_environment(f"Env{number}", region)
+                        for number, region in enumerate(["westeurope", "northeurope", "westeurope", "westeurope"])]
+        resolver = CountingResolver({
+            "current_user": "admin@foo.bar", "spark_version": "13.3.x-scala2.12",
+            "regions": {"westeurope": {"node_type_id": "Standard_DS3_v2"}}
+        })
+
+        lookups_files = code.prefetch_lookups(environments, resolver, self.prefetch_dir)
+
+        self.assertEqual(sorted(resolver.calls), ['current_user', 'node_type_id northeurope',
+                                                  'node_type_id westeurope', 'spark_version'])
+        self.assertEqual(sorted(lookups_files), [environment.key for environment in environments])
+        self.assertEqual(len(os.listdir(self.prefetch_dir)), 2)
+        self.assertEqual(lookups_files["sub/Env0"], lookups_files["sub/Env2"])
+
+        with open(lookups_files["sub/Env0"], 'r') as file:
+            self.assertEqual(file.read(), 'prefetched_current_user = "admin@foo.bar"\n'
+                                          'prefetched_node_type_id = "Standard_DS3_v2"\n'
+                                          'prefetched_spark_version = "13.3.x-scala2.12"\n')
+        with open(lookups_files["sub/Env1"], 'r') as file:
+            self.assertNotIn("prefetched_node_type_id", file.read())
+
+    def test_nothing_resolved(self):
+        environments = [self.create_environment("Env", "westeurope")]
+
+        self.assertEqual(code.prefetch_lookups(environments, code.LookupResolver(), self.prefetch_dir), {})
+
+    def test_passed_to_terraform(self):
+        environment = Environment("sub", "Env", "/states/sub/Env")
+
+        command = get_terraform_command("plan", environment, "/code", ("/prefetch/abc.tfvars",))
+
+        self.assertEqual(command[5:7], ['-var-file=/states/sub/Env/terraform.tfvars',
+                                        '-state=/states/sub/Env/terraform.tfstate'])
+        self.assertIn('-var-file=/prefetch/abc.tfvars', command)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import os
+import shutil, tempfile
+
+import python_benchmarks.benchmark_configuration_pipeline as code
+
+
+class GenerateEmails(unittest.TestCase):
+
+    def test_valid_and_unique(self):
+        emails = code.generate_emails(30)
+
+        self.assertEqual(len(set(emails)), 30)
+        self.assertTrue(all(code.validate_email(email) for email in emails))
+
+
+class BenchmarkSize(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.test_dir, "terraform.tfvars.template")
+        with open(self.template_file, 'w') as file:
+            file.write('email = "<EMAIL>"\nusername = "<USERNAME>"')
+        self.variables_file = os.path.join(self.test_dir, "variables.tf")
+        with open(self.variables_file, 'w') as file:
+            file.write('variable "email" {\n  type = string\n}\nvariable "username" {\n  type = string\n}\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_stages(self):
+        """Every stage should be measured for the given size."""
+
+        results = code.benchmark_size(10, self.test_dir, self.template_file, self.variables_file)
+
+        self.assertEqual([result.stage for result in results], [
+            'validate_email', 'get_proposed_username', 'get_proposed_usernames', 'render_template', 'validate_tfvars',
+            'save_tfvars', 'save_commands',
+            'roster_end_to_end'
+        ])
+        self.assertTrue(all(result.size == 10 and result.ops_per_sec > 0 for result in results))
+        self.assertEqual([result.stage for result in results if result.parent_process_only], ['roster_end_to_end'])
+
+
+class Baselines(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.baselines_file = os.path.join(self.test_dir, "baselines.json")
+        self.result = code.StageResult('render_template', 1000, 0.01, 1000)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_save_and_load(self):
+        code.save_baselines([self.result], self.baselines_file)
+
+        self.assertEqual(code.load_baselines(self.baselines_file),
+                         {'render_template/1000': {'ops_per_sec': 100000.0, 'peak_memory_bytes': 1000}})
+
+    def test_regressions(self):
+        """Results within the tolerance should pass; slower or more memory hungry results should be reported."""
+
+        baselines = {'render_template/1000': {'ops_per_sec': 100000.0, 'peak_memory_bytes': 1000}}
+
+        self.assertEqual(code.find_regressions([self.result._replace(seconds=0.012)], baselines, 0.3), [])
+        self.assertEqual(len(code.find_regressions([self.result._replace(seconds=0.02)], baselines, 0.3)), 1)
+        self.assertEqual(len(code.find_regressions([self.result._replace(peak_memory_bytes=2000)], baselines, 0.3)), 1)
+        self.assertEqual(code.find_regressions([self.result._replace(size=10)], baselines, 0.3), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+import unittest
+import asyncio
+import os
+import json
+import shutil, tempfile
+
+import python_code.config_service as code
+from python_code.name_index import NameIndex
+
+ADMIN_CONFIG = {
+    '<AZ_SUBSCRIPTION_ID>': 'sub1',
+    '<DBX_ACCOUNT_ID>': 'dbx_account_id',
+    '<DBX_METASTORE_ID>': 'dbx_metastore_id'
+}
+
+
+async def request(port, method, path, body=None, reader_writer=None):
+    """Send one HTTP request (on a new connection, or on the given keep-alive one) and return the status and the
+    decoded JSON body."""
+
+    reader, writer = reader_writer or await asyncio.open_connection('127.0.0.1', port)
+    data = b'' if body is None else (body if isinstance(body, bytes) else json.dumps(body).encode('utf-8'))
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n"
+                 f"{'' if reader_writer else 'Connection: close' + chr(13) + chr(10)}\r\n".encode('latin-1') + data)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while (line := await reader.readline()) != b'\r\n':
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    payload = json.loads(await reader.readexactly(int(headers['content-length'])))
+
+    if not reader_writer:
+        writer.close()
+    return status, payload
+
+
+class ConfigServiceTestCase(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.states_dir = os.path.join(self.test_dir, "terraform_states")
+        self.admin_config_file = os.path.join(self.test_dir, "admin_config.json")
+        self.write_admin_config(ADMIN_CONFIG)
+
+        self.service = code.ConfigService(
+            states_dir=self.states_dir,
+            admin_config_file=self.admin_config_file,
+            subscriptions_file=os.path.join(self.test_dir, "subscriptions.json"),
+            tfvars_file_pattern=os.path.join(self.states_dir, "{az_subscription}", "{environment}", "terraform.tfvars"),
+            commands_file_pattern=os.path.join(self.states_dir, "{az_subscription}", "{environment}",
+                                               "terraform_commands.txt"),
+            inventory_db_file=os.path.join(self.states_dir, "inventory.sqlite")
+        )
+        self.server = await self.service.start('127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.service.executor.shutdown()
+        shutil.rmtree(self.test_dir)
+
+    def write_admin_config(self, admin_config):
+        with open(self.admin_config_file, 'w') as file:
+            json.dump(admin_config, file)
+
+    def create(self, body):
+        return request(self.port, "POST", "/configurations", body)
+
+
+class CreateConfiguration(ConfigServiceTestCase):
+
+    async def test_created(self):
+        status, payload = await self.create({"email": "john.doe@foo.bar", "compute_profile": "heavy"})
+
+        self.assertEqual(status, 201)
+        self.assertEqual((payload["az_subscription"], payload["environment"]), ("sub1", "INT-DP-DEV-JohnDoe-Personal"))
+        with open(payload["tfvars_file"], 'r') as file:
+            tfvars = file.read()
+        self.assertIn('compute_profile         = "heavy"', tfvars)
+        self.assertTrue(payload["terraform_commands"][0].startswith('terraform -chdir="./terraform_code/layers/infra"'))
+
+        status, payload = await self.create({"email": "john.doe@foo.bar"})
+        self.assertEqual(status, 409)
+
+    async def test_invalid_requests(self):
+        self.assertEqual((await self.create({"email": "john.doe"}))[0], 400)
+        self.assertEqual((await self.create({"email": "a@b.cd", "compute_profile": "huge"}))[0], 400)
+        self.assertEqual((await self.create(b'{"email": '))[0], 400)
+        self.assertEqual((await self.create(["a@b.cd"]))[0], 400)
+        self.assertEqual((await request(self.port, "GET", "/configurations"))[0], 405)
+        self.assertEqual((await request(self.port, "GET", "/missing"))[0], 404)
+
+    async def test_negative_content_length(self):
+        reader, writer = await asyncio.open_connection('127.0.0.1', self.port)
+        writer.write(b"POST /configurations HTTP/1.1\r\nHost: localhost\r\nContent-Length: -1\r\n\r\n")
+        await writer.drain()
+
+        self.assertEqual((await reader.readline()).split()[1], b"400")
+        writer.close()
+
+    async def test_keep_alive(self):
+        connection = await asyncio.open_connection('127.0.0.1', self.port)
+
+        self.assertEqual(await request(self.port, "GET", "/health", reader_writer=connection), (200, {"status": "ok"}))
+        status, _ = await request(self.port, "POST", "/configurations", {"email": "a@b.cd"}, reader_writer=connection)
+        self.assertEqual(status, 201)
+
+        connection[1].close()
+
+    async def test_concurrent_requests(self):
+        """Hundreds of concurrent requests, many with the same proposed username, should all get their own names."""
+
+        emails = [f"john.doe@company{number}.com" for number in range(100)] + \
+                 [f"user.{number}@foo.bar" for number in range(200)]
+
+        results = await asyncio.gather(*(self.create({"email": email}) for email in emails))
+
+        self.assertEqual([status for status, _ in results], [201] * len(emails))
+        environments = [payload["environment"] for _, payload in results]
+        self.assertEqual(len(set(environments)), len(emails))
+        self.assertEqual(len(os.listdir(os.path.join(self.states_dir, "sub1"))), 2 * len(emails))   # And the locks.
+
+    async def test_concurrent_requests_of_the_same_user(self):
+        results = await asyncio.gather(*(self.create({"email": "john.doe@foo.bar"}) for _ in range(10)))
+
+        self.assertEqual(sorted(status for status, _ in results), [201] + [409] * 9)
+
+
+class Invalidation(ConfigServiceTestCase):
+
+    async def test_admin_config_changed(self):
+        await self.create({"email": "first@foo.bar"})
+        self.write_admin_config(ADMIN_CONFIG | {'<AZ_SUBSCRIPTION_ID>': 'sub2-with-another-length'})
+
+        status, payload = await self.create({"email": "second@foo.bar"})
+
+        self.assertEqual((status, payload["az_subscription"]), (201, "sub2-with-another-length"))
+
+    async def test_environment_added_by_another_process(self):
+        await self.create({"email": "first@foo.bar"})
+        name_index = self.service.name_index
+
+        path = os.path.join(self.states_dir, "sub1", "INT-DP-DEV-JohnDoe-Personal")
+        os.makedirs(path)
+        with open(os.path.join(path, "terraform.tfvars"), 'w') as file:
+            file.write('email = "john.doe@other.com"\nusername = "JohnDoe"\n')
+
+        status, payload = await self.create({"email": "john.doe@foo.bar"})
+
+        self.assertEqual((status, payload["environment"]), (201, "INT-DP-DEV-JohnDoe2-Personal"))
+        self.assertIsNot(self.service.name_index, name_index)
+
+    async def test_own_changes_keep_the_indexes(self):
+        await self.create({"email": "first@foo.bar"})
+        name_index = self.service.name_index
+
+        await self.create({"email": "second@foo.bar"})
+
+        self.assertIs(self.service.name_index, name_index)
+        self.assertEqual(NameIndex.from_states_dir(self.states_dir).usernames, name_index.usernames)
+
+
+class FileCache(unittest.TestCase):
+
+    def test_reload_on_change(self):
+        test_dir = tempfile.mkdtemp()
+        file_name = os.path.join(test_dir, "file.txt")
+        loads = []
+
+        def load(name):
+            loads.append(name)
+            with open(name, 'r') as file:
+                return file.read()
+
+        cache = code.FileCache(file_name, load)
+        with open(file_name, 'w') as file:
+            file.write("one")
+        self.assertEqual((cache.get(), cache.get()), ("one", "one"))
+
+        with open(file_name, 'w') as file:
+            file.write("three")
+        self.assertEqual(cache.get(), "three")
+        self.assertEqual(len(loads), 2)
+
+        shutil.rmtree(test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
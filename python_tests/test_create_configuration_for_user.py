@@ -1,5 +1,8 @@
 import unittest
+import datetime
 import os
+import random
+import re
 import json
 import shutil, tempfile
 from unittest.mock import patch
@@ -8,6 +11,8 @@ from io import StringIO
 import python_code.create_configuration_for_user as code
 import python_code.constants as enums
 import python_code.config as conf
+from python_code.name_index import NameIndex
+from python_code.tfvars_validator import VariableSpec
 
 
 class ValidateEmail(unittest.TestCase):
@@ -18,6 +23,29 @@ class ValidateEmail(unittest.TestCase):
     def test_invalid(self):
         self.assertFalse(code.validate_email("ab.c"))
 
+    def test_same_as_pattern(self):
+        """The scanner should accept exactly what the regex accepts, including a newline at the end."""
+
+        self.assertEqual(conf.EMAIL_PATTERN, code.SCANNED_EMAIL_PATTERN)
+
+        emails = ["a@b.c\n", "a@b.c\n\n", "a@b..", "a@b-.c.d", "a@@b.c", "a@.c", "a@b.", "@b.c", "á@b.c"]
+        generator = random.Random(0)
+        emails += [''.join(generator.choices("aZ09_.+-@\n é", k=generator.randint(0, 12))) for _ in range(20000)]
+
+        for email in emails:
+            self.assertEqual(code.validate_email(email), re.match(conf.EMAIL_PATTERN, email) is not None, repr(email))
+
+    def test_changed_pattern(self):
+        with patch.object(conf, 'EMAIL_PATTERN', r'^[a-z]+@example\.com$'):
+            self.assertTrue(code.validate_email("john@example.com"))
+            self.assertFalse(code.validate_email("john@b.c"))
+
+    def test_reasons(self):
+        self.assertIsNone(code.scan_email("john.doe@foo.bar"))
+        self.assertIn("no '@'", code.scan_email("john.doe"))
+        self.assertIn("before the '@'", code.scan_email("john doe@foo.bar"))
+        self.assertIn("the domain", code.scan_email("john.doe@foo"))
+
 
 class GetEmail(unittest.TestCase):
 
@@ -44,6 +72,67 @@ class GetProposedUsername(unittest.TestCase):
         """The local-part of the email address should be split on '.' character and all parts capitalized."""
         self.assertEqual(code.get_proposed_username("dp.test.01@hiflylabs.com"), "DpTest01")
 
+    def test_same_as_splitting(self):
+        """Title-casing the whole local part should give the same usernames as title-casing its splits."""
+
+        generator = random.Random(0)
+        emails = [''.join(generator.choices("ab1_.+-@ßǆé'", k=generator.randint(0, 12))) for _ in range(20000)]
+
+        for email in emails:
+            splits = email.replace('-', '.').split('@')[0].split('.')
+            self.assertEqual(code.get_proposed_username(email), ''.join(chunk.title() for chunk in splits), email)
+
+
+class GetProposedUsernames(unittest.TestCase):
+
+    def test_batch(self):
+        results = code.get_proposed_usernames(["john.doe@foo.bar", "john doe@foo.bar", "jane-doe@foo.bar"])
+
+        self.assertEqual([(result.email, result.username) for result in results],
+                         [("john.doe@foo.bar", "JohnDoe"), ("john doe@foo.bar", None), ("jane-doe@foo.bar", "JaneDoe")])
+        self.assertEqual([result.error is None for result in results], [True, False, True])
+
+    def test_changed_pattern(self):
+        with patch.object(conf, 'EMAIL_PATTERN', r'^[a-z]+@example\.com$'):
+            results = code.get_proposed_usernames(["john@example.com", "john.doe@foo.bar"])
+
+        self.assertEqual(results, [
+            code.ProposedUsername("john@example.com", "John", None),
+            code.ProposedUsername("john.doe@foo.bar", None, "Invalid email address: 'john.doe@foo.bar'.")
+        ])
+
+
+class ReviewDate(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.tfvars_file = os.path.join(self.test_dir, "terraform.tfvars")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_get_review_date(self):
+        with patch.object(conf, 'REVIEW_PERIOD_DAYS', 180):
+            self.assertEqual(code.get_review_date(datetime.date(2024, 1, 31)), "2024-07-29")
+
+    def test_new_configuration(self):
+        config = {}
+        code.set_review_date(config, self.tfvars_file)
+
+        self.assertEqual(config, {'<REVIEW_DATE>': code.get_review_date()})
+
+    def test_keep_existing(self):
+        with open(self.tfvars_file, 'w') as file:
+            file.write('review_date = "2020-01-01"\n')
+
+        config = {}
+        code.set_review_date(config, self.tfvars_file)
+        self.assertEqual(config, {'<REVIEW_DATE>': "2020-01-01"})
+
+        config = {'<REVIEW_DATE>': "2031-06-30"}
+        code.set_review_date(config, self.tfvars_file)
+        self.assertEqual(config, {'<REVIEW_DATE>': "2031-06-30"})
+
 
 class GetVariableValueBasedOnSuggestion(unittest.TestCase):
 
@@ -106,8 +195,9 @@ class AcceptUserConfig(unittest.TestCase):
 
 class GetUserConfigValues(unittest.TestCase):
 
-    @patch('builtins.input', side_effect=["Y", "Y", "Y", "Y", "Y", "Y", "Y"])
-    def test_accept_all_proposals(self, mock_input):
+    @patch('python_code.create_configuration_for_user.get_review_date', return_value='2030-01-01')
+    @patch('builtins.input', side_effect=["Y", "Y", "Y", "Y", "Y", "Y", "Y", "Y", "Y"])
+    def test_accept_all_proposals(self, mock_input, mock_review_date):
         """Testing the case when the user accepts all proposed values.
         Configuration values need to be printed, and the proposed config values returned in a dict."""
 
@@ -118,13 +208,23 @@ class GetUserConfigValues(unittest.TestCase):
             '<SUFFIX>': conf.DEFAULT_VARIABLE_VALUES[enums.TemplateTag.SUFFIX],
             '<AZ_REGION>': conf.DEFAULT_VARIABLE_VALUES[enums.TemplateTag.AZ_REGION],
             '<DBX_ADMIN_GROUP_NAME>': conf.DEFAULT_VARIABLE_VALUES[enums.TemplateTag.DBX_ADMIN_GROUP_NAME],
-            '<ADMIN_FLAG>': conf.DEFAULT_VARIABLE_VALUES[enums.TemplateTag.ADMIN_FLAG]
+            '<ADMIN_FLAG>': conf.DEFAULT_VARIABLE_VALUES[enums.TemplateTag.ADMIN_FLAG],
+            '<COMPUTE_PROFILE>': conf.DEFAULT_VARIABLE_VALUES[enums.TemplateTag.COMPUTE_PROFILE],
+            '<STORAGE_TIER>': conf.DEFAULT_VARIABLE_VALUES[enums.TemplateTag.STORAGE_TIER],
+            '<INSTANCE_POOL_ENABLED>': 'false',
+            '<INSTANCE_POOL_MIN_IDLE>': '1',
+            '<INSTANCE_POOL_IDLE_AUTOTERMINATION>': '30',
+            '<CLUSTER_NO_WAIT>': 'false',
+            '<REVIEW_DATE>': '2030-01-01'
         }
 
         expected_config_stdout = (
             "\nThe following configuration will be used:\n\t{{'<EMAIL>': 'email@email.email', '<USERNAME>': 'Email', "
             "'<PREFIX>': '{prefix_value}', '<SUFFIX>': '{suffix_value}', '<AZ_REGION>': 'westeurope', "
-            "'<DBX_ADMIN_GROUP_NAME>': 'dbx-metastore-admins', '<ADMIN_FLAG>': 'false'}}\n"
+            "'<DBX_ADMIN_GROUP_NAME>': 'dbx-metastore-admins', '<ADMIN_FLAG>': 'false', "
+            "'<COMPUTE_PROFILE>': 'standard', '<STORAGE_TIER>': 'standard', '<INSTANCE_POOL_ENABLED>': 'false', "
+            "'<INSTANCE_POOL_MIN_IDLE>': '1', '<INSTANCE_POOL_IDLE_AUTOTERMINATION>': '30', '<CLUSTER_NO_WAIT>': 'false', "
+            "'<REVIEW_DATE>': '2030-01-01'}}\n"
             "Resource group will be named: '{rg_value}'\n"
             "All resources will be in region: 'westeurope'\n"
         ).format(
@@ -140,8 +240,9 @@ class GetUserConfigValues(unittest.TestCase):
 
 
     @patch('builtins.input',
-           side_effect=["email@email.email", "N", "username", "N", "prefix", "N", "suffix", "N", "az_region", "N", "dbx_admin_group_name", "N", "admin_flag", "Y"])
-    def test_reject_all_proposals(self, mock_input):
+           side_effect=["email@email.email", "N", "username", "N", "prefix", "N", "suffix", "N", "az_region", "N", "dbx_admin_group_name", "N", "admin_flag", "N", "heavy", "N", "premium", "Y"])
+    @patch('python_code.create_configuration_for_user.get_review_date', return_value='2030-01-01')
+    def test_reject_all_proposals(self, mock_review_date, mock_input):
         """Testing the case when the user rejects all proposed values and enters custom values.
         Configuration values need to be printed, and the entered config values returned in a dict."""
 
@@ -152,13 +253,23 @@ class GetUserConfigValues(unittest.TestCase):
             '<SUFFIX>': 'suffix',
             '<AZ_REGION>': 'az_region',
             '<DBX_ADMIN_GROUP_NAME>': 'dbx_admin_group_name',
-            '<ADMIN_FLAG>': 'admin_flag'
+            '<ADMIN_FLAG>': 'admin_flag',
+            '<COMPUTE_PROFILE>': 'heavy',
+            '<STORAGE_TIER>': 'premium',
+            '<INSTANCE_POOL_ENABLED>': 'false',
+            '<INSTANCE_POOL_MIN_IDLE>': '1',
+            '<INSTANCE_POOL_IDLE_AUTOTERMINATION>': '30',
+            '<CLUSTER_NO_WAIT>': 'false',
+            '<REVIEW_DATE>': '2030-01-01'
         }
 
         expected_config_stdout = (
             "\nThe following configuration will be used:\n\t{'<EMAIL>': 'email@email.email', "
             "'<USERNAME>': 'username', '<PREFIX>': 'prefix', '<SUFFIX>': 'suffix', '<AZ_REGION>': 'az_region', "
-            "'<DBX_ADMIN_GROUP_NAME>': 'dbx_admin_group_name', '<ADMIN_FLAG>': 'admin_flag'}\n"
+            "'<DBX_ADMIN_GROUP_NAME>': 'dbx_admin_group_name', '<ADMIN_FLAG>': 'admin_flag', "
+            "'<COMPUTE_PROFILE>': 'heavy', '<STORAGE_TIER>': 'premium', '<INSTANCE_POOL_ENABLED>': 'false', "
+            "'<INSTANCE_POOL_MIN_IDLE>': '1', '<INSTANCE_POOL_IDLE_AUTOTERMINATION>': '30', '<CLUSTER_NO_WAIT>': 'false', "
+            "'<REVIEW_DATE>': '2030-01-01'}\n"
             "Resource group will be named: 'prefixusernamesuffix'\n"
             "All resources will be in region: 'az_region'\n"
         )
@@ -169,6 +280,50 @@ class GetUserConfigValues(unittest.TestCase):
         self.assertEqual(fake_out.getvalue(), expected_config_stdout)
 
 
+class CheckNameCollisions(unittest.TestCase):
+
+    def setUp(self):
+        self.name_index = NameIndex()
+        self.name_index.add('john.doe@a.com', 'JohnDoe', 'P-', '-S')
+
+    def test_no_collision(self):
+        config = {'<EMAIL>': 'jane.doe@a.com', '<USERNAME>': 'JaneDoe', '<PREFIX>': 'P-', '<SUFFIX>': '-S'}
+
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            code.check_name_collisions(config, self.name_index)
+        self.assertEqual(fake_out.getvalue(), "")
+
+    def test_collision(self):
+        """A collision with the environment of another user should be printed and the script should quit."""
+
+        config = {'<EMAIL>': 'john-doe@b.com', '<USERNAME>': 'JohnDoe', '<PREFIX>': 'X-', '<SUFFIX>': '-S'}
+
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            with self.assertRaises(SystemExit):
+                code.check_name_collisions(config, self.name_index)
+        self.assertEqual(fake_out.getvalue(), "Username 'JohnDoe' is already used by 'john.doe@a.com'.\nTry again!\n")
+
+
+class CheckTfvars(unittest.TestCase):
+
+    def setUp(self):
+        self.variable_specs = {'admin_flag': VariableSpec('admin_flag', 'bool', True, None)}
+
+    def test_valid(self):
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            code.check_tfvars('admin_flag = "true"', self.variable_specs)
+        self.assertEqual(fake_out.getvalue(), "")
+
+    def test_invalid(self):
+        """The problems should be printed and the script should quit."""
+
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            with self.assertRaises(SystemExit):
+                code.check_tfvars('admin_flag = "yes"', self.variable_specs)
+        self.assertEqual(fake_out.getvalue(),
+                         "\nThe configuration is invalid:\n\t'admin_flag' should be a bool, got: 'yes'.\n")
+
+
 class FileManipulationTaskTests(unittest.TestCase):
 
     def setUp(self):
@@ -326,6 +481,26 @@ class SaveTfvars(unittest.TestCase):
 
         self.assertEqual(result_content, self.existing_content)
 
+    def test_save_tfvars_incremental(self):
+        """In incremental mode an existing folder is allowed, and the file is only rewritten if its content changed."""
+
+        self.assertTrue(code.save_tfvars(self.content_to_save, self.existing_file, incremental=True))
+        self.assertFalse(code.save_tfvars(self.content_to_save, self.existing_file, incremental=True))
+        self.assertTrue(code.save_tfvars("CHANGED CONTENT", self.existing_file, incremental=True))
+
+        with open(self.existing_file, 'r') as file:
+            result_content = file.read()
+
+        self.assertEqual(result_content, "CHANGED CONTENT")
+
+    def test_save_tfvars_hash(self):
+        """The hash of the content should be saved next to the file."""
+
+        code.save_tfvars(self.content_to_save, self.non_existing_file)
+
+        self.assertFalse(code.tfvars_changed(self.content_to_save, self.non_existing_file))
+        self.assertTrue(code.tfvars_changed("CHANGED CONTENT", self.non_existing_file))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,301 @@
+import unittest
+import os
+import json
+import shutil, tempfile
+from unittest.mock import patch
+from io import StringIO
+
+import python_code.create_configurations_for_roster as code
+import python_code.constants as enums
+import python_code.config as conf
+from python_code.create_configuration_for_user import get_review_date
+from python_code.name_index import NameIndex
+from python_code.placement import PlacementScheduler, Subscription, Quotas
+from python_code.terraform_states import read_tfvars_values
+from python_code.tfvars_template import compile_template
+from python_code.tfvars_validator import parse_variables
+
+
+class NormalizeRosterRow(unittest.TestCase):
+
+    def test_column_names(self):
+        """Column names should be case-insensitive, with or without angle brackets; empty values dropped."""
+
+        result = code.normalize_roster_row({'Email': 'a@b.c', '<PREFIX>': 'P-', 'suffix': '', 'ADMIN_FLAG': True})
+        self.assertEqual(result, {'email': 'a@b.c', 'prefix': 'P-', 'admin_flag': 'true'})
+
+
+class GetRosterUserConfig(unittest.TestCase):
+
+    def setUp(self):
+        self.admin_config = {
+            '<AZ_SUBSCRIPTION_ID>': 'az_subscription_id',
+            '<DBX_ACCOUNT_ID>': 'dbx_account_id',
+            '<DBX_METASTORE_ID>': 'dbx_metastore_id'
+        }
+
+    def test_defaults(self):
+        """Without overrides the proposed username and the default values should be used."""
+
+        result = code.get_roster_user_config({'email': 'john.doe@a.com'}, self.admin_config)
+
+        self.assertEqual(result[enums.TemplateTag.USERNAME.value], 'JohnDoe')
+        self.assertEqual(result[enums.TemplateTag.PREFIX.value], conf.DEFAULT_VARIABLE_VALUES[enums.TemplateTag.PREFIX])
+        self.assertEqual(result[enums.TemplateTag.AZ_SUBSCRIPTION_ID.value], 'az_subscription_id')
+
+    def test_overrides(self):
+        """Values given in the row should override the proposed and default values."""
+
+        result = code.get_roster_user_config(
+            {'email': 'john.doe@a.com', 'username': 'JD', 'az_region': 'northeurope', 'compute_profile': 'heavy',
+             'storage_tier': 'premium'},
+            self.admin_config
+        )
+
+        self.assertEqual(result[enums.TemplateTag.USERNAME.value], 'JD')
+        self.assertEqual(result[enums.TemplateTag.AZ_REGION.value], 'northeurope')
+        self.assertEqual(result[enums.TemplateTag.COMPUTE_PROFILE.value], 'heavy')
+        self.assertEqual(result[enums.TemplateTag.STORAGE_TIER.value], 'premium')
+
+    def test_invalid_email(self):
+        with self.assertRaisesRegex(ValueError, "Invalid email address: 'john.doe'."):
+            code.get_roster_user_config({'email': 'john.doe'}, self.admin_config)
+
+    def test_unknown_column(self):
+        with self.assertRaisesRegex(ValueError, "Unknown roster column\\(s\\): team."):
+            code.get_roster_user_config({'email': 'john.doe@a.com', 'team': 'x'}, self.admin_config)
+
+
+class CreateConfigurationsForRoster(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.tfvars_file_pattern = os.path.join(self.test_dir, "{az_subscription}", "{environment}", "terraform.tfvars")
+        self.commands_file_pattern = os.path.join(self.test_dir, "{az_subscription}", "{environment}", "commands.txt")
+        self.tfvars_template = compile_template('email = "<EMAIL>"\nusername = "<USERNAME>"\nazure-subscription-id = "<AZ_SUBSCRIPTION_ID>"')
+        self.admin_config = {
+            '<AZ_SUBSCRIPTION_ID>': 'sub',
+            '<DBX_ACCOUNT_ID>': 'dbx_account_id',
+            '<DBX_METASTORE_ID>': 'dbx_metastore_id'
+        }
+
+        os.makedirs(os.path.join(self.test_dir, "sub", "P-Existing-S"))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def create(self, roster_file, incremental=False, name_index=None, variable_specs=None, scheduler=None):
+        return code.create_configurations_for_roster(
+            roster_file, self.tfvars_template, self.admin_config,
+            tfvars_file_pattern=self.tfvars_file_pattern, commands_file_pattern=self.commands_file_pattern,
+            max_workers=2, incremental=incremental, name_index=name_index, variable_specs=variable_specs,
+            scheduler=scheduler
+        )
+
+    def test_csv_roster(self):
+        """Every row should get a result in roster order; bad rows should not stop the others."""
+
+        roster_file = os.path.join(self.test_dir, "roster.csv")
+        with open(roster_file, 'w') as file:
+            file.write("email,prefix,suffix\n"
+                       "john.doe@a.com,P-,-S\n"
+                       "not-an-email,P-,-S\n"
+                       "existing@a.com,P-,-S\n"
+                       "jane.doe@a.com,,\n")
+
+        results = self.create(roster_file)
+
+        self.assertEqual([result.row_number for result in results], [1, 2, 3, 4])
+        self.assertIsNone(results[0].error)
+        self.assertEqual(results[1].error, "Invalid email address: 'not-an-email'.")
+        self.assertIn("folder already exists", results[2].error)
+        self.assertIsNone(results[3].error)
+
+        with open(self.tfvars_file_pattern.format(az_subscription='sub', environment='P-JohnDoe-S'), 'r') as file:
+            self.assertEqual(file.read(), 'email = "john.doe@a.com"\nusername = "JohnDoe"\nazure-subscription-id = "sub"')
+
+        environment = results[3].environment
+        self.assertEqual(environment, conf.DEFAULT_VARIABLE_VALUES[enums.TemplateTag.PREFIX] + 'JaneDoe' +
+                         conf.DEFAULT_VARIABLE_VALUES[enums.TemplateTag.SUFFIX])
+        self.assertTrue(os.path.isfile(self.commands_file_pattern.format(az_subscription='sub', environment=environment)))
+
+    def test_jsonl_roster(self):
+        """JSONL rows should be parsed; an unparsable line should be reported as a failed row."""
+
+        roster_file = os.path.join(self.test_dir, "roster.jsonl")
+        with open(roster_file, 'w') as file:
+            file.write(json.dumps({'email': 'john.doe@a.com', 'username': 'Johnny'}) + "\n\n{broken\n")
+
+        results = self.create(roster_file)
+
+        self.assertEqual(len(results), 2)
+        self.assertIsNone(results[0].error)
+        self.assertTrue(results[0].environment.endswith('Johnny' + conf.DEFAULT_VARIABLE_VALUES[enums.TemplateTag.SUFFIX]))
+        self.assertEqual(results[1].error, "Invalid email address: '{broken'.")
+
+    def test_incremental(self):
+        """Existing environments should be allowed, and only the changed ones rewritten and listed."""
+
+        roster_file = os.path.join(self.test_dir, "roster.csv")
+        with open(roster_file, 'w') as file:
+            file.write("email,prefix,suffix\njohn.doe@a.com,P-,-S\njane.doe@a.com,P-,-S\n")
+        self.create(roster_file)
+
+        with open(roster_file, 'w') as file:
+            file.write("email,prefix,suffix,username\njohn.doe@a.com,P-,-S,\njane.doe@a.com,P-,-S,JaneDoe\n"
+                       "existing@a.com,P-,-S,\n")
+        self.tfvars_template = compile_template('email = "<EMAIL>"\nusername = "<USERNAME>"')
+        os.remove(self.tfvars_file_pattern.format(az_subscription='sub', environment='P-JaneDoe-S') + '.sha256')
+
+        results = self.create(roster_file, incremental=True)
+
+        self.assertTrue(all(result.error is None for result in results))
+        self.assertEqual([result.changed for result in results], [True, True, True])
+
+        results = self.create(roster_file, incremental=True)
+        self.assertEqual([result.changed for result in results], [False, False, False])
+
+        changed_environments_file = os.path.join(self.test_dir, "changed.txt")
+        code.save_changed_environments(
+            [results[0]._replace(changed=True), results[1]], changed_environments_file
+        )
+        with open(changed_environments_file, 'r') as file:
+            self.assertEqual(file.read(), "sub/P-JohnDoe-S\n")
+
+    def test_review_date(self):
+        """A regenerated configuration should keep its review date, unless the roster sets another one."""
+
+        self.tfvars_template = compile_template('email = "<EMAIL>"\nreview_date = "<REVIEW_DATE>"\n')
+        tfvars_file = self.tfvars_file_pattern.format(az_subscription='sub', environment='P-JohnDoe-S')
+        roster_file = os.path.join(self.test_dir, "roster.csv")
+        with open(roster_file, 'w') as file:
+            file.write("email,prefix,suffix\njohn.doe@a.com,P-,-S\n")
+
+        self.create(roster_file)
+        self.assertEqual(read_tfvars_values(tfvars_file)['review_date'], get_review_date())
+
+        with open(tfvars_file, 'w') as file:
+            file.write('email = "john.doe@a.com"\nreview_date = "2020-01-01"\n')
+        self.create(roster_file, incremental=True)
+        self.assertEqual(read_tfvars_values(tfvars_file)['review_date'], "2020-01-01")
+
+        with open(roster_file, 'w') as file:
+            file.write("email,prefix,suffix,review_date\njohn.doe@a.com,P-,-S,2031-06-30\n")
+        self.create(roster_file, incremental=True)
+        self.assertEqual(read_tfvars_values(tfvars_file)['review_date'], "2031-06-30")
+
+    def test_name_collisions(self):
+        """Colliding proposed usernames should get a number suffix; a colliding username from the roster should fail."""
+
+        roster_file = os.path.join(self.test_dir, "roster.csv")
+        with open(roster_file, 'w') as file:
+            file.write("email,prefix,suffix,username\n"
+                       "john.doe@a.com,P-,-S,\n"
+                       "john-doe@b.com,P-,-S,\n"
+                       "john_doe@c.com,P-,-S,JohnDoe\n")
+
+        results = self.create(roster_file, name_index=NameIndex())
+
+        self.assertEqual([result.environment for result in results], ["P-JohnDoe-S", "P-JohnDoe2-S", None])
+        self.assertTrue(results[2].error.startswith("Username 'JohnDoe' is already used by 'john.doe@a.com'."))
+
+    def test_validation(self):
+        """Every invalid row should be reported, and its configuration not saved."""
+
+        self.tfvars_template = compile_template('email = "<EMAIL>"\nadmin_flag = "<ADMIN_FLAG>"')
+        variable_specs = parse_variables('variable "email" {\n type = string\n}\n'
+                                         'variable "admin_flag" {\n type = bool\n}\n')
+
+        roster_file = os.path.join(self.test_dir, "roster.csv")
+        with open(roster_file, 'w') as file:
+            file.write("email,prefix,suffix,admin_flag\n"
+                       "john.doe@a.com,P-,-S,yes\n"
+                       "jane.doe@a.com,P-,-S,true\n"
+                       "jim.doe@a.com,P-,-S,1\n")
+
+        results = self.create(roster_file, variable_specs=variable_specs)
+
+        self.assertEqual([result.error for result in results], [
+            "'admin_flag' should be a bool, got: 'yes'.", None, "'admin_flag' should be a bool, got: '1'."
+        ])
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, "sub", "P-JohnDoe-S")))
+
+    def test_placement(self):
+        """The rows should be spread across the subscriptions, a subscription given in the roster should be kept,
+        and rows that do not fit anywhere should fail."""
+
+        self.admin_config = {}
+        scheduler = PlacementScheduler([
+            Subscription("sub1", "account1", {"westeurope": "metastore1"}, Quotas(980, 250, 1)),
+            Subscription("sub2", "account2", {"westeurope": "metastore2"}, Quotas(980, 250, 1))
+        ])
+
+        roster_file = os.path.join(self.test_dir, "roster.csv")
+        with open(roster_file, 'w') as file:
+            file.write("email,prefix,suffix,az_region,az_subscription_id,dbx_account_id,dbx_metastore_id\n"
+                       "a@a.com,P-,-S,westeurope,,,\n"
+                       "b@a.com,P-,-S,westeurope,,,\n"
+                       "c@a.com,P-,-S,westeurope,sub9,account9,metastore9\n"
+                       "d@a.com,P-,-S,westeurope,,,\n")
+
+        results = self.create(roster_file, scheduler=scheduler)
+
+        self.assertEqual([result.az_subscription for result in results], ["sub1", "sub2", "sub9", None])
+        self.assertEqual(results[3].error, "No subscription has a metastore and free capacity in region 'westeurope'.")
+
+    def test_subscription_from_the_registry(self):
+        """A row giving only a subscription of the registry should get its account and metastore from it."""
+
+        self.admin_config = {}
+        self.tfvars_template = compile_template('email = "<EMAIL>"\nazure-subscription-id = "<AZ_SUBSCRIPTION_ID>"\n'
+                                               'dbx-account-id = "<DBX_ACCOUNT_ID>"\n'
+                                               'dbx-metastore-id = "<DBX_METASTORE_ID>"')
+        scheduler = PlacementScheduler([
+            Subscription("sub1", "account1", {"westeurope": "metastore1"}, Quotas(980, 250, 1)),
+            Subscription("sub2", "account2", {"westeurope": "metastore2", "northeurope": "metastore3"},
+                         Quotas(980, 250, 1))
+        ])
+
+        roster_file = os.path.join(self.test_dir, "roster.csv")
+        with open(roster_file, 'w') as file:
+            file.write("email,prefix,suffix,az_region,az_subscription_id,dbx_metastore_id\n"
+                       "a@a.com,P-,-S,westeurope,sub2,\n"
+                       "b@a.com,P-,-S,northeurope,sub2,metastore9\n"
+                       "c@a.com,P-,-S,westeurope,sub9,\n"
+                       "d@a.com,P-,-S,northeurope,sub1,\n")
+
+        results = self.create(roster_file, scheduler=scheduler)
+
+        self.assertEqual([result.az_subscription for result in results], ["sub2", "sub2", None, None])
+        with open(self.tfvars_file_pattern.format(az_subscription="sub2", environment=results[0].environment)) as file:
+            self.assertIn('dbx-account-id = "account2"\ndbx-metastore-id = "metastore2"', file.read())
+        with open(self.tfvars_file_pattern.format(az_subscription="sub2", environment=results[1].environment)) as file:
+            self.assertIn('dbx-metastore-id = "metastore9"', file.read())
+        self.assertEqual(results[2].error, "Subscription 'sub9' is not in the subscriptions registry, give its "
+                                           "Databricks account and metastore too.")
+        self.assertEqual(results[3].error, "Subscription 'sub1' has no metastore in region 'northeurope'.")
+
+    def test_unsupported_roster_file(self):
+        with self.assertRaises(ValueError):
+            self.create(os.path.join(self.test_dir, "roster.txt"))
+
+
+class PrintRosterSummary(unittest.TestCase):
+
+    def test_summary(self):
+
+        results = [code.RowResult(1, 'a@b.c', 'sub', 'EnvA', None, True),
+                   code.RowResult(2, 'x', None, None, 'Bad.'),
+                   code.RowResult(3, 'd@e.f', 'sub', 'EnvD', None, False)]
+
+        with patch('sys.stdout', new=StringIO()) as fake_out:
+            code.print_roster_summary(results)
+
+        self.assertEqual(fake_out.getvalue(), ("Row 1: 'a@b.c' -> 'EnvA' SUCCESS\n"
+                                              "Row 2: 'x' FAILED: Bad.\n"
+                                              "Row 3: 'd@e.f' -> 'EnvD' UNCHANGED\n"
+                                              "\nProcessed 3 row(s): 2 succeeded, 1 failed.\n"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,137 @@
+import unittest
+import os
+import shutil, tempfile
+
+import python_code.dependency_graph as code
+from python_code.hcl import find_references
+import python_code.config as conf
+
+TF_CODE = '''
+provider "databricks" {
+  alias = "workspace"
+  host  = azurerm_databricks_workspace.ws.workspace_url
+}
+
+locals {
+  name = "${var.username}-rg"
+}
+
+resource "azurerm_resource_group" "rg" {
+  name = local.name
+}
+
+resource "azurerm_databricks_workspace" "ws" {
+  # Redundant: the name references the resource group.
+  depends_on          = [azurerm_resource_group.rg]
+  resource_group_name = azurerm_resource_group.rg.name
+}
+
+resource "databricks_cluster" "cluster" {
+  provider = databricks.workspace
+  count    = 1
+}
+
+resource "databricks_sql_endpoint" "warehouse" {
+  # Serializing: nothing references the cluster.
+  depends_on = [databricks_cluster.cluster]
+  provider   = databricks.workspace
+  name       = "warehouse of databricks_cluster.cluster"
+}
+
+resource "databricks_permissions" "cluster_usage" {
+  provider   = databricks.workspace
+  cluster_id = databricks_cluster.cluster[0].id
+}
+'''
+
+DURATIONS = {'azurerm_resource_group': 10, 'azurerm_databricks_workspace': 100, 'databricks_cluster': 200,
+             'databricks_sql_endpoint': 50, 'databricks_permissions': 5}
+
+
+class FindReferences(unittest.TestCase):
+
+    def test_references(self):
+        self.assertEqual(find_references('coalesce(local.a, var.b) + data.t.n[0].id + length(azurerm_x.y)'),
+                         ['local.a', 'var.b', 'data.t.n', 'azurerm_x.y'])
+
+    def test_strings(self):
+        self.assertEqual(find_references('"${local.name}-cluster.not_a_reference ${format("%s", var.a.b)}"'),
+                         ['local.name', 'var.a.b'])
+        self.assertEqual(find_references('"1.5" == 1.5'), [])
+
+
+class DependencyGraphTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        with open(os.path.join(self.test_dir, "main.tf"), 'w') as file:
+            file.write(TF_CODE)
+        self.nodes = code.parse_code_dir(self.test_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+
+class ParseCodeDir(DependencyGraphTestCase):
+
+    def test_nodes(self):
+        self.assertEqual(sorted(self.nodes), ['azurerm_databricks_workspace.ws', 'azurerm_resource_group.rg',
+                                              'databricks_cluster.cluster', 'databricks_permissions.cluster_usage',
+                                              'databricks_sql_endpoint.warehouse', 'local.name',
+                                              'provider.databricks.workspace'])
+
+    def test_dependencies(self):
+        self.assertEqual(self.nodes['azurerm_resource_group.rg'].implicit, {'local.name'})
+        self.assertEqual(self.nodes['databricks_permissions.cluster_usage'].implicit,
+                         {'databricks_cluster.cluster', 'provider.databricks.workspace'})
+        self.assertEqual(self.nodes['databricks_cluster.cluster'].implicit, {'provider.databricks.workspace'})
+        self.assertEqual(self.nodes['databricks_sql_endpoint.warehouse'].explicit, ('databricks_cluster.cluster',))
+
+
+class Analyze(DependencyGraphTestCase):
+
+    def test_critical_path(self):
+        path, seconds = code.get_critical_path(self.nodes, DURATIONS)
+
+        self.assertEqual(path, ['azurerm_resource_group.rg', 'azurerm_databricks_workspace.ws',
+                                'databricks_cluster.cluster', 'databricks_sql_endpoint.warehouse'])
+        self.assertEqual(seconds, 360)
+
+    def test_findings(self):
+        report = code.analyze(self.nodes, DURATIONS, required=set())
+
+        self.assertEqual(report.redundant, [('azurerm_databricks_workspace.ws', 'azurerm_resource_group.rg')])
+        self.assertEqual(report.serializing, [('databricks_sql_endpoint.warehouse', 'databricks_cluster.cluster', 315)])
+
+    def test_required(self):
+        report = code.analyze(self.nodes, DURATIONS,
+                              required={('databricks_sql_endpoint.warehouse', 'databricks_cluster.cluster')})
+
+        self.assertEqual(report.serializing, [])
+
+    def test_durations(self):
+        self.assertEqual(code.get_duration(self.nodes['databricks_cluster.cluster'], {}),
+                         conf.DEPENDENCY_GRAPH_DEFAULT_DURATION)
+        self.assertEqual(code.get_duration(self.nodes['databricks_cluster.cluster'],
+                                           {'databricks_cluster': 200, 'databricks_cluster.cluster': 150}), 150)
+        self.assertEqual(code.get_duration(self.nodes['local.name'], DURATIONS), 0)
+
+
+class TerraformCode(unittest.TestCase):
+
+    def test_no_findings(self):
+        """The depends_on of the terraform code (and of its layers) are all needed and do not serialize."""
+
+        for code_dir in [conf.TERRAFORM_CODE_DIR] + [os.path.join(conf.TERRAFORM_CODE_DIR, 'layers', layer)
+                                                     for layer in ('infra', 'unity_catalog', 'compute')]:
+            report = code.analyze(code.parse_code_dir(code_dir))
+            self.assertEqual((report.redundant, report.serializing), ([], []), code_dir)
+
+    def test_warehouse_does_not_wait_for_the_cluster(self):
+        path, _ = code.get_critical_path(code.parse_code_dir(conf.TERRAFORM_CODE_DIR), conf.DEPENDENCY_GRAPH_DURATIONS)
+
+        self.assertNotIn('databricks_sql_endpoint.personal', path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+import os
+import datetime
+import json
+from unittest.mock import patch
+from io import StringIO
+
+import python_code.expiry_sweeper as code
+from python_tests.test_run_terraform import TerraformTestCase
+
+TODAY = datetime.date(2025, 6, 1)
+STATE_WITH_RESOURCES = {"version": 4, "resources": [{"mode": "managed", "type": "azurerm_resource_group",
+                                                     "name": "dbx_environment", "instances": [{"attributes": {}}]}]}
+
+
+class ExpirySweeperTestCase(TerraformTestCase):
+
+    def create_reviewed_environment(self, az_subscription, name, review_date, state=STATE_WITH_RESOURCES,
+                                    fail_times=0):
+        environment = self.create_environment(az_subscription, name, fail_times)
+        with open(environment.tfvars_file, 'w') as file:
+            file.write(f'email = "a@b.c"\nreview_date = "{review_date}"\n' if review_date else 'email = "a@b.c"\n')
+        if state is not None:
+            with open(environment.tfstate_file, 'w') as file:
+                json.dump(state, file)
+        return environment
+
+
+class FindExpiredEnvironments(ExpirySweeperTestCase):
+
+    def test_expired(self):
+        """Only the environments reviewed before today, that still have resources, should be found, oldest first."""
+
+        environments = [
+            self.create_reviewed_environment("sub", "Expired", "2025-05-01"),
+            self.create_reviewed_environment("sub", "ExpiredEarlier", "2025-01-01"),
+            self.create_reviewed_environment("sub", "Today", "2025-06-01"),
+            self.create_reviewed_environment("sub", "Later", "2025-12-01"),
+            self.create_reviewed_environment("sub", "NoReviewDate", None),
+            self.create_reviewed_environment("sub", "Destroyed", "2025-01-01", {"version": 4, "resources": []}),
+            self.create_reviewed_environment("sub", "NeverApplied", "2025-01-01", None)
+        ]
+
+        expired = code.find_expired_environments(environments, TODAY)
+
+        self.assertEqual([(item.environment.name, item.review_date.isoformat()) for item in expired],
+                         [("ExpiredEarlier", "2025-01-01"), ("Expired", "2025-05-01")])
+        self.assertEqual([item.environment.name for item in code.find_expired_environments(environments, TODAY, 60)],
+                         ["ExpiredEarlier"])
+
+    def test_unreadable_state(self):
+        """An environment with a corrupt state should be reported and skipped, not stop the listing."""
+
+        corrupt = self.create_reviewed_environment("sub", "Corrupt", "2025-01-01")
+        with open(corrupt.tfstate_file, 'w') as file:
+            file.write('{"version": 4, "resources": [{"mode": "man')
+        expired = self.create_reviewed_environment("sub", "Expired", "2025-05-01")
+
+        with patch('sys.stdout', new=StringIO()) as output:
+            found = code.find_expired_environments([corrupt, expired], TODAY)
+
+        self.assertEqual([item.environment for item in found], [expired])
+        self.assertIn("'sub/Corrupt' SKIPPED, its state cannot be read", output.getvalue())
+
+
+class Sweep(ExpirySweeperTestCase):
+
+    def sweep(self, expired, batch_size):
+        with patch('python_code.expiry_sweeper.time.sleep') as sleep, patch('sys.stdout', new=StringIO()):
+            results = code.sweep(expired, batch_size, 60, inventory_db_file=None, retries=0, backoff_seconds=0)
+        return results, sleep
+
+    def test_batches(self):
+        environments = [self.create_reviewed_environment("sub", f"Env{number}", "2025-01-01") for number in range(5)]
+
+        results, sleep = self.sweep(code.find_expired_environments(environments, TODAY), batch_size=2)
+
+        self.assertEqual([result.environment.name for result in results], [f"Env{number}" for number in range(5)])
+        self.assertTrue(all(result.action == 'destroy' and result.returncode == 0 for result in results))
+        self.assertEqual([call.args for call in sleep.call_args_list], [(60,), (60,)])
+
+    def test_stop_after_failed_batch(self):
+        environments = [self.create_reviewed_environment("sub", "Env0", "2025-01-01", fail_times=1),
+                        self.create_reviewed_environment("sub", "Env1", "2025-01-02"),
+                        self.create_reviewed_environment("sub", "Env2", "2025-01-03")]
+
+        results, _ = self.sweep(code.find_expired_environments(environments, TODAY), batch_size=1)
+
+        self.assertEqual([(result.environment.name, result.returncode) for result in results], [("Env0", 3)])
+        self.assertFalse(os.path.exists(os.path.join(environments[1].path, "attempts")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import os
+import json
+import shutil, tempfile
+
+import python_code.inventory as code
+from python_code.terraform_states import Environment
+
+
+class Inventory(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.states_dir = os.path.join(self.test_dir, "terraform_states")
+        self.db_file = os.path.join(self.states_dir, "inventory.sqlite")
+
+        self.john = self.create_environment("sub1", "P-JohnDoe-S", "john.doe@a.com", "JohnDoe", "false",
+                                            "adb-1.azuredatabricks.net")
+        self.jane = self.create_environment("sub2", "P-JaneDoe-S", "jane.doe@a.com", "JaneDoe", "true")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def create_environment(self, az_subscription, name, email, username, admin_flag, workspace_url=None):
+        path = os.path.join(self.states_dir, az_subscription, name)
+        os.makedirs(path)
+        with open(os.path.join(path, "terraform.tfvars"), 'w') as file:
+            file.write(f'email = "{email}"\nusername = "{username}"\nazure-region = "westeurope"\n'
+                       f'admin_flag = "{admin_flag}"\n')
+        if workspace_url:
+            with open(os.path.join(path, "terraform.tfstate"), 'w') as file:
+                json.dump({'outputs': {'dbx_workspace_url': {'value': workspace_url}}}, file)
+        return Environment(az_subscription, name, path)
+
+    def test_rebuild_and_query(self):
+        """All environments should be in the inventory; queries should be case-insensitive."""
+
+        self.assertEqual(code.rebuild_inventory(self.states_dir, self.db_file), 2)
+
+        self.assertEqual(len(code.query_inventory(self.db_file)), 2)
+
+        result = code.query_inventory(self.db_file, email="John.Doe@A.com")
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]['environment'], "P-JohnDoe-S")
+        self.assertEqual(result[0]['workspace_url'], "adb-1.azuredatabricks.net")
+        self.assertEqual(result[0]['admin_flag'], 0)
+
+        result = code.query_inventory(self.db_file, az_subscription="sub2", environment="p-janedoe-s")
+        self.assertEqual([record['username'] for record in result], ["JaneDoe"])
+        self.assertEqual(result[0]['admin_flag'], 1)
+        self.assertIsNone(result[0]['workspace_url'])
+
+    def test_incremental_update(self):
+        """Updating an environment should refresh its record; removing should delete it."""
+
+        code.update_inventory([self.jane], self.db_file)
+        self.assertIsNone(code.query_inventory(self.db_file, username="JaneDoe")[0]['workspace_url'])
+
+        with open(self.jane.tfstate_file, 'w') as file:
+            json.dump({'outputs': {'dbx_workspace_url': {'value': 'adb-2.azuredatabricks.net'}}}, file)
+        code.update_inventory([self.jane, self.john], self.db_file)
+
+        self.assertEqual(code.query_inventory(self.db_file, username="JaneDoe")[0]['workspace_url'],
+                         'adb-2.azuredatabricks.net')
+
+        code.remove_from_inventory([self.jane], self.db_file)
+        self.assertEqual([record['username'] for record in code.query_inventory(self.db_file)], ["JohnDoe"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import os
+import shutil, tempfile
+
+import python_code.name_index as code
+
+
+class GetCatalogName(unittest.TestCase):
+
+    def test_function(self):
+        self.assertEqual(code.get_catalog_name("INT-DP-DEV-JohnDoe-Personal"), "int_dp_dev_johndoe_personal")
+
+
+class NameIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = code.NameIndex()
+        self.index.add("john.doe@a.com", "JohnDoe", "P-", "-S")
+
+    def test_no_collision(self):
+        self.assertEqual(self.index.find_collisions("jane.doe@a.com", "JaneDoe", "P-", "-S"), [])
+
+    def test_same_email(self):
+        """Names of the same user should not be collisions, so configurations can be regenerated."""
+
+        self.assertEqual(self.index.find_collisions("John.Doe@a.com", "JohnDoe", "P-", "-S"), [])
+
+    def test_collisions(self):
+        """The same username means the same resource group and catalog too; all of them should be reported."""
+
+        self.assertEqual(self.index.find_collisions("john-doe@b.com", "johndoe", "P-", "-S"), [
+            "Username 'johndoe' is already used by 'john.doe@a.com'.",
+            "Resource group 'P-johndoe-S' is already used by 'john.doe@a.com'.",
+            "Catalog 'p_johndoe_s' is already used by 'john.doe@a.com'."
+        ])
+
+    def test_catalog_collision(self):
+        """Different resource groups can still end up with the same catalog name."""
+
+        self.assertEqual(self.index.find_collisions("x@b.com", "JohnDoe_S", "P_", ""),
+                         ["Catalog 'p_johndoe_s' is already used by 'john.doe@a.com'."])
+
+    def test_allocate_username(self):
+        """Colliding usernames should get the first free number suffix, and be added to the index."""
+
+        self.assertEqual(self.index.allocate_username("john-doe@b.com", "JohnDoe", "P-", "-S"), "JohnDoe2")
+        self.assertEqual(self.index.allocate_username("john_doe@c.com", "JohnDoe", "P-", "-S"), "JohnDoe3")
+        self.assertEqual(self.index.allocate_username("john-doe@b.com", "JohnDoe", "P-", "-S"), "JohnDoe2")
+
+    def test_allocate_username_limit(self):
+        with self.assertRaises(ValueError):
+            self.index.allocate_username("john-doe@b.com", "JohnDoe", "P-", "-S", max_attempts=1)
+
+
+class FromStatesDir(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        path = os.path.join(self.test_dir, "sub", "P-JohnDoe-S")
+        os.makedirs(path)
+        with open(os.path.join(path, "terraform.tfvars"), 'w') as file:
+            file.write('email = "john.doe@a.com"\nusername = "JohnDoe"\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_build(self):
+        index = code.NameIndex.from_states_dir(self.test_dir)
+
+        self.assertEqual(index.usernames, {"johndoe": "john.doe@a.com"})
+        self.assertEqual(index.resource_groups, {"p-johndoe-s": "john.doe@a.com"})
+        self.assertEqual(index.catalogs, {"p_johndoe_s": "john.doe@a.com"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest
+import json
+import os
+import shutil, tempfile
+from unittest.mock import patch
+from io import StringIO
+
+import python_code.placement as code
+from python_code.create_configuration_for_user import get_placed_admin_config
+
+
+def subscription(az_subscription_id, regions, resource_groups=980, storage_accounts=250, workspaces=100):
+    return code.Subscription(az_subscription_id, f"account-{az_subscription_id}",
+                             {region: f"metastore-{region}" for region in regions},
+                             code.Quotas(resource_groups, storage_accounts, workspaces))
+
+
+class LoadSubscriptions(unittest.TestCase):
+
+    def test_default_quotas(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as file:
+            json.dump([{"<AZ_SUBSCRIPTION_ID>": "sub1", "<DBX_ACCOUNT_ID>": "account",
+                        "metastores": {"westeurope": "metastore"}, "quotas": {"workspaces_per_region": 5}}], file)
+        try:
+            subscriptions = code.load_subscriptions(file.name)
+        finally:
+            os.remove(file.name)
+
+        self.assertEqual(subscriptions[0].quotas, code.Quotas(980, 250, 5))
+        self.assertEqual(subscriptions[0].admin_config("westeurope"), {
+            '<AZ_SUBSCRIPTION_ID>': 'sub1', '<DBX_ACCOUNT_ID>': 'account', '<DBX_METASTORE_ID>': 'metastore'
+        })
+
+
+class PlacementScheduler(unittest.TestCase):
+
+    def test_spread(self):
+        """New environments should be spread evenly across the subscriptions with a metastore in the region."""
+
+        scheduler = code.PlacementScheduler([subscription("sub1", ["westeurope"]),
+                                             subscription("sub2", ["westeurope"]),
+                                             subscription("sub3", ["northeurope"])])
+
+        placed = [scheduler.place(f"user{number}@a.com", "westeurope").az_subscription_id for number in range(4)]
+
+        self.assertEqual(placed, ["sub1", "sub2", "sub1", "sub2"])
+
+    def test_quota(self):
+        """A subscription should not get more environments than any of its quotas allow."""
+
+        scheduler = code.PlacementScheduler([subscription("sub1", ["westeurope"], workspaces=1),
+                                             subscription("sub2", ["westeurope"], storage_accounts=4)])
+
+        placed = [scheduler.place(f"user{number}@a.com", "westeurope").az_subscription_id for number in range(3)]
+
+        self.assertEqual(sorted(placed), ["sub1", "sub2", "sub2"])
+        with self.assertRaises(ValueError):
+            scheduler.place("user3@a.com", "westeurope")
+        with self.assertRaises(ValueError):
+            scheduler.place("user4@a.com", "eastus")
+
+    def test_existing_user_stays(self):
+        scheduler = code.PlacementScheduler([subscription("sub1", ["westeurope"]),
+                                             subscription("sub2", ["westeurope"])])
+        scheduler.add("sub2", "westeurope", "John.Doe@a.com")
+
+        self.assertEqual(scheduler.place("john.doe@a.com", "westeurope").az_subscription_id, "sub2")
+        self.assertEqual(scheduler.resource_groups["sub2"], 2)
+
+    def test_from_states_dir(self):
+        states_dir = tempfile.mkdtemp()
+        try:
+            for az_subscription, name in [("sub1", "Env1"), ("sub1", "Env2"), ("sub2", "Env3")]:
+                os.makedirs(os.path.join(states_dir, az_subscription, name))
+                with open(os.path.join(states_dir, az_subscription, name, "terraform.tfvars"), 'w') as file:
+                    file.write(f'email = "{name}@a.com"\nazure-region = "westeurope"\n')
+
+            scheduler = code.PlacementScheduler.from_states_dir(
+                [subscription("sub1", ["westeurope"]), subscription("sub2", ["westeurope"])], states_dir
+            )
+        finally:
+            shutil.rmtree(states_dir)
+
+        self.assertEqual(scheduler.workspaces["sub1", "westeurope"], 2)
+        self.assertEqual(scheduler.storage_accounts["sub2", "westeurope"], 2)
+        self.assertEqual(scheduler.place("new@a.com", "westeurope").az_subscription_id, "sub2")
+
+
+class GetPlacedAdminConfig(unittest.TestCase):
+
+    def test_no_capacity(self):
+        scheduler = code.PlacementScheduler([subscription("sub1", ["westeurope"])])
+        config = {'<EMAIL>': 'john.doe@a.com', '<AZ_REGION>': 'eastus'}
+
+        with patch('sys.stdout', new=StringIO()) as output:
+            with self.assertRaises(SystemExit):
+                get_placed_admin_config(config, scheduler)
+
+        self.assertIn("No subscription has a metastore and free capacity in region 'eastus'.", output.getvalue())
+
+    def test_placed(self):
+        scheduler = code.PlacementScheduler([subscription("sub1", ["westeurope"])])
+        config = {'<EMAIL>': 'john.doe@a.com', '<AZ_REGION>': 'westeurope'}
+
+        with patch('sys.stdout', new=StringIO()):
+            admin_config = get_placed_admin_config(config, scheduler)
+
+        self.assertEqual(admin_config['<DBX_METASTORE_ID>'], 'metastore-westeurope')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,118 @@
+import unittest
+import os
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+from io import StringIO
+
+import python_code.plan_cache as code
+from python_code.run_terraform import run_terraform_for_environments
+from python_tests.test_run_terraform import TerraformTestCase
+
+NOW = datetime(2024, 1, 31, tzinfo=timezone.utc)
+
+
+def result(inputs_hash, summary, days_ago, returncode=0):
+    return {'inputs_hash': inputs_hash, 'returncode': returncode, 'summary': summary,
+            'at': (NOW - timedelta(days=days_ago)).isoformat()}
+
+
+class GetCacheStatus(unittest.TestCase):
+
+    def status(self, record, drift_refresh_days=None):
+        return code.get_cache_status(record, "hash", drift_refresh_days, NOW)
+
+    def test_changed(self):
+        self.assertEqual(self.status({}), code.CacheStatus.CHANGED)
+        self.assertEqual(self.status({'apply': result("other", None, 1)}), code.CacheStatus.CHANGED)
+        self.assertEqual(self.status({'apply': result("hash", None, 1, returncode=1)}), code.CacheStatus.CHANGED)
+
+    def test_up_to_date(self):
+        self.assertEqual(self.status({'apply': result("hash", "Apply complete!", 1)}), code.CacheStatus.UP_TO_DATE)
+
+    def test_plan_after_apply(self):
+        """A plan since the apply that found changes (drift) should make the environment changed."""
+
+        applied = result("hash", "Apply complete!", 5)
+
+        self.assertEqual(self.status({'apply': applied, 'plan': result("hash", "Plan: 0 to add, 1 to change", 1)}),
+                         code.CacheStatus.CHANGED)
+        self.assertEqual(self.status({'apply': applied, 'plan': result("hash", "Plan: 0 to add, 1 to change", 9)}),
+                         code.CacheStatus.UP_TO_DATE)
+        self.assertEqual(self.status({'apply': applied, 'plan': result("hash", "No changes. Your infra...", 1)}),
+                         code.CacheStatus.UP_TO_DATE)
+        self.assertEqual(self.status({'apply': applied,
+                                      'plan': result("hash", "Plan: 0 to add, 0 to change, 0 to destroy.", 1)}),
+                         code.CacheStatus.UP_TO_DATE)      # The summary of 'terraform plan -json'.
+
+    def test_drift_refresh(self):
+        applied = result("hash", "Apply complete!", 10)
+
+        self.assertEqual(self.status({'apply': applied}, drift_refresh_days=7), code.CacheStatus.DRIFT_REFRESH)
+        self.assertEqual(self.status({'apply': applied, 'plan': result("hash", "No changes.", 2)},
+                                     drift_refresh_days=7), code.CacheStatus.UP_TO_DATE)
+
+
+class GetSummary(TerraformTestCase):
+
+    def test_last_summary(self):
+        log_file = os.path.join(self.test_dir, "terraform_plan.log")
+        with open(log_file, 'w') as file:
+            file.write("### attempt 1\nPlan: 1 to add, 0 to change, 0 to destroy.\n"
+                       "### attempt 2\nNo changes. Your infrastructure matches the configuration.\n")
+
+        self.assertEqual(code.get_summary(log_file), "No changes. Your infrastructure matches the configuration.")
+        self.assertIsNone(code.get_summary(os.path.join(self.test_dir, "missing.log")))
+
+
+class RunTerraformWithPlanCache(TerraformTestCase):
+
+    def run_all(self, action, environments, **kwargs):
+        with patch('sys.stdout', new=StringIO()):
+            return run_terraform_for_environments(action, environments, backoff_seconds=0,
+                                                  terraform_code_dir=self.test_dir, use_plan_cache=True, **kwargs)
+
+    def test_skip_unchanged(self):
+        """Environments applied with the same inputs should be skipped; changed or destroyed ones should run."""
+
+        unchanged = self.create_environment("sub", "Unchanged")
+        changed = self.create_environment("sub", "Changed")
+        self.run_all("apply", [unchanged, changed])
+
+        with open(changed.tfvars_file, 'a') as file:
+            file.write('\nadmin_flag = true')
+        results = self.run_all("apply", [unchanged, changed])
+
+        self.assertEqual([result.skipped for result in results], [True, False])
+        self.assertEqual(self.attempts(unchanged), 1)
+        self.assertEqual(self.attempts(changed), 2)
+
+        self.assertEqual([result.skipped for result in self.run_all("plan", [unchanged, changed])], [True, True])
+
+        self.run_all("destroy", [unchanged])
+        self.assertFalse(os.path.exists(code.get_plan_cache_file(unchanged)))
+
+    def test_drift_refresh_concurrency(self):
+        """Environments due for a drift refresh should run, but no more at the same time than the drift limit."""
+
+        environments = [self.create_environment(f"sub{number}", "Env") for number in range(4)]
+        self.run_all("apply", environments)
+        os.remove(self.record_file)
+
+        with patch('python_code.plan_cache.datetime') as mocked_datetime:
+            mocked_datetime.now.return_value = datetime.now(timezone.utc) + timedelta(days=30)
+            mocked_datetime.fromisoformat = datetime.fromisoformat
+            results = self.run_all("plan", environments, drift_refresh_days=7, max_drift_workers=1)
+
+        self.assertFalse(any(result.skipped for result in results))
+
+        with open(self.record_file, 'r') as file:
+            events = sorted((float(timestamp), event) for event, _, timestamp in (line.split() for line in file))
+
+        running = 0
+        for _, event in events:
+            running += 1 if event == "start" else -1
+            self.assertLessEqual(running, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
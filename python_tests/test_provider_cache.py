@@ -0,0 +1,191 @@
+import unittest
+import os
+import sys
+import shutil, tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+from io import StringIO
+
+import python_code.provider_cache as code
+from python_code.run_terraform import run_terraform_for_environments
+from python_code.terraform_states import Environment
+
+# Fake terraform executable: 'init' installs the providers from the '-plugin-dir' mirror (offline) and writes the
+# lock file, the other actions fail if the working directory is not initialized.
+FAKE_TERRAFORM = """#!{python}
+import os, shutil, sys, time
+chdir = [arg for arg in sys.argv if arg.startswith('-chdir=')][0][len('-chdir='):]
+if 'init' in sys.argv:
+    with open(os.environ['FAKE_TERRAFORM_RECORD'], 'a') as record:
+        record.write(" ".join(sys.argv[1:]) + "\\n")
+    time.sleep(0.1)
+    mirror = [arg for arg in sys.argv if arg.startswith('-plugin-dir=')][0][len('-plugin-dir='):]
+    shutil.copytree(mirror, os.path.join(chdir, '.terraform', 'providers'))
+    if '-lockfile=readonly' not in sys.argv:
+        open(os.path.join(chdir, '.terraform.lock.hcl'), 'w').write('# pinned')
+    sys.exit(0)
+provider = os.path.join(chdir, '.terraform', 'providers', 'registry.terraform.io', 'hashicorp', 'azurerm')
+print("fake terraform", chdir, open(provider).read())
+sys.exit(0)
+"""
+
+
+class ProviderCacheTestCase(unittest.TestCase):
+    """Terraform code, a local filesystem mirror of the providers, and a fake 'terraform' executable on the PATH."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.code_dir = os.path.join(self.test_dir, "terraform_code")
+        self.cache_dir = os.path.join(self.test_dir, ".terraform_cache")
+        self.mirror_dir = os.path.join(self.test_dir, "mirror")
+        self.bin_dir = os.path.join(self.test_dir, "bin")
+        self.record_file = os.path.join(self.test_dir, "record.txt")
+
+        os.makedirs(self.code_dir)
+        for name, content in [("main.tf", "# main"), ("variables.tf", "# variables"), ("notes.txt", "")]:
+            with open(os.path.join(self.code_dir, name), 'w') as file:
+                file.write(content)
+
+        os.makedirs(os.path.join(self.mirror_dir, "registry.terraform.io", "hashicorp"))
+        with open(os.path.join(self.mirror_dir, "registry.terraform.io", "hashicorp", "azurerm"), 'w') as file:
+            file.write("azurerm 3.70.0")
+
+        os.makedirs(self.bin_dir)
+        fake_terraform = os.path.join(self.bin_dir, "terraform")
+        with open(fake_terraform, 'w') as file:
+            file.write(FAKE_TERRAFORM.format(python=sys.executable))
+        os.chmod(fake_terraform, 0o755)
+
+        self.environ = patch.dict(os.environ, {
+            'PATH': self.bin_dir + os.pathsep + os.environ.get('PATH', ''),
+            'FAKE_TERRAFORM_RECORD': self.record_file
+        })
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+        shutil.rmtree(self.test_dir)
+
+    def init_commands(self):
+        if not os.path.exists(self.record_file):
+            return []
+        with open(self.record_file, 'r') as file:
+            return file.read().splitlines()
+
+    def prepare(self):
+        return code.prepare_initialized_code(self.code_dir, self.cache_dir, self.mirror_dir)
+
+
+class GetCodeVersion(ProviderCacheTestCase):
+
+    def test_changes_with_the_code(self):
+        version = code.get_code_version(self.code_dir)
+
+        with open(os.path.join(self.code_dir, "notes.txt"), 'w') as file:
+            file.write("not terraform code")
+        self.assertEqual(code.get_code_version(self.code_dir), version)
+
+        with open(os.path.join(self.code_dir, "main.tf"), 'a') as file:
+            file.write("\n")
+        self.assertNotEqual(code.get_code_version(self.code_dir), version)
+
+
+class PrepareInitializedCode(ProviderCacheTestCase):
+
+    def test_init_once_per_version(self):
+        """Concurrent callers should wait for one init; a new version of the code should be initialized again."""
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            initialized_dirs = set(executor.map(lambda _: self.prepare(), range(4)))
+
+        self.assertEqual(len(initialized_dirs), 1)
+        self.assertEqual(len(self.init_commands()), 1)
+        self.assertTrue(os.path.isdir(os.path.join(initialized_dirs.pop(), ".terraform", "providers")))
+
+        with open(os.path.join(self.code_dir, "main.tf"), 'a') as file:
+            file.write("\n# changed")
+        self.prepare()
+
+        self.assertEqual(len(self.init_commands()), 2)
+
+    def test_lock_file_pinned(self):
+        """The lock file created by the first init should be kept in the cache, not in the code, and the next inits
+        should only use it."""
+
+        version = code.get_code_version(self.code_dir)
+        self.prepare()
+
+        self.assertEqual(sorted(os.listdir(self.code_dir)), ["main.tf", "notes.txt", "variables.tf"])
+        self.assertEqual(code.get_code_version(self.code_dir), version)
+        self.assertTrue(os.path.exists(code.get_generated_lock_file(self.code_dir, self.cache_dir)))
+        self.assertNotIn("-lockfile=readonly", self.init_commands()[0])
+        self.assertIn(f"-plugin-dir={self.mirror_dir}", self.init_commands()[0])
+
+        self.prepare()
+        self.assertEqual(len(self.init_commands()), 1)
+
+        with open(os.path.join(self.code_dir, "main.tf"), 'a') as file:
+            file.write("\n# changed")
+        initialized_dir = self.prepare()
+
+        self.assertIn("-lockfile=readonly", self.init_commands()[1])
+        with open(os.path.join(initialized_dir, ".terraform.lock.hcl"), 'r') as file:
+            self.assertEqual(file.read(), "# pinned")
+
+    def test_init_failed(self):
+        """The error should point to the log of the init that ran."""
+
+        log_file = code.get_init_log_file(self.code_dir, self.cache_dir)
+
+        with self.assertRaises(code.InitError) as context:
+            code.prepare_initialized_code(self.code_dir, self.cache_dir, os.path.join(self.test_dir, "missing"))
+
+        self.assertEqual(context.exception.log_file, log_file)
+        self.assertTrue(os.path.exists(log_file))
+
+
+class PrepareWorkingCopy(ProviderCacheTestCase):
+
+    def test_isolated_working_copies(self):
+        initialized_dir = self.prepare()
+
+        first = code.prepare_working_copy(Environment("sub", "Env1", ""), initialized_dir, self.cache_dir)
+        second = code.prepare_working_copy(Environment("sub", "Env2", ""), initialized_dir, self.cache_dir)
+
+        self.assertNotEqual(first, second)
+        for working_dir in [first, second]:
+            self.assertEqual(sorted(os.listdir(working_dir)),
+                             ['.initialized', '.terraform', '.terraform.lock.hcl', 'main.tf', 'variables.tf'])
+            self.assertTrue(os.path.islink(os.path.join(working_dir, ".terraform", "providers")))
+
+        self.assertEqual(code.prepare_working_copy(Environment("sub", "Env1", ""), initialized_dir, self.cache_dir),
+                         first)
+
+
+class RunTerraformWithProviderCache(ProviderCacheTestCase):
+
+    def test_one_init_for_all_environments(self):
+        states_dir = os.path.join(self.test_dir, "terraform_states")
+        environments = []
+        for number in range(4):
+            environment = Environment("sub", f"Env{number}", os.path.join(states_dir, "sub", f"Env{number}"))
+            os.makedirs(environment.path)
+            environments.append(environment)
+
+        with patch('sys.stdout', new=StringIO()):
+            results = run_terraform_for_environments(
+                "plan", environments, backoff_seconds=0, terraform_code_dir=self.code_dir,
+                provider_cache_dir=self.cache_dir, plugin_mirror_dir=self.mirror_dir
+            )
+
+        self.assertTrue(all(result.returncode == 0 for result in results))
+        self.assertEqual(len(self.init_commands()), 1)
+
+        for environment in environments:
+            with open(environment.log_file("plan"), 'r') as file:
+                log = file.read()
+            self.assertIn(os.path.join("work", "sub", environment.name) + " azurerm 3.70.0", log)
+
+
+if __name__ == '__main__':
+    unittest.main()
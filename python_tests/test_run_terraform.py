@@ -0,0 +1,174 @@
+import unittest
+import os
+import sys
+import shutil, tempfile
+from unittest.mock import patch
+from io import StringIO
+
+import python_code.run_terraform as code
+from python_code.terraform_states import Environment
+
+# Fake terraform executable: records the start and end of every run, and fails as many times as the number
+# in the 'fail_times' file of the environment.
+FAKE_TERRAFORM = """#!{python}
+import os, sys, time
+state_dir = os.path.dirname([arg for arg in sys.argv if arg.startswith('-state=')][0][len('-state='):])
+subscription = os.path.basename(os.path.dirname(state_dir))
+with open(os.environ['FAKE_TERRAFORM_RECORD'], 'a') as record:
+    record.write(f"start {{subscription}} {{time.time()}}\\n")
+print("fake terraform", " ".join(sys.argv[1:]))
+time.sleep(0.05)
+attempts_file = os.path.join(state_dir, 'attempts')
+attempts = int(open(attempts_file).read()) + 1 if os.path.exists(attempts_file) else 1
+open(attempts_file, 'w').write(str(attempts))
+fail_file = os.path.join(state_dir, 'fail_times')
+fail_times = int(open(fail_file).read()) if os.path.exists(fail_file) else 0
+with open(os.environ['FAKE_TERRAFORM_RECORD'], 'a') as record:
+    record.write(f"end {{subscription}} {{time.time()}}\\n")
+sys.exit(3 if attempts <= fail_times else 0)
+"""
+
+
+class TerraformTestCase(unittest.TestCase):
+    """Creates a states directory and puts a fake 'terraform' executable on the PATH."""
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.states_dir = os.path.join(self.test_dir, "terraform_states")
+        self.bin_dir = os.path.join(self.test_dir, "bin")
+        self.record_file = os.path.join(self.test_dir, "record.txt")
+
+        os.makedirs(self.bin_dir)
+        fake_terraform = os.path.join(self.bin_dir, "terraform")
+        with open(fake_terraform, 'w') as file:
+            file.write(FAKE_TERRAFORM.format(python=sys.executable))
+        os.chmod(fake_terraform, 0o755)
+
+        self.environ = patch.dict(os.environ, {
+            'PATH': self.bin_dir + os.pathsep + os.environ.get('PATH', ''),
+            'FAKE_TERRAFORM_RECORD': self.record_file
+        })
+        self.environ.start()
+
+    def tearDown(self):
+        self.environ.stop()
+        shutil.rmtree(self.test_dir)
+
+    def create_environment(self, az_subscription, name, fail_times=0):
+        path = os.path.join(self.states_dir, az_subscription, name)
+        os.makedirs(path)
+        with open(os.path.join(path, "terraform.tfvars"), 'w') as file:
+            file.write('email = "a@b.c"')
+        if fail_times:
+            with open(os.path.join(path, "fail_times"), 'w') as file:
+                file.write(str(fail_times))
+        return Environment(az_subscription, name, path)
+
+    def attempts(self, environment):
+        with open(os.path.join(environment.path, "attempts"), 'r') as file:
+            return int(file.read())
+
+
+class GetTerraformCommand(unittest.TestCase):
+
+    def test_apply(self):
+        environment = Environment("sub", "Env", "/states/sub/Env")
+
+        self.assertEqual(code.get_terraform_command("apply", environment, "/code"), [
+            'terraform', '-chdir=/code', 'apply', '-input=false', '-no-color',
+            '-var-file=/states/sub/Env/terraform.tfvars', '-state=/states/sub/Env/terraform.tfstate', '-auto-approve'
+        ])
+
+    def test_plan(self):
+        environment = Environment("sub", "Env", "/states/sub/Env")
+        self.assertNotIn('-auto-approve', code.get_terraform_command("plan", environment, "/code"))
+
+
+class InterleaveSubscriptions(unittest.TestCase):
+
+    def test_round_robin(self):
+        environments = [Environment("a", "1", ""), Environment("a", "2", ""), Environment("b", "3", "")]
+
+        result = code.interleave_subscriptions(environments)
+
+        self.assertEqual([environment.name for environment in result], ["1", "3", "2"])
+
+
+class RunTerraformForEnvironments(TerraformTestCase):
+
+    def run_all(self, environments, **kwargs):
+        with patch('sys.stdout', new=StringIO()):
+            return code.run_terraform_for_environments(
+                "apply", environments, backoff_seconds=0, terraform_code_dir=self.test_dir, **kwargs
+            )
+
+    def test_retry(self):
+        """A failing run should be retried; the output of every attempt should be in the log file."""
+
+        flaky = self.create_environment("sub", "Flaky", fail_times=1)
+        broken = self.create_environment("sub", "Broken", fail_times=5)
+
+        results = self.run_all([flaky, broken], retries=2)
+
+        self.assertEqual([(result.returncode, result.attempts) for result in results], [(0, 2), (3, 3)])
+        self.assertEqual(self.attempts(broken), 3)
+
+        with open(flaky.log_file("apply"), 'r') as file:
+            log = file.read()
+        self.assertIn("terraform apply - attempt 2", log)
+        self.assertEqual(log.count("fake terraform -chdir="), 2)
+
+    def test_error(self):
+        """An environment that cannot be run should fail on its own, with the error in its log file."""
+
+        environments = [self.create_environment("sub", f"Env{number}") for number in range(3)]
+
+        with patch('python_code.config.TERRAFORM_EXECUTABLE', os.path.join(self.bin_dir, "missing")):
+            results = self.run_all(environments)
+
+        self.assertEqual([(result.environment, result.returncode) for result in results],
+                         [(environment, code.ERROR_RETURNCODE) for environment in environments])
+        self.assertIn("No such file or directory", results[0].error)
+        with open(environments[0].log_file("apply"), 'r') as file:
+            self.assertIn("terraform apply - FAILED: ", file.read())
+
+    def test_subscription_limit(self):
+        """No more environments of one subscription should run at the same time than the limit."""
+
+        environments = [self.create_environment(az_subscription, f"Env{number}")
+                        for az_subscription in ["sub1", "sub2"] for number in range(4)]
+
+        results = self.run_all(environments, max_workers=4, max_workers_per_subscription=1)
+
+        self.assertTrue(all(result.returncode == 0 for result in results))
+
+        with open(self.record_file, 'r') as file:
+            events = sorted((float(timestamp), event, az_subscription)
+                            for event, az_subscription, timestamp in (line.split() for line in file))
+
+        running = {"sub1": 0, "sub2": 0}
+        for _, event, az_subscription in events:
+            running[az_subscription] += 1 if event == "start" else -1
+            self.assertLessEqual(running[az_subscription], 1)
+
+    def test_backoff_frees_the_subscription(self):
+        """While a failed run waits for its retry, the next environment of the subscription should run."""
+
+        flaky = self.create_environment("sub", "Flaky", fail_times=1)
+        other = self.create_environment("sub", "Other")
+
+        with patch('sys.stdout', new=StringIO()):
+            results = code.run_terraform_for_environments("apply", [flaky, other], max_workers_per_subscription=1,
+                                                          retries=1, backoff_seconds=1,
+                                                          terraform_code_dir=self.test_dir)
+
+        self.assertEqual([(result.returncode, result.attempts) for result in results], [(0, 2), (0, 1)])
+
+        with open(self.record_file, 'r') as file:
+            starts = sorted(float(timestamp) for event, _, timestamp in (line.split() for line in file)
+                            if event == "start")
+        self.assertLess(starts[1] - starts[0], 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import threading
+import time
+
+import python_code.scheduler as code
+
+
+class RunScheduled(unittest.TestCase):
+
+    def setUp(self):
+        self.events = []
+        self.events_lock = threading.Lock()
+
+    def record(self, event):
+        with self.events_lock:
+            self.events.append(event)
+
+    def work(self, name, seconds=0.1):
+        self.record(("start", name))
+        time.sleep(seconds)
+        self.record(("end", name))
+
+    def run_simple(self, name):
+        self.work(name)
+        return name
+        yield
+
+    def test_results_in_order(self):
+        runs = [(az_subscription, self.run_simple(name)) for az_subscription, name in [("a", "1"), ("b", "2")]]
+
+        self.assertEqual(code.run_scheduled(runs, max_workers=2, max_workers_per_subscription=1), ["1", "2"])
+
+    def test_busy_subscription_does_not_hold_the_workers(self):
+        """The runs of a subscription at its limit should wait in the queue, not on the workers."""
+
+        runs = [("a", self.run_simple(name)) for name in ["a1", "a2", "a3"]] + [("b", self.run_simple("b1"))]
+
+        code.run_scheduled(runs, max_workers=2, max_workers_per_subscription=1)
+
+        self.assertLess(self.events.index(("end", "b1")), self.events.index(("end", "a2")))
+
+    def test_wait_frees_the_slot(self):
+        """A run waiting (i.e. before a retry) should let the next run of its subscription start."""
+
+        def retried():
+            self.work("first attempt")
+            yield code.Wait(0.3)
+            self.work("second attempt")
+
+        code.run_scheduled([("a", retried()), ("a", self.run_simple("other"))], max_workers=2,
+                           max_workers_per_subscription=1)
+
+        self.assertEqual(self.events, [("start", "first attempt"), ("end", "first attempt"), ("start", "other"),
+                                       ("end", "other"), ("start", "second attempt"), ("end", "second attempt")])
+
+    def test_semaphore(self):
+        """A run should resume only once the semaphore it waits for is acquired for it."""
+
+        semaphore = threading.Semaphore(1)
+
+        def limited(name):
+            yield code.Wait(semaphore=semaphore)
+            try:
+                self.work(name)
+                yield code.Wait(0.1)
+            finally:
+                semaphore.release()
+
+        code.run_scheduled([(az_subscription, limited(az_subscription)) for az_subscription in ["a", "b"]],
+                           max_workers=2, max_workers_per_subscription=1)
+
+        self.assertEqual(self.events, [("start", "a"), ("end", "a"), ("start", "b"), ("end", "b")])
+
+    def test_error_closes_the_runs(self):
+        """An exception of a run should stop the batch, and close the unfinished runs."""
+
+        closed = []
+
+        def failing():
+            raise OSError("failed")
+            yield
+
+        def waiting():
+            try:
+                yield code.Wait(10)
+            finally:
+                closed.append(True)
+
+        runs = [("a", waiting()), ("b", failing())]
+        with self.assertRaises(OSError):
+            code.run_scheduled(runs, max_workers=2, max_workers_per_subscription=1)
+
+        self.assertEqual(closed, [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import unittest
+import os
+from unittest.mock import patch
+from io import StringIO
+
+import python_code.terraform_layers as code
+from python_code.create_configuration_for_user import print_and_save_terraform_commands
+from python_code.run_terraform import run_terraform_for_environments
+from python_tests.test_run_terraform import TerraformTestCase
+
+LAYERS_CODE = {
+    "infra": 'resource "azurerm_resource_group" "rg" {\n  name = var.username\n}\n',
+    "unity_catalog": 'resource "databricks_catalog" "catalog" {\n  name = lower(var.username)\n}\n',
+    "compute": 'variable "compute_profile" {\n  validation {\n    condition = var.compute_profile != ""\n  }\n}\n'
+               '# var.username is only in this comment\n'
+               'resource "databricks_cluster" "cluster" {\n  name = "${var.compute_profile}-cluster"\n}\n'
+}
+
+
+class LayersTestCase(TerraformTestCase):
+    """Layered terraform code in a temporary directory, and environments with a fake terraform."""
+
+    def setUp(self):
+        super().setUp()
+        self.layers_dir = os.path.join(self.test_dir, "layers")
+        for layer, tf_code in LAYERS_CODE.items():
+            os.makedirs(os.path.join(self.layers_dir, layer))
+            with open(os.path.join(self.layers_dir, layer, "main.tf"), 'w') as file:
+                file.write(tf_code)
+
+    def create_layered_environment(self, az_subscription, name, tfvars='username = "JohnDoe"\n'):
+        environment = self.create_environment(az_subscription, name)
+        with open(environment.tfvars_file, 'w') as file:
+            file.write(tfvars)
+        code.assign_layers(environment)
+        return environment
+
+    def run_terraform(self, action, environments, **kwargs):
+        with patch('sys.stdout', new=StringIO()):
+            return run_terraform_for_environments(action, environments, backoff_seconds=0,
+                                                  terraform_code_dir=self.test_dir, layers_dir=self.layers_dir,
+                                                  **kwargs)
+
+    def log_files(self, environment):
+        return sorted(name for name in os.listdir(environment.path) if name.endswith('.log'))
+
+
+class AssignLayers(LayersTestCase):
+
+    def test_new_environment(self):
+        environment = self.create_environment("sub", "Env")
+
+        self.assertEqual(code.assign_layers(environment), ["infra", "unity_catalog", "compute"])
+        self.assertEqual(environment.layers, ["infra", "unity_catalog", "compute"])
+        self.assertEqual(environment.tfstate_files, [os.path.join(environment.path, "terraform_infra.tfstate"),
+                                                     os.path.join(environment.path, "terraform_unity_catalog.tfstate"),
+                                                     os.path.join(environment.path, "terraform_compute.tfstate")])
+
+    def test_existing_environments(self):
+        """An environment applied with a single state should keep it, a layered one should keep its layers."""
+
+        single = self.create_environment("sub", "Single")
+        open(single.tfstate_file, 'w').close()
+        layered = self.create_environment("sub", "Layered")
+        code.assign_layers(layered, ["infra", "compute"])
+
+        self.assertEqual(code.assign_layers(single), [])
+        self.assertEqual(single.tfstate_files, [single.tfstate_file])
+        self.assertEqual(code.assign_layers(layered), ["infra", "compute"])
+        self.assertEqual(code.assign_layers(self.create_environment("sub", "New"), []), [])
+
+    def test_run_layers(self):
+        environment = self.create_layered_environment("sub", "Env")
+
+        self.assertEqual(code.get_run_layers(environment, "apply"), ["infra", "unity_catalog", "compute"])
+        self.assertEqual(code.get_run_layers(environment, "destroy"), ["compute", "unity_catalog", "infra"])
+        self.assertEqual(code.get_run_layers(self.create_environment("sub", "Single"), "apply"), [None])
+
+
+class GetReferencedVariables(LayersTestCase):
+
+    def test_declarations_and_comments_ignored(self):
+        self.assertEqual(code.get_referenced_variables(os.path.join(self.layers_dir, "compute")), {"compute_profile"})
+        self.assertEqual(code.get_referenced_variables(os.path.join(self.layers_dir, "infra")), {"username"})
+
+    def test_repository_layers(self):
+        """The layers of the repository should only depend on the variables of their resources."""
+
+        variables = {layer: code.get_referenced_variables(os.path.join("./terraform_code/layers", layer))
+                     for layer in ["infra", "unity_catalog", "compute"]}
+
+        self.assertIn("azure-region", variables["infra"])
+        self.assertNotIn("compute_profile", variables["infra"] | variables["unity_catalog"])
+        self.assertIn("compute_profile", variables["compute"])
+        self.assertNotIn("azure-region", variables["compute"])
+
+
+class TerraformCommands(LayersTestCase):
+
+    def test_layer_commands(self):
+        commands_file = os.path.join(self.test_dir, "terraform_commands.txt")
+
+        with patch('sys.stdout', new=StringIO()):
+            print_and_save_terraform_commands(commands_file, "SUB", "ENV", ["infra", "compute"])
+
+        with open(commands_file, 'r') as file:
+            self.assertEqual(file.read().splitlines(), [
+                'terraform -chdir="./terraform_code/layers/infra" apply '
+                '-var-file="../../../terraform_states/SUB/ENV/terraform.tfvars" '
+                '-state="../../../terraform_states/SUB/ENV/terraform_infra.tfstate"',
+                'terraform -chdir="./terraform_code/layers/compute" apply '
+                '-var-file="../../../terraform_states/SUB/ENV/terraform.tfvars" '
+                '-state="../../../terraform_states/SUB/ENV/terraform_compute.tfstate" '
+                '-var="infra_state_file=../../../terraform_states/SUB/ENV/terraform_infra.tfstate"',
+                'terraform -chdir="./terraform_code/layers/compute" destroy '
+                '-var-file="../../../terraform_states/SUB/ENV/terraform.tfvars" '
+                '-state="../../../terraform_states/SUB/ENV/terraform_compute.tfstate" '
+                '-var="infra_state_file=../../../terraform_states/SUB/ENV/terraform_infra.tfstate"',
+                'terraform -chdir="./terraform_code/layers/infra" destroy '
+                '-var-file="../../../terraform_states/SUB/ENV/terraform.tfvars" '
+                '-state="../../../terraform_states/SUB/ENV/terraform_infra.tfstate"'
+            ])
+
+
+class RunLayers(LayersTestCase):
+
+    def test_all_layers_in_order(self):
+        layered = self.create_layered_environment("sub", "Layered")
+        single = self.create_environment("sub", "Single")
+
+        results = self.run_terraform("apply", [layered, single])
+
+        self.assertEqual([result.returncode for result in results], [0, 0])
+        self.assertEqual(results[0].layers, ("infra", "unity_catalog", "compute"))
+        self.assertEqual(results[1].layers, ())
+        self.assertEqual(self.log_files(layered), ["terraform_apply_compute.log", "terraform_apply_infra.log",
+                                                   "terraform_apply_unity_catalog.log"])
+        self.assertEqual(self.log_files(single), ["terraform_apply.log"])
+
+        with open(layered.log_file("apply", "compute"), 'r') as file:
+            log = file.read()
+        self.assertIn(f"-chdir={os.path.join(self.layers_dir, 'compute')}", log)
+        self.assertIn(f"-state={layered.layer_tfstate_file('compute')}", log)
+        self.assertIn(f"-var=infra_state_file={layered.layer_tfstate_file('infra')}", log)
+
+    def test_failed_layer_stops(self):
+        """Destroy should start with the last layer, and stop at the first failed one."""
+
+        environment = self.create_layered_environment("sub", "Env")
+        with open(os.path.join(environment.path, "fail_times"), 'w') as file:
+            file.write("1")
+
+        result, = self.run_terraform("destroy", [environment], retries=0)
+
+        self.assertEqual((result.returncode, result.layers), (3, ("compute",)))
+        self.assertEqual(self.log_files(environment), ["terraform_destroy_compute.log"])
+
+    def test_plan_cache_per_layer(self):
+        """After a change of a variable only the compute layer uses, only that layer should run."""
+
+        environment = self.create_layered_environment("sub", "Env", 'username = "JohnDoe"\ncompute_profile = "light"\n')
+        self.run_terraform("apply", [environment], use_plan_cache=True)
+
+        result, = self.run_terraform("apply", [environment], use_plan_cache=True)
+        self.assertTrue(result.skipped)
+
+        with open(environment.tfvars_file, 'a') as file:
+            file.write('compute_profile = "heavy"\n')
+
+        result, = self.run_terraform("apply", [environment], use_plan_cache=True)
+        self.assertEqual((result.skipped, result.layers), (False, ("compute",)))
+        self.assertEqual(self.attempts(environment), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
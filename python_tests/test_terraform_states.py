@@ -0,0 +1,73 @@
+import unittest
+import os
+import json
+import shutil, tempfile
+
+import python_code.terraform_states as code
+
+
+class TerraformStatesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def create_environment(self, az_subscription, name, tfvars='email = "a@b.c"'):
+        path = os.path.join(self.test_dir, az_subscription, name)
+        os.makedirs(path)
+        with open(os.path.join(path, "terraform.tfvars"), 'w') as file:
+            file.write(tfvars)
+        return code.Environment(az_subscription, name, path)
+
+
+class DiscoverEnvironments(TerraformStatesTestCase):
+
+    def test_discover(self):
+        """Only directories with a tfvars file should be environments, ordered by subscription and name."""
+
+        self.create_environment("sub2", "EnvB")
+        self.create_environment("sub1", "EnvA")
+        os.makedirs(os.path.join(self.test_dir, "sub1", "NotAnEnvironment"))
+        open(os.path.join(self.test_dir, "inventory.sqlite"), 'w').close()
+
+        result = code.discover_environments(self.test_dir)
+
+        self.assertEqual([environment.key for environment in result], ["sub1/EnvA", "sub2/EnvB"])
+
+    def test_missing_states_dir(self):
+        self.assertEqual(code.discover_environments(os.path.join(self.test_dir, "missing")), [])
+
+
+class ParseTfvars(unittest.TestCase):
+
+    def test_parse(self):
+        content = ('email                   = "email@email.email"\n'
+                   '# comment\n'
+                   'azure-region            = "westeurope"\n'
+                   '\n'
+                   'admin_flag = false\n')
+
+        self.assertEqual(code.parse_tfvars(content),
+                         {'email': 'email@email.email', 'azure-region': 'westeurope', 'admin_flag': 'false'})
+
+
+class ReadTfstateOutputs(TerraformStatesTestCase):
+
+    def test_outputs(self):
+        environment = self.create_environment("sub", "Env")
+        with open(environment.tfstate_file, 'w') as file:
+            json.dump({'outputs': {'dbx_workspace_url': {'value': 'adb-1.azuredatabricks.net', 'type': 'string'}}},
+                      file)
+
+        self.assertEqual(code.read_tfstate_outputs(environment.tfstate_file),
+                         {'dbx_workspace_url': 'adb-1.azuredatabricks.net'})
+
+    def test_no_state(self):
+        environment = self.create_environment("sub", "Env")
+        self.assertEqual(code.read_tfstate_outputs(environment.tfstate_file), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
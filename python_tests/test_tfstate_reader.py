@@ -0,0 +1,151 @@
+import unittest
+import os
+import json
+import shutil, tempfile
+from io import StringIO
+
+import python_code.tfstate_reader as code
+from python_code.fleet_report import collect_fleet_report, get_report_columns, write_csv_report, write_json_report
+from python_code.terraform_states import Environment
+
+STATE = {
+    "version": 4,
+    "terraform_version": "1.5.7",
+    "serial": 12345678901234567890,
+    "lineage": "a \"quoted\" {lineage} with [brackets] and a \\ backslash",
+    "outputs": {
+        "secret": {"value": {"nested": ["}", "]", "\\\""]}, "type": ["object", {}], "sensitive": True},
+        "dbx_workspace_url": {"value": "adb-1.azuredatabricks.net", "type": "string"}
+    },
+    "resources": [
+        {"mode": "data", "type": "azurerm_client_config", "name": "current",
+         "instances": [{"attributes": {"tenant_id": "tenant"}}]},
+        {"mode": "managed", "type": "databricks_cluster", "name": "single_user",
+         "instances": [{"index_key": 0, "attributes": {"cluster_id": "0101-abc", "num_workers": 0.5e1}}]},
+        {"mode": "managed", "type": "databricks_grants", "name": "grants",
+         "instances": [{"attributes": {"id": "catalog/ü"}}, {"attributes": {"id": "schema/é"}}]}
+    ],
+    "check_results": None
+}
+
+
+class TfstateTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.tfstate_file = os.path.join(self.test_dir, "terraform.tfstate")
+        with open(self.tfstate_file, 'w', encoding='utf-8') as file:
+            json.dump(STATE, file, indent=2, ensure_ascii=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+
+class ReadState(TfstateTestCase):
+
+    def test_chunk_boundaries(self):
+        """The result should not depend on where the chunks split the file."""
+
+        for chunk_size in [1, 2, 3, 7, 64, 1 << 16]:
+            report = code.read_state(self.tfstate_file, None, ["databricks_cluster.cluster_id",
+                                                               "databricks_cluster.num_workers"], chunk_size)
+
+            self.assertEqual(report.outputs, {name: output["value"] for name, output in STATE["outputs"].items()})
+            self.assertEqual(report.resource_count, 3)
+            self.assertEqual(report.attributes, {"databricks_cluster.cluster_id": ["0101-abc"],
+                                                 "databricks_cluster.num_workers": [5.0]})
+
+    def test_numbers_cut_by_chunks(self):
+        """A number cut right after its '.', 'e' or sign should be read whole, whatever the chunk size."""
+
+        with open(self.tfstate_file, 'w') as file:
+            file.write('{"version": -2.5e10, "serial": 1.25E-3, "outputs": {"a": {"value": -2.5e10}, '
+                       '"b": {"value": 1}, "c": {"value": [1.25E-3, -0.5, 10, 3e+2]}}, "lineage": 7E+2, '
+                       '"resources": [{"type": "t", '
+                       '"name": "n", "instances": [{"attributes": {"x": -2.5e10, "y": 0.125, "z": 7E2}}]}], "b": 1}')
+        with open(self.tfstate_file, 'r') as file:
+            expected = json.load(file)
+
+        for chunk_size in range(1, 17):
+            with open(self.tfstate_file, 'r') as file:
+                stream = code.JsonStream(file, chunk_size)
+                self.assertEqual({key: stream.value() for key in stream.keys()}, expected, chunk_size)
+            report = code.read_state(self.tfstate_file, chunk_size=chunk_size)
+            self.assertEqual(report.outputs, {name: output["value"] for name, output in expected["outputs"].items()},
+                             chunk_size)
+            self.assertEqual(list(code.iter_resources(self.tfstate_file, chunk_size=chunk_size)),
+                             expected["resources"], chunk_size)
+
+    def test_requested_outputs(self):
+        report = code.read_state(self.tfstate_file, ["dbx_workspace_url", "missing"], chunk_size=5)
+
+        self.assertEqual(report.outputs, {"dbx_workspace_url": "adb-1.azuredatabricks.net"})
+
+    def test_no_state(self):
+        self.assertEqual(code.read_state(os.path.join(self.test_dir, "missing.tfstate")),
+                         code.StateReport({}, 0, {}))
+
+        open(self.tfstate_file, 'w').close()
+        self.assertEqual(code.read_state(self.tfstate_file), code.StateReport({}, 0, {}))
+
+    def test_invalid_state(self):
+        with open(self.tfstate_file, 'w') as file:
+            file.write('{"outputs": {"url": {"value": "x"}')
+
+        with self.assertRaises(ValueError):
+            code.read_state(self.tfstate_file, chunk_size=4)
+
+    def test_iter_resources(self):
+        self.assertEqual(list(code.iter_resources(self.tfstate_file, chunk_size=3)), STATE["resources"])
+
+
+class FleetReport(TfstateTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.environments = [Environment("sub", "Env1", self.test_dir),
+                             Environment("sub", "Env2", os.path.join(self.test_dir, "missing"))]
+
+    def test_rows(self):
+        rows = collect_fleet_report(self.environments, ["dbx_workspace_url"], ["databricks_grants.id"], max_workers=2)
+
+        self.assertEqual(rows, [
+            {"az_subscription": "sub", "environment": "Env1", "resource_count": 3,
+             "dbx_workspace_url": "adb-1.azuredatabricks.net", "databricks_grants.id": ["catalog/ü", "schema/é"]},
+            {"az_subscription": "sub", "environment": "Env2", "resource_count": 0,
+             "dbx_workspace_url": None, "databricks_grants.id": []}
+        ])
+
+    def test_layered_states(self):
+        """The states of the layers should be reported as one environment."""
+
+        environment = Environment("sub", "Layered", os.path.join(self.test_dir, "layered"))
+        os.makedirs(environment.path)
+        with open(environment.layers_file, 'w') as file:
+            file.write("infra\ncompute\n")
+        shutil.copy(self.tfstate_file, environment.layer_tfstate_file("infra"))
+        shutil.copy(self.tfstate_file, environment.layer_tfstate_file("compute"))
+
+        row, = collect_fleet_report([environment], ["dbx_workspace_url"], ["databricks_cluster.cluster_id"])
+
+        self.assertEqual(row["resource_count"], 6)
+        self.assertEqual(row["dbx_workspace_url"], "adb-1.azuredatabricks.net")
+        self.assertEqual(row["databricks_cluster.cluster_id"], ["0101-abc", "0101-abc"])
+
+    def test_csv_and_json(self):
+        rows = collect_fleet_report(self.environments[:1], ["dbx_workspace_url"], ["databricks_grants.id"])
+
+        output = StringIO()
+        write_csv_report(rows, get_report_columns(["dbx_workspace_url"], ["databricks_grants.id"]), output)
+        self.assertEqual(output.getvalue().splitlines(), [
+            "az_subscription,environment,resource_count,dbx_workspace_url,databricks_grants.id,error",
+            "sub,Env1,3,adb-1.azuredatabricks.net,catalog/ü;schema/é,"
+        ])
+
+        output = StringIO()
+        write_json_report(rows, output)
+        self.assertEqual(json.loads(output.getvalue()), rows)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+import os
+import shutil, tempfile
+
+import python_code.tfvars_template as code
+
+
+class CompiledTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.config = {'<EMAIL>': 'email@email.email', '<USERNAME>': 'username'}
+
+    def test_render(self):
+        """Every occurrence of a tag should be replaced, and literal text kept as is."""
+
+        template = code.CompiledTemplate('email = "<EMAIL>"\nname = "<USERNAME>"\nagain = "<EMAIL>"')
+
+        self.assertEqual(template.render(self.config),
+                         'email = "email@email.email"\nname = "username"\nagain = "email@email.email"')
+        self.assertEqual(template.tags, ('<EMAIL>', '<USERNAME>'))
+
+    def test_render_without_tags(self):
+        self.assertEqual(code.CompiledTemplate('no tags').render({}), 'no tags')
+
+    def test_unknown_tag(self):
+        """A tag that is not a TemplateTag should be rejected when compiling."""
+
+        with self.assertRaisesRegex(code.TemplateError, "Unknown tag\\(s\\) in the template: <TYPO>."):
+            code.CompiledTemplate('a = "<TYPO>"')
+
+    def test_missing_value(self):
+        """A config without a value for a tag of the template should be rejected."""
+
+        with self.assertRaisesRegex(code.TemplateError, "No value for the template tag\\(s\\): <USERNAME>."):
+            code.CompiledTemplate('<EMAIL><USERNAME>').render({'<EMAIL>': 'e'})
+
+
+class GetCompiledTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.template_file = os.path.join(self.test_dir, "terraform.tfvars.template")
+        with open(self.template_file, 'w') as file:
+            file.write('email = "<EMAIL>"')
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_cache(self):
+        """The same compiled template should be returned until the file changes."""
+
+        first = code.get_compiled_template(self.template_file)
+        self.assertIs(code.get_compiled_template(self.template_file), first)
+
+        with open(self.template_file, 'w') as file:
+            file.write('name = "<USERNAME>"')
+        os.utime(self.template_file, ns=(0, 0))
+
+        changed = code.get_compiled_template(self.template_file)
+        self.assertIsNot(changed, first)
+        self.assertEqual(changed.render({'<USERNAME>': 'u'}), 'name = "u"')
+
+
+if __name__ == '__main__':
+    unittest.main()
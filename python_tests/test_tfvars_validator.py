@@ -0,0 +1,129 @@
+import unittest
+import os
+import shutil, tempfile
+
+import python_code.tfvars_validator as code
+from python_code.constants import TemplateTag
+from python_code.tfvars_template import get_compiled_template
+import python_code.config as conf
+
+VARIABLES_TF = '''
+variable "email" {
+  description = "The email address of the user, i.e.: {name}."
+  type        = string
+}
+
+# Comment with a brace {
+variable "admin_flag" {
+  type        = bool
+}
+
+variable "sku" {
+  type        = string
+  default     = "premium"
+
+  validation {
+    condition     = contains(["standard", "premium"], var.sku)
+    error_message = "The SKU must be one of: 'standard', 'premium'."
+  }
+}
+
+variable "count-of-things" {
+  type    = number
+  default = 1
+}
+
+variable "region" {
+  type    = string
+  default = "westeurope"
+
+  validation {
+    condition     = can(regex("^[a-z0-9]+$", var.region))
+    error_message = "Invalid region name."
+  }
+}
+'''
+
+
+class ParseVariables(unittest.TestCase):
+
+    def test_parse(self):
+        specs = code.parse_variables(VARIABLES_TF)
+
+        self.assertEqual(specs, {
+            'email': code.VariableSpec('email', 'string', True, None),
+            'admin_flag': code.VariableSpec('admin_flag', 'bool', True, None),
+            'sku': code.VariableSpec('sku', 'string', False, ('standard', 'premium')),
+            'count-of-things': code.VariableSpec('count-of-things', 'number', False, None),
+            'region': code.VariableSpec('region', 'string', False, None, '^[a-z0-9]+$')
+        })
+
+    def test_repository_variables(self):
+        """The variables of the terraform code should be parsed, with the allowed values of the validations."""
+
+        specs = code.get_variable_specs(os.path.join(os.path.dirname(__file__), '..', conf.TERRAFORM_VARIABLES_FILE))
+
+        self.assertEqual(specs['admin_flag'].type, 'bool')
+        self.assertEqual(specs['azure-region'].pattern, '^[a-z0-9]+$')
+        self.assertEqual(specs['review_date'].pattern, '^[0-9]{4}-[0-9]{2}-[0-9]{2}$')
+        self.assertIn('RA-GZRS', specs['azure_storage_account_replication_type'].allowed_values)
+        self.assertEqual(specs['compute_profile'].allowed_values, ('light', 'standard', 'heavy'))
+        self.assertIn(conf.DEFAULT_VARIABLE_VALUES[TemplateTag.COMPUTE_PROFILE], specs['compute_profile'].allowed_values)
+        self.assertEqual(specs['storage_tier'].allowed_values, ('standard', 'premium', 'tiered'))
+        self.assertIn(conf.DEFAULT_VARIABLE_VALUES[TemplateTag.STORAGE_TIER], specs['storage_tier'].allowed_values)
+
+
+class ValidateTfvars(unittest.TestCase):
+
+    def setUp(self):
+        self.specs = code.parse_variables(VARIABLES_TF)
+
+    def test_valid(self):
+        tfvars = 'email = "a@b.c"\nadmin_flag = "false"\nsku = "standard"\nregion = "italynorth"'
+
+        self.assertEqual(code.validate_tfvars(tfvars, self.specs), [])
+
+    def test_invalid(self):
+        """Every problem should be reported at once."""
+
+        tfvars = 'emial = "a@b.c"\nadmin_flag = "no"\nsku = "gold"\ncount-of-things = "many"\nregion = "West Europe"'
+
+        self.assertEqual(code.validate_tfvars(tfvars, self.specs), [
+            "'emial' is not a variable of the terraform code.",
+            "No value for the required variable 'email'.",
+            "'admin_flag' should be a bool, got: 'no'.",
+            "'sku' should be one of: 'standard', 'premium', got: 'gold'.",
+            "'count-of-things' should be a number, got: 'many'.",
+            "'region' should match '^[a-z0-9]+$', got: 'West Europe'."
+        ])
+
+    def test_repository_template(self):
+        """The template of the repository, rendered with the default values, should match its variables."""
+
+        repository_dir = os.path.join(os.path.dirname(__file__), '..')
+        specs = code.get_variable_specs(os.path.join(repository_dir, conf.TERRAFORM_VARIABLES_FILE))
+        template = get_compiled_template(os.path.join(repository_dir, conf.TERRAFORM_TFVARS_TEMPLATE_FILE))
+        config = {tag.value: 'value' for tag in TemplateTag} | \
+            {tag.value: value for tag, value in conf.DEFAULT_VARIABLE_VALUES.items()} | \
+            {TemplateTag.REVIEW_DATE.value: '2024-12-31'}
+
+        self.assertEqual(code.validate_tfvars(template.render(config), specs), [])
+
+
+class GetVariableSpecs(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.variables_file = os.path.join(self.test_dir, "variables.tf")
+        with open(self.variables_file, 'w') as file:
+            file.write(VARIABLES_TF)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_cache(self):
+        self.assertIs(code.get_variable_specs(self.variables_file), code.get_variable_specs(self.variables_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+import unittest
+import os
+import sys
+import json
+from unittest.mock import patch
+from io import StringIO
+
+import python_code.timeline as code
+from python_code.run_terraform import run_terraform_for_environments
+from python_tests.test_run_terraform import TerraformTestCase
+
+# Recorded 'terraform apply -json' output (shortened): the workspace is created, the cluster fails, and the
+# permissions are still in progress when terraform stops.
+EVENTS = [
+    {"@level": "info", "@message": "Terraform 1.5.7", "@timestamp": "2024-01-31T10:00:00.000000Z",
+     "type": "version", "terraform": "1.5.7", "ui": "1.1"},
+    {"@level": "info", "@message": "azurerm_resource_group.dbx_environment: Refreshing state...",
+     "@timestamp": "2024-01-31T10:00:01.000000Z", "type": "refresh_start",
+     "hook": {"resource": {"addr": "azurerm_resource_group.dbx_environment",
+                           "resource_type": "azurerm_resource_group"}}},
+    {"@level": "info", "@message": "azurerm_resource_group.dbx_environment: Refresh complete",
+     "@timestamp": "2024-01-31T10:00:03.500000Z", "type": "refresh_complete",
+     "hook": {"resource": {"addr": "azurerm_resource_group.dbx_environment",
+                           "resource_type": "azurerm_resource_group"}}},
+    {"@level": "info", "@message": "Plan: 3 to add, 0 to change, 0 to destroy.",
+     "@timestamp": "2024-01-31T10:00:04.000000Z", "type": "change_summary",
+     "changes": {"add": 3, "change": 0, "remove": 0, "operation": "plan"}},
+    {"@level": "info", "@message": "azurerm_databricks_workspace.personal: Creating...",
+     "@timestamp": "2024-01-31T10:00:05.000000Z", "type": "apply_start",
+     "hook": {"resource": {"addr": "azurerm_databricks_workspace.personal",
+                           "resource_type": "azurerm_databricks_workspace"}, "action": "create"}},
+    {"@level": "info", "@message": "azurerm_databricks_workspace.personal: Still creating... [10s elapsed]",
+     "@timestamp": "2024-01-31T10:00:15.000000Z", "type": "apply_progress",
+     "hook": {"resource": {"addr": "azurerm_databricks_workspace.personal",
+                           "resource_type": "azurerm_databricks_workspace"}, "action": "create",
+              "elapsed_seconds": 10}},
+    {"@level": "info", "@message": "azurerm_databricks_workspace.personal: Creation complete after 4m0s",
+     "@timestamp": "2024-01-31T10:04:05.000000Z", "type": "apply_complete",
+     "hook": {"resource": {"addr": "azurerm_databricks_workspace.personal",
+                           "resource_type": "azurerm_databricks_workspace"}, "action": "create",
+              "elapsed_seconds": 240}},
+    {"@level": "info", "@message": "databricks_cluster.single_user[0]: Creating...",
+     "@timestamp": "2024-01-31T10:04:06.000000Z", "type": "apply_start",
+     "hook": {"resource": {"addr": "databricks_cluster.single_user[0]", "resource_type": "databricks_cluster"},
+              "action": "create"}},
+    {"@level": "info", "@message": "databricks_permissions.sql_endpoint[0]: Creating...",
+     "@timestamp": "2024-01-31T10:04:07.000000Z", "type": "apply_start",
+     "hook": {"resource": {"addr": "databricks_permissions.sql_endpoint[0]",
+                           "resource_type": "databricks_permissions"}, "action": "create"}},
+    {"@level": "error", "@message": "databricks_cluster.single_user[0]: Creation errored after 1m0s",
+     "@timestamp": "2024-01-31T10:05:06.000000Z", "type": "apply_errored",
+     "hook": {"resource": {"addr": "databricks_cluster.single_user[0]", "resource_type": "databricks_cluster"},
+              "action": "create", "elapsed_seconds": 60}},
+    {"@level": "error", "@message": "Error: cannot create cluster", "@timestamp": "2024-01-31T10:05:07.000000Z",
+     "type": "diagnostic", "diagnostic": {"severity": "error", "summary": "cannot create cluster",
+                                          "detail": "The quota of the subscription is exceeded."}},
+]
+EVENT_LINES = [json.dumps(event) + '\n' for event in EVENTS]
+
+# Fake terraform replaying the recorded events with '-json', and failing like the recorded run.
+FAKE_TERRAFORM = """#!{python}
+import sys
+print("plain output")
+if '-json' in sys.argv:
+    sys.stdout.write(open({events_file!r}).read())
+sys.exit(1)
+"""
+
+
+class Replay(unittest.TestCase):
+
+    def test_resources(self):
+        records, _ = code.replay(EVENT_LINES, environment="sub/Env", action="apply", layer=None, attempt=1)
+
+        self.assertEqual([(record.name, record.operation, record.seconds, record.status) for record in records], [
+            ("azurerm_resource_group.dbx_environment", "refresh", 2.5, "complete"),
+            ("azurerm_databricks_workspace.personal", "create", 240, "complete"),
+            ("databricks_cluster.single_user[0]", "create", 60, "errored"),
+            ("databricks_permissions.sql_endpoint[0]", "create", 60, "interrupted")
+        ])
+        self.assertEqual(records[1].category, "azurerm_databricks_workspace")
+        self.assertEqual((records[1].start, records[1].end), ("2024-01-31T10:00:05+00:00", "2024-01-31T10:04:05+00:00"))
+        self.assertEqual((records[1].environment, records[1].action, records[1].attempt), ("sub/Env", "apply", 1))
+
+    def test_log(self):
+        _, log = code.replay(["plain output\n"] + EVENT_LINES)
+
+        self.assertTrue(log.startswith("plain output\nTerraform 1.5.7\n"))
+        self.assertIn("\nPlan: 3 to add, 0 to change, 0 to destroy.\n", log)
+        self.assertIn("Error: cannot create cluster\n\nThe quota of the subscription is exceeded.\n", log)
+        self.assertNotIn("{", log)
+
+    def test_end_without_start(self):
+        """An end event without its start (i.e. the output was cut) should use the elapsed seconds of the event."""
+
+        records, _ = code.replay(EVENT_LINES[6:7])
+
+        self.assertEqual((records[0].start, records[0].seconds), ("2024-01-31T10:00:05+00:00", 240))
+
+
+class Rollup(unittest.TestCase):
+
+    def record(self, category, seconds, status="complete", action="apply"):
+        return code.TimingRecord("resource", f"{category}.x", category, "create", "", "", seconds, status,
+                                 action=action)
+
+    def test_percentiles(self):
+        records = [self.record("databricks_cluster", seconds) for seconds in range(1, 101)] + \
+                  [self.record("databricks_cluster", 1000, status="errored"),
+                   self.record("databricks_cluster", 1000, action="destroy"),
+                   self.record("databricks_grants", 7)]
+
+        self.assertEqual(code.rollup(records, action="apply"), [
+            code.RollupRow("resource", "databricks_cluster", "create", 100, 50, 95, 100),
+            code.RollupRow("resource", "databricks_grants", "create", 1, 7, 7, 7)
+        ])
+
+
+class TimingRecorder(TerraformTestCase):
+
+    def test_stages(self):
+        timings_file = os.path.join(self.test_dir, "timings.jsonl")
+        recorder = code.TimingRecorder(timings_file)
+
+        with recorder.stage("init", layer="infra"):
+            pass
+        with self.assertRaises(ValueError):
+            with recorder.stage("lock_wait", environment="sub/Env"):
+                raise ValueError
+        with recorder.stage("terraform") as outcome:
+            outcome['status'] = code.ERRORED
+        with code.TimingRecorder().stage("not_recorded"):
+            pass
+
+        records = code.read_timings(timings_file)
+        self.assertEqual([(record.kind, record.name, record.status) for record in records],
+                         [("stage", "init", "complete"), ("stage", "lock_wait", "errored"),
+                          ("stage", "terraform", "errored")])
+        self.assertEqual((records[0].layer, records[1].environment), ("infra", "sub/Env"))
+
+
+class RunWithTimeline(TerraformTestCase):
+
+    def setUp(self):
+        super().setUp()
+        events_file = os.path.join(self.test_dir, "events.jsonl")
+        with open(events_file, 'w') as file:
+            file.writelines(EVENT_LINES)
+        with open(os.path.join(self.bin_dir, "terraform"), 'w') as file:
+            file.write(FAKE_TERRAFORM.format(python=sys.executable, events_file=events_file))
+        self.timings_file = os.path.join(self.test_dir, "timings.jsonl")
+
+    def test_replayed_run(self):
+        """With a timings file terraform should run with '-json': its events logged as text, and timed."""
+
+        environment = self.create_environment("sub", "Env")
+
+        with patch('sys.stdout', new=StringIO()):
+            result, = run_terraform_for_environments("apply", [environment], retries=1, backoff_seconds=0,
+                                                     terraform_code_dir=self.test_dir, timings_file=self.timings_file)
+
+        self.assertEqual((result.returncode, result.attempts), (1, 2))
+        with open(environment.log_file("apply"), 'r') as file:
+            log = file.read()
+        self.assertIn(" -json ", log)
+        self.assertEqual(log.count("plain output\nTerraform 1.5.7\n"), 2)
+
+        records = code.read_timings(self.timings_file)
+        resources = [record for record in records if record.kind == "resource"]
+        self.assertEqual(len(resources), 8)
+        self.assertEqual({(record.environment, record.action) for record in resources}, {("sub/Env", "apply")})
+        self.assertEqual([record.attempt for record in resources], [1] * 4 + [2] * 4)
+
+        stages = [(record.name, record.status) for record in records if record.kind == "stage"]
+        self.assertEqual(stages, [("lock_wait", "complete"), ("terraform", "errored"), ("terraform", "errored")])
+
+    def test_without_timings(self):
+        environment = self.create_environment("sub", "Env")
+
+        with patch('sys.stdout', new=StringIO()):
+            run_terraform_for_environments("apply", [environment], retries=0, terraform_code_dir=self.test_dir)
+
+        with open(environment.log_file("apply"), 'r') as file:
+            self.assertNotIn(" -json ", file.read())
+        self.assertFalse(os.path.exists(self.timings_file))
+
+
+if __name__ == '__main__':
+    unittest.main()
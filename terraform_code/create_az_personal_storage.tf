@@ -8,15 +8,29 @@ resource "random_string" "storage_account" {
   numeric = false
 }
 
+# The performance tier of the account is chosen by the storage tier of the user.
+
+locals {
+  storage_tier = var.storage_tiers[var.storage_tier]
+}
+
 resource "azurerm_storage_account" "personal" {
   name                      = lower(random_string.storage_account.id)
   resource_group_name       = azurerm_resource_group.dbx_environment.name
   location                  = azurerm_resource_group.dbx_environment.location
-  account_tier              = "Standard"
+  account_tier              = local.storage_tier.account_tier
   account_replication_type  = var.azure_storage_account_replication_type
-  account_kind              = "StorageV2"
+  account_kind              = local.storage_tier.account_kind
+  access_tier               = local.storage_tier.access_tier
   is_hns_enabled            = true
   tags                      = local.common_tags
+
+  lifecycle {
+    precondition {
+      condition     = local.storage_tier.account_tier == "Standard" || contains(["LRS", "ZRS"], var.azure_storage_account_replication_type)
+      error_message = "Premium storage accounts only support the 'LRS' and 'ZRS' replication types."
+    }
+  }
 }
 
 
@@ -28,6 +42,52 @@ resource "azurerm_storage_container" "personal_unity" {
   container_access_type = "private"
 }
 
+# Additional containers of the storage tier, i.e. for hot and cold data. Each gets an external location in the catalog.
+
+resource "azurerm_storage_container" "extra" {
+  for_each              = local.storage_tier.containers
+  name                  = each.key
+  storage_account_name  = azurerm_storage_account.personal.name
+  container_access_type = "private"
+}
+
+# Blobs of the containers with 'cool_after_days' move to the cool access tier when they were not modified for that
+# many days. Only standard accounts have access tiers.
+
+locals {
+  cooling_containers = {for name, container in local.storage_tier.containers : name => container
+                        if container.cool_after_days != null}
+}
+
+resource "azurerm_storage_management_policy" "personal" {
+  count              = length(local.cooling_containers) > 0 ? 1 : 0
+  storage_account_id = azurerm_storage_account.personal.id
+
+  dynamic "rule" {
+    for_each = local.cooling_containers
+    content {
+      name    = "cool-${rule.key}"
+      enabled = true
+      filters {
+        prefix_match = ["${rule.key}/"]
+        blob_types   = ["blockBlob"]
+      }
+      actions {
+        base_blob {
+          tier_to_cool_after_days_since_modification_greater_than = rule.value.cool_after_days
+        }
+      }
+    }
+  }
+
+  lifecycle {
+    precondition {
+      condition     = local.storage_tier.account_tier == "Standard"
+      error_message = "Only standard storage accounts can move blobs to the cool access tier."
+    }
+  }
+}
+
 
 # Using Databricks Access Connector to give access for DBX to the personal storage
 # Note: one access connector for every user.
@@ -12,7 +12,6 @@ resource "azurerm_resource_group" "dbx_environment" {
 }
 
 resource "azurerm_role_assignment" "owner" {
-  depends_on = [azurerm_resource_group.dbx_environment, data.azuread_user.az_user]
   scope                = azurerm_resource_group.dbx_environment.id
   role_definition_name = "Owner"
   principal_id         =  data.azuread_user.az_user.id
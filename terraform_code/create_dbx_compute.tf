@@ -2,29 +2,66 @@
 # CREATE SINGLE USER CLUSTER
 ############################
 
+locals {
+  compute_profile = var.compute_profiles[var.compute_profile]
+  single_node     = local.compute_profile.max_workers == 0
+
+  cluster_node_type_id = coalesce(local.compute_profile.node_type_id, local.node_type_id)
+}
+
+# Optional pool of idle VMs, so the cluster does not wait for a new VM when it starts.
+
+resource "databricks_instance_pool" "personal" {
+  provider                              = databricks.workspace
+  count                                 = var.instance_pool_enabled ? 1 : 0
+  instance_pool_name                    = "(Default) Personal Pool"
+  node_type_id                          = local.cluster_node_type_id
+  min_idle_instances                    = var.instance_pool_min_idle_instances
+  max_capacity                          = var.instance_pool_max_capacity
+  idle_instance_autotermination_minutes = var.instance_pool_idle_autotermination_minutes
+  preloaded_spark_versions              = [local.spark_version]
+}
+
 resource "databricks_cluster" "single_user" {
-  depends_on              = [azurerm_databricks_workspace.personal]
   provider                = databricks.workspace
   count                   = 1
-  cluster_name            = "(Default) Single Node Cluster"
+  cluster_name            = local.single_node ? "(Default) Single Node Cluster" : "(Default) Single User Cluster"
   single_user_name        = var.email
-  spark_version           = data.databricks_spark_version.latest_lts.id
-  node_type_id            = data.databricks_node_type.smallest.id
-  autotermination_minutes = 60
+  spark_version           = local.spark_version
+  # With an instance pool the node type comes from the pool.
+  instance_pool_id        = var.instance_pool_enabled ? databricks_instance_pool.personal[0].id : null
+  node_type_id            = var.instance_pool_enabled ? null : local.cluster_node_type_id
+  no_wait                 = var.cluster_no_wait
+  # Unset unless needed, so the clusters created before the profiles are not updated (and restarted).
+  runtime_engine          = local.compute_profile.photon ? "PHOTON" : null
+  autotermination_minutes = local.compute_profile.autotermination_minutes
   data_security_mode      = "SINGLE_USER"
+  num_workers             = local.single_node ? 0 : null
 
-  spark_conf = {
-    "spark.databricks.cluster.profile"  : "singleNode"
-    "spark.master"                      : "local[*]"
+  dynamic "autoscale" {
+    for_each = local.single_node ? [] : [local.compute_profile]
+    content {
+      min_workers = autoscale.value.min_workers
+      max_workers = autoscale.value.max_workers
+    }
   }
 
-  custom_tags = {
-    "ResourceClass" = "SingleNode"
-  }
+  spark_conf = merge(
+    { for key, value in {
+        "spark.databricks.cluster.profile"  : "singleNode"
+        "spark.master"                      : "local[*]"
+      } : key => value if local.single_node },
+    local.compute_profile.spark_conf
+  )
+
+  # The clusters of the 'standard' profile keep the tags they had before the profiles.
+  custom_tags = merge(
+    { for key, value in { "ResourceClass" = "SingleNode" } : key => value if local.single_node },
+    { for key, value in { "ComputeProfile" = var.compute_profile } : key => value if var.compute_profile != "standard" }
+  )
 }
 
 resource "databricks_permissions" "cluster_usage" {
-  depends_on  = [databricks_cluster.single_user]
   count = var.admin_flag ? 0 : 1
   provider    = databricks.workspace
   cluster_id  = databricks_cluster.single_user[0].id
@@ -41,11 +78,10 @@ resource "databricks_permissions" "cluster_usage" {
 ###############################
 
 resource "databricks_sql_endpoint" "personal" {
-  depends_on                = [databricks_cluster.single_user]
   provider                  = databricks.workspace
-  name                      = "Serverless Warehouse (2X-Small)"
-  cluster_size              = "2X-Small"
-  max_num_clusters          = 1
+  name                      = "Serverless Warehouse (${local.compute_profile.warehouse_size})"
+  cluster_size              = local.compute_profile.warehouse_size
+  max_num_clusters          = local.compute_profile.warehouse_max_num_clusters
   enable_serverless_compute = true
   auto_stop_mins            = 5
 
@@ -58,7 +94,6 @@ resource "databricks_sql_endpoint" "personal" {
 }
 
 resource "databricks_permissions" "sql_endpoint" {
-  depends_on      = [databricks_sql_endpoint.personal]
   count = var.admin_flag ? 0 : 1
   provider        = databricks.workspace
   sql_endpoint_id = databricks_sql_endpoint.personal.id
@@ -1,7 +1,6 @@
 # Every user have their own personal DBX workspace
 
 resource "azurerm_databricks_workspace" "personal" {
-  depends_on                  = [azurerm_resource_group.dbx_environment]
   name                        = azurerm_resource_group.dbx_environment.name
   resource_group_name         = azurerm_resource_group.dbx_environment.name
   location                    = var.azure-region
@@ -13,7 +12,6 @@ resource "azurerm_databricks_workspace" "personal" {
 # Assigning the user to the DBX workspace
 
 resource "databricks_mws_permission_assignment" "add_user" {
-  depends_on    = [azurerm_databricks_workspace.personal]
   workspace_id  = azurerm_databricks_workspace.personal.workspace_id
   principal_id  = data.databricks_user.account_user.id
   permissions   = ["USER"]
@@ -5,10 +5,10 @@
 # In order to create external location in DBX we need to create a storage credential.
 
 resource "databricks_storage_credential" "personal_unity" {
-  name    = "${azurerm_resource_group.dbx_environment.name}-access-connector"
+  name    = "${local.resource_group_name}-access-connector"
   comment = "Managed identity credential managed by TF"
   azure_managed_identity {
-    access_connector_id = azurerm_databricks_access_connector.personal_unity.id
+    access_connector_id = local.access_connector_id
   }
 }
 
@@ -16,11 +16,23 @@ resource "databricks_storage_credential" "personal_unity" {
 
 resource "databricks_external_location" "personal_unity_ext" {
   depends_on      = [databricks_metastore_assignment.this]
-  name            = "${azurerm_resource_group.dbx_environment.name}-ext-location"
+  name            = "${local.resource_group_name}-ext-location"
   credential_name = databricks_storage_credential.personal_unity.id
   url             = format("abfss://%s@%s.dfs.core.windows.net",
-                            azurerm_storage_container.personal_unity.name,
-                            azurerm_storage_account.personal.name)
+                            local.storage_container_name,
+                            local.storage_account_name)
+}
+
+# The additional containers of the storage tier can be used as external locations, i.e. for external tables.
+
+resource "databricks_external_location" "extra" {
+  for_each        = toset(local.extra_container_names)
+  depends_on      = [databricks_metastore_assignment.this]
+  name            = "${local.resource_group_name}-ext-location-${each.key}"
+  credential_name = databricks_storage_credential.personal_unity.id
+  url             = format("abfss://%s@%s.dfs.core.windows.net",
+                            each.key,
+                            local.storage_account_name)
 }
 
 # Now everything is ready for the Catalog creation.
@@ -28,11 +40,11 @@ resource "databricks_external_location" "personal_unity_ext" {
 
 resource "databricks_catalog" "personal_catalog" {
   depends_on      = [databricks_external_location.personal_unity_ext]
-  name            = replace(lower(azurerm_resource_group.dbx_environment.name), "-", "_")
+  name            = replace(lower(local.resource_group_name), "-", "_")
   comment         = "This catalog is managed by Terraform"
   storage_root    = format("abfss://%s@%s.dfs.core.windows.net/",
-                            azurerm_storage_container.personal_unity.name,
-                            azurerm_storage_account.personal.name)
+                            local.storage_container_name,
+                            local.storage_account_name)
   isolation_mode  = "ISOLATED"
   properties = {
     purpose = "personal development"
@@ -42,26 +54,24 @@ resource "databricks_catalog" "personal_catalog" {
 # Since the isolation is turned on, we need to bind the workspace to the catalog.
 
 resource "databricks_workspace_binding" "this" {
-  depends_on = [databricks_catalog.personal_catalog, azurerm_databricks_workspace.personal]
   securable_name = databricks_catalog.personal_catalog.name
-  workspace_id   = azurerm_databricks_workspace.personal.workspace_id
+  workspace_id   = local.workspace_id
 }
 
 # Need to grant privileges in order to be able to create the default schema
 
 resource "databricks_grants" "personal_catalog_grants" {
-  depends_on = [databricks_catalog.personal_catalog]
   catalog = databricks_catalog.personal_catalog.name
   grant {
     principal  = data.databricks_user.account_user.user_name
     privileges = ["ALL_PRIVILEGES"]
   }
   grant {
-    principal  = data.external.me.result.name
+    principal  = local.current_user_name
     privileges = ["ALL_PRIVILEGES"]
   }
   grant {
-    principal  = data.databricks_group.metastore-admins.display_name
+    principal  = var.dbx_admin_group_name
     privileges = ["ALL_PRIVILEGES"]
   }
 }
@@ -80,7 +90,6 @@ resource "databricks_schema" "default" {
 
 
 resource "databricks_grants" "default_schema_grants" {
-  depends_on  = [databricks_schema.default]
   schema      = databricks_schema.default.id
 
   grant {
@@ -88,11 +97,11 @@ resource "databricks_grants" "default_schema_grants" {
     privileges = ["ALL_PRIVILEGES"]
   }
   grant {
-    principal  = data.external.me.result.name
+    principal  = local.current_user_name
     privileges = ["ALL_PRIVILEGES"]
   }
   grant {
-    principal  = data.databricks_group.metastore-admins.display_name
+    principal  = var.dbx_admin_group_name
     privileges = ["ALL_PRIVILEGES"]
   }
 }
@@ -0,0 +1,16 @@
+data "azurerm_client_config" "current" {}
+
+data "azuread_user" "az_user" {
+  user_principal_name = var.email
+}
+
+locals {
+  common_tags = {
+    owner        = var.username
+    department   = trimsuffix(var.user_group_prefix, "-")
+    environment  = trimprefix(var.user_group_suffix, "-")
+    client       = "Hifly"
+    # Set once by the configuration scripts. Without it the date moves on every run, so every plan updates the tags.
+    review_date  = coalesce(var.review_date, formatdate("YYYY-MM-DD", timeadd(timestamp(), "4320h"))) # About 6 months
+  }
+}
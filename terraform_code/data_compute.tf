@@ -0,0 +1,17 @@
+# The lookups below are the same for every environment. When 'run_terraform.py' prefetched them once for the whole
+# batch (the 'prefetched_*' variables), the data sources are skipped.
+
+data "databricks_spark_version" "latest_lts" {
+  count             = var.prefetched_spark_version == null ? 1 : 0
+  long_term_support = true
+}
+
+data "databricks_node_type" "smallest" {
+  count      = var.prefetched_node_type_id == null ? 1 : 0
+  local_disk = true
+}
+
+locals {
+  spark_version     = coalesce(var.prefetched_spark_version, one(data.databricks_spark_version.latest_lts[*].id))
+  node_type_id      = coalesce(var.prefetched_node_type_id, one(data.databricks_node_type.smallest[*].id))
+}
@@ -0,0 +1,11 @@
+# The lookup is the same for every environment. When 'run_terraform.py' prefetched it once for the whole
+# batch (the 'prefetched_current_user' variable), the data source is skipped.
+
+data "external" "me" {
+  count   = var.prefetched_current_user == null ? 1 : 0
+  program = ["az", "account", "show", "--query", "user"]
+}
+
+locals {
+  current_user_name = coalesce(var.prefetched_current_user, one(data.external.me[*].result.name))
+}
@@ -0,0 +1 @@
+../../create_dbx_compute.tf
\ No newline at end of file
@@ -0,0 +1 @@
+../../data.tf
\ No newline at end of file
@@ -0,0 +1 @@
+../../data_compute.tf
\ No newline at end of file
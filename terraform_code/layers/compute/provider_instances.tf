@@ -0,0 +1 @@
+../../provider_instances.tf
\ No newline at end of file
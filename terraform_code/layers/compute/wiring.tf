@@ -0,0 +1 @@
+../remote_infra.tf
\ No newline at end of file
@@ -0,0 +1 @@
+../../create_az_personal_storage.tf
\ No newline at end of file
@@ -0,0 +1 @@
+../../create_az_resource_group.tf
\ No newline at end of file
@@ -0,0 +1 @@
+../../create_dbx_workspace.tf
\ No newline at end of file
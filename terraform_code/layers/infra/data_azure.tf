@@ -0,0 +1 @@
+../../data_azure.tf
\ No newline at end of file
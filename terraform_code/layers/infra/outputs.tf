@@ -0,0 +1,29 @@
+output "dbx_workspace_url" {
+  value = local.workspace_url
+}
+
+# Read by the unity catalog and compute layers (see '../remote_infra.tf').
+
+output "dbx_workspace_id" {
+  value = local.workspace_id
+}
+
+output "resource_group_name" {
+  value = local.resource_group_name
+}
+
+output "storage_account_name" {
+  value = local.storage_account_name
+}
+
+output "storage_container_name" {
+  value = local.storage_container_name
+}
+
+output "access_connector_id" {
+  value = local.access_connector_id
+}
+
+output "extra_container_names" {
+  value = local.extra_container_names
+}
@@ -0,0 +1 @@
+../../variables.tf
\ No newline at end of file
@@ -0,0 +1 @@
+../../wiring.tf
\ No newline at end of file
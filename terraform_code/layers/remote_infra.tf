@@ -0,0 +1,23 @@
+# The values the unity catalog and compute layers take from the infra layer: the outputs of its state file.
+
+variable "infra_state_file" {
+  description = "The state file of the infra layer of the environment."
+  type        = string
+}
+
+data "terraform_remote_state" "infra" {
+  backend = "local"
+  config = {
+    path = var.infra_state_file
+  }
+}
+
+locals {
+  workspace_url          = data.terraform_remote_state.infra.outputs.dbx_workspace_url
+  workspace_id           = data.terraform_remote_state.infra.outputs.dbx_workspace_id
+  resource_group_name    = data.terraform_remote_state.infra.outputs.resource_group_name
+  storage_account_name   = data.terraform_remote_state.infra.outputs.storage_account_name
+  storage_container_name = data.terraform_remote_state.infra.outputs.storage_container_name
+  access_connector_id    = data.terraform_remote_state.infra.outputs.access_connector_id
+  extra_container_names  = data.terraform_remote_state.infra.outputs.extra_container_names
+}
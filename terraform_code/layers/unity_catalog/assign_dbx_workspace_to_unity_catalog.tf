@@ -0,0 +1 @@
+../../assign_dbx_workspace_to_unity_catalog.tf
\ No newline at end of file
@@ -0,0 +1 @@
+../../create_personal_unity_catalog.tf
\ No newline at end of file
@@ -0,0 +1 @@
+../../data_unity_catalog.tf
\ No newline at end of file
@@ -0,0 +1 @@
+../../required_providers.tf
\ No newline at end of file
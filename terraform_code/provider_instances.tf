@@ -12,5 +12,5 @@ provider "databricks" {
 
 provider "databricks" {
   alias = "workspace"
-  host  = azurerm_databricks_workspace.personal.workspace_url
+  host  = local.workspace_url
 }
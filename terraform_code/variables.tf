@@ -52,19 +52,204 @@ variable "create-azure-resource-group" {
 }
 
 # Valid values are available at https://github.com/claranet/terraform-azurerm-regions/blob/master/REGIONS.md
+# Only the format of the name is checked, so a new region needs no change of the code.
 variable "azure-region" {
   description = "The Azure region where resources are created."
   type        = string
+
+  validation {
+    condition     = can(regex("^[a-z0-9]+$", var.azure-region))
+    error_message = "Invalid Azure region name. Use the short name, i.e.: 'westeurope'."
+  }
 }
 
 variable "dbx-sku" {
   description = "SKU type of Databricks Workspace - ['standard', 'premium', 'trial']."
   type        = string
   default     = "premium"
+
+  validation {
+    condition     = contains(["standard", "premium", "trial"], var.dbx-sku)
+    error_message = "The SKU must be one of: 'standard', 'premium', 'trial'."
+  }
 }
 
 variable "azure_storage_account_replication_type" {
   description = "The replication type of Azure storage. - 'LRS', 'ZRS', 'GRS', 'RA-GRS', 'GZRS', 'RA-GZRS'"
   type        = string
   default     = "LRS"
+
+  validation {
+    condition     = contains(["LRS", "ZRS", "GRS", "RA-GRS", "GZRS", "RA-GZRS"], var.azure_storage_account_replication_type)
+    error_message = "The replication type must be one of: 'LRS', 'ZRS', 'GRS', 'RA-GRS', 'GZRS', 'RA-GZRS'."
+  }
+}
+
+variable "review_date" {
+  description = "Date (YYYY-MM-DD) the environment is reviewed, and destroyed by the expiry sweeper unless extended. Tags the Azure resources."
+  type        = string
+  default     = null
+
+  validation {
+    condition     = var.review_date == null || can(regex("^[0-9]{4}-[0-9]{2}-[0-9]{2}$", var.review_date))
+    error_message = "The review date must be a date like: '2024-12-31'."
+  }
+}
+
+# The tier names are listed in the validation too, so the configuration scripts can check them offline.
+# Add the name there when adding a tier to 'storage_tiers'.
+variable "storage_tier" {
+  description = "Performance tier of the personal storage account of the user, a key of 'storage_tiers'."
+  type        = string
+  default     = "standard"
+
+  validation {
+    condition     = contains(["standard", "premium", "tiered"], var.storage_tier)
+    error_message = "The storage tier must be one of: 'standard', 'premium', 'tiered'."
+  }
+}
+
+variable "storage_tiers" {
+  description = "Named storage account tiers. 'access_tier' must be null for 'BlockBlobStorage' accounts; 'containers' are created next to the catalog container, their blobs move to the cool tier after 'cool_after_days'."
+  type = map(object({
+    account_tier = string
+    account_kind = string
+    access_tier  = optional(string)
+    containers   = optional(map(object({
+      cool_after_days = optional(number)
+    })), {})
+  }))
+  default = {
+    standard = {
+      account_tier = "Standard"
+      account_kind = "StorageV2"
+      access_tier  = "Hot"
+    }
+    premium = {
+      account_tier = "Premium"
+      account_kind = "BlockBlobStorage"
+    }
+    tiered = {
+      account_tier = "Standard"
+      account_kind = "StorageV2"
+      access_tier  = "Hot"
+      containers   = {
+        hot  = {}
+        cold = {
+          cool_after_days = 7
+        }
+      }
+    }
+  }
+}
+
+# The profile names are listed in the validation too, so the configuration scripts can check them offline.
+# Add the name there when adding a profile to 'compute_profiles'.
+variable "compute_profile" {
+  description = "Performance profile of the cluster and the SQL warehouse of the user, a key of 'compute_profiles'."
+  type        = string
+  default     = "standard"
+
+  validation {
+    condition     = contains(["light", "standard", "heavy"], var.compute_profile)
+    error_message = "The compute profile must be one of: 'light', 'standard', 'heavy'."
+  }
+}
+
+variable "compute_profiles" {
+  description = "Named performance profiles. 'max_workers = 0' is a single node cluster; 'node_type_id = null' is the smallest node type with local disk."
+  type = map(object({
+    node_type_id               = optional(string)
+    min_workers                = number
+    max_workers                = number
+    photon                     = bool
+    spark_conf                 = map(string)
+    autotermination_minutes    = number
+    warehouse_size             = string
+    warehouse_max_num_clusters = number
+  }))
+  default = {
+    light = {
+      min_workers                = 0
+      max_workers                = 0
+      photon                     = false
+      spark_conf                 = {}
+      autotermination_minutes    = 30
+      warehouse_size             = "2X-Small"
+      warehouse_max_num_clusters = 1
+    }
+    standard = {
+      min_workers                = 0
+      max_workers                = 0
+      photon                     = false
+      spark_conf                 = {}
+      autotermination_minutes    = 60
+      warehouse_size             = "2X-Small"
+      warehouse_max_num_clusters = 1
+    }
+    heavy = {
+      node_type_id               = "Standard_E8ds_v5"
+      min_workers                = 1
+      max_workers                = 4
+      photon                     = true
+      spark_conf                 = {
+        "spark.sql.adaptive.enabled"                              = "true"
+        "spark.databricks.adaptive.autoOptimizeShuffle.enabled"   = "true"
+      }
+      autotermination_minutes    = 60
+      warehouse_size             = "Small"
+      warehouse_max_num_clusters = 2
+    }
+  }
+}
+
+variable "instance_pool_enabled" {
+  description = "Boolean flag indicating if the cluster starts from a pool of idle instances."
+  type        = bool
+  default     = false
+}
+
+variable "instance_pool_min_idle_instances" {
+  description = "Number of instances the pool keeps idle (and paid for), ready for the cluster to start on."
+  type        = number
+  default     = 1
+}
+
+variable "instance_pool_max_capacity" {
+  description = "Maximum number of instances in the pool. Null means unlimited."
+  type        = number
+  default     = null
+}
+
+variable "instance_pool_idle_autotermination_minutes" {
+  description = "Minutes after the instances above the minimum idle ones are terminated."
+  type        = number
+  default     = 30
+}
+
+variable "cluster_no_wait" {
+  description = "Boolean flag indicating if apply returns without waiting for the cluster to be running."
+  type        = bool
+  default     = false
+}
+
+# Lookups prefetched once for a batch of environments by 'run_terraform.py --prefetch-lookups'.
+# When null, the data sources in 'data.tf' look them up.
+
+variable "prefetched_current_user" {
+  description = "Name of the user running terraform, as 'az account show --query user' returns it."
+  type        = string
+  default     = null
+}
+
+variable "prefetched_spark_version" {
+  description = "The latest long term support Databricks runtime version."
+  type        = string
+  default     = null
+}
+
+variable "prefetched_node_type_id" {
+  description = "The smallest node type with local disk in the region."
+  type        = string
+  default     = null
 }
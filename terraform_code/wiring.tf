@@ -0,0 +1,12 @@
+# The values the unity catalog and compute resources take from the infra resources. In this directory all of them are
+# in the same state; in the layered states (see './layers') they come from the state of the infra layer instead.
+
+locals {
+  workspace_url          = azurerm_databricks_workspace.personal.workspace_url
+  workspace_id           = azurerm_databricks_workspace.personal.workspace_id
+  resource_group_name    = azurerm_resource_group.dbx_environment.name
+  storage_account_name   = azurerm_storage_account.personal.name
+  storage_container_name = azurerm_storage_container.personal_unity.name
+  access_connector_id    = azurerm_databricks_access_connector.personal_unity.id
+  extra_container_names  = [for container in azurerm_storage_container.extra : container.name]
+}